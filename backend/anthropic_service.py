@@ -1,16 +1,32 @@
-import os
 import json
-from anthropic import Anthropic
+
+from utils.llm_clients import get_anthropic_client
+from utils.llm_metrics import MeteredAnthropic
+from utils.model_router import model_router
+from utils.singleflight import request_key, singleflight
 
 class AnthropicService:
     def __init__(self):
-        self.client = Anthropic(api_key=os.getenv('ANTHROPIC_API_KEY'))
+        self.client = get_anthropic_client()
+        self.llm = MeteredAnthropic(self.client)
+    
+    def create_message(self, call_site: str, **kwargs):
+        """messages.create with the model the router picks for this call site"""
+        with model_router.route(call_site) as route:
+            return self.llm.create(call_site, model=route.model, **kwargs)
     
     def generate_profiles(self, search_query: str):
         """Generate extraordinary people profiles based on search query"""
+        # Concurrent identical (normalized) queries share one Anthropic call
+        return singleflight("research.profiles").do(
+            request_key("profiles", search_query),
+            lambda: self._generate_profiles(search_query),
+        )
+    
+    def _generate_profiles(self, search_query: str):
         try:
-            response = self.client.messages.create(
-                model="claude-3-haiku-20240307",
+            response = self.create_message(
+                "research.profiles",
                 max_tokens=2000,
                 messages=[{
                     "role": "user",
@@ -55,8 +71,8 @@ Focus on diverse, inspiring real people who match the search criteria. Include t
     def interpret_search(self, query: str):
         """Interpret user's search intent"""
         try:
-            response = self.client.messages.create(
-                model="claude-3-haiku-20240307",
+            response = self.create_message(
+                "research.interpret",
                 max_tokens=200,
                 messages=[{
                     "role": "user",
@@ -74,11 +90,17 @@ What kind of extraordinary people is the user looking for? Be encouraging and sp
     
     def deep_research(self, query: str):
         """Deep research on specific person/company/organization"""
+        return singleflight("research.deep", lock_ttl_s=180.0).do(
+            request_key("deep_research", query),
+            lambda: self._deep_research(query),
+        )
+    
+    def _deep_research(self, query: str):
         try:
             print(f"🔍 Starting deep research for: {query}")
             
-            response = self.client.messages.create(
-                model="claude-3-haiku-20240307",
+            response = self.create_message(
+                "research.deep",
                 max_tokens=3000,
                 messages=[{
                     "role": "user",
@@ -1,6 +1,7 @@
 from flask import jsonify, request
 from app.api import api_bp
 from app.models import Family, FamilyPriorities, KidTraits, Activity, Recommendation
+from utils.catalog import CatalogColumns
 
 @api_bp.route('/', methods=['GET'])
 def api_home():
@@ -155,57 +156,62 @@ def get_recommendations():
         priorities = FamilyPriorities.get_by_family(family_id)
         traits = KidTraits.get_by_family(family_id)
         
-        # Get all activities for now (placeholder logic)
-        activities = Activity.get_all()
-        
-        # Simple placeholder recommendation logic
-        recommendations = []
-        for activity in activities:
-            # Basic filtering by age
-            if family.child_age >= activity.age_min and family.child_age <= activity.age_max:
-                # Simple scoring based on priorities and traits
-                match_score = 0.5  # Base score
-                
-                # Adjust score based on priorities (placeholder logic)
-                if priorities:
-                    if activity.category == 'physical' and priorities.health > 7:
-                        match_score += 0.2
-                    elif activity.category == 'social' and priorities.social > 7:
-                        match_score += 0.2
-                    elif activity.category == 'cognitive' and priorities.success > 7:
-                        match_score += 0.2
-                
-                # Adjust score based on traits (placeholder logic)
-                if traits:
-                    if activity.category == 'physical' and traits.energy > 0.7:
-                        match_score += 0.1
-                    elif activity.category == 'cognitive' and traits.curiosity > 0.7:
-                        match_score += 0.1
-                    elif activity.category == 'social' and traits.sociability > 0.7:
-                        match_score += 0.1
-                
-                # Only include activities with decent match scores
-                if match_score > 0.6:
-                    recommendation = {
-                        'activity_id': activity.id,
-                        'title': activity.title,
-                        'description': activity.description,
-                        'category': activity.category,
-                        'price_monthly': activity.price_monthly,
-                        'age_min': activity.age_min,
-                        'age_max': activity.age_max,
-                        'address': activity.address,
-                        'phone': activity.phone,
-                        'website': activity.website,
-                        'latitude': activity.latitude,
-                        'longitude': activity.longitude,
-                        'match_score': round(match_score, 2),
-                        'ai_explanation': f"This {activity.category} activity matches your child's age and your family's priorities."
-                    }
-                    recommendations.append(recommendation)
+        # Simple placeholder scoring: the score only depends on the category, so
+        # compute it once per category and spread it over the catalog
+        def category_score(category):
+            match_score = 0.5  # Base score
+            
+            # Adjust score based on priorities (placeholder logic)
+            if priorities:
+                if category == 'physical' and priorities.health > 7:
+                    match_score += 0.2
+                elif category == 'social' and priorities.social > 7:
+                    match_score += 0.2
+                elif category == 'cognitive' and priorities.success > 7:
+                    match_score += 0.2
+            
+            # Adjust score based on traits (placeholder logic)
+            if traits:
+                if category == 'physical' and traits.energy > 0.7:
+                    match_score += 0.1
+                elif category == 'cognitive' and traits.curiosity > 0.7:
+                    match_score += 0.1
+                elif category == 'social' and traits.sociability > 0.7:
+                    match_score += 0.1
+            return match_score
+        
+        # Only categories that can clear the bar, narrowed to the child's age, from the index
+        index = Activity.index()
+        eligible = [category for category in index.categories() if category_score(category) > 0.6]
+        activities = index.select_values(age=family.child_age, categories=eligible)
+        catalog = CatalogColumns.from_objects(activities)
+        
+        scores = catalog.category_values(category_score)
+        rounded = catalog.category_values(lambda category: round(category_score(category), 2))
+        
+        # Exact age bounds (the index works in whole years); only include activities with decent match scores
+        keep = catalog.age_fits(family.child_age) & (scores > 0.6)
         
         # Sort by match score (highest first)
-        recommendations.sort(key=lambda x: x['match_score'], reverse=True)
+        recommendations = []
+        for i in catalog.top_k(rounded, mask=keep):
+            activity = activities[i]
+            recommendations.append({
+                'activity_id': activity.id,
+                'title': activity.title,
+                'description': activity.description,
+                'category': activity.category,
+                'price_monthly': activity.price_monthly,
+                'age_min': activity.age_min,
+                'age_max': activity.age_max,
+                'address': activity.address,
+                'phone': activity.phone,
+                'website': activity.website,
+                'latitude': activity.latitude,
+                'longitude': activity.longitude,
+                'match_score': float(rounded[i]),
+                'ai_explanation': f"This {activity.category} activity matches your child's age and your family's priorities."
+            })
         
         return jsonify({
             'success': True,
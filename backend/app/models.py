@@ -1,7 +1,12 @@
 from datetime import datetime
+import os
+import threading
+import time
 import uuid
 from typing import Dict, List, Optional, Any
 
+from utils.attribute_index import AttributeIndex
+
 class FirestoreModel:
     """Base class for Firestore models"""
     
@@ -212,6 +217,15 @@ class KidTraits(FirestoreModel):
 class Activity(FirestoreModel):
     """Available activities and programs"""
     
+    # Process-wide attribute index over all activities (see Activity.index)
+    _index: Optional[AttributeIndex] = None
+    _index_built_at = 0.0
+    _index_lock = threading.Lock()
+    # Held by the one thread rebuilding the index; saves made meanwhile are replayed onto the new one
+    _index_rebuild_lock = threading.Lock()
+    _index_pending: Optional[Dict[str, 'Activity']] = None
+    INDEX_TTL_S = float(os.getenv("ACTIVITY_INDEX_TTL_S", "300"))
+    
     def __init__(self, data: Dict = None, doc_id: str = None):
         self.id = doc_id or str(uuid.uuid4())
         self.title = None
@@ -270,8 +284,58 @@ class Activity(FirestoreModel):
         
         doc_ref = db.collection(self.collection_name()).document(self.id)
         doc_ref.set(self.to_dict())
+        with Activity._index_lock:
+            if Activity._index is not None:
+                Activity._index.upsert(*self._index_entry())
+            if Activity._index_pending is not None:
+                Activity._index_pending[self.id] = self
         return self.id
     
+    def _index_entry(self):
+        return self.id, self.category, self.age_min, self.age_max, self.price_monthly, self
+    
+    @classmethod
+    def _index_stale(cls) -> bool:
+        return cls._index is None or time.monotonic() - cls._index_built_at > cls.INDEX_TTL_S
+    
+    @classmethod
+    def index(cls) -> AttributeIndex:
+        """Attribute index (category, age, price) over all activities.
+        
+        Built from the collection on first use, updated in place by `save()` and
+        rebuilt every ACTIVITY_INDEX_TTL_S seconds to pick up changes made elsewhere.
+        One thread reads the collection and fills a fresh index without holding the
+        index lock, then swaps it in; until then other callers keep using the old one
+        (only the very first build is waited for). Saves made during the rebuild are
+        replayed onto the fresh index before the swap.
+        """
+        with cls._index_lock:
+            current, stale = cls._index, cls._index_stale()
+        if not stale:
+            return current
+        if not cls._index_rebuild_lock.acquire(blocking=current is None):
+            return current
+        try:
+            with cls._index_lock:
+                if not cls._index_stale():
+                    return cls._index
+                cls._index_pending = {}
+            fresh = AttributeIndex()
+            try:
+                fresh.rebuild(a._index_entry() for a in cls.get_all())
+            except Exception:
+                with cls._index_lock:
+                    cls._index_pending = None
+                raise
+            with cls._index_lock:
+                for activity in cls._index_pending.values():
+                    fresh.upsert(*activity._index_entry())
+                cls._index_pending = None
+                cls._index, cls._index_built_at = fresh, time.monotonic()
+                return fresh
+        finally:
+            cls._index_rebuild_lock.release()
+    
     @classmethod
     def get_all(cls) -> List['Activity']:
         """Get all activities"""
@@ -1,54 +1,92 @@
 import json
 import logging
-from typing import Any, Optional
-from app import redis_client
+import threading
+from typing import Any, List, Optional, Tuple
+from redis.exceptions import WatchError
+from utils.ttl_cache import TTLCache
 
 logger = logging.getLogger(__name__)
 
+CHAT_HISTORY_LIMIT = 50
+
 class CacheService:
-    """Redis-based caching service for recommendations and session data"""
+    """Redis-based caching service for recommendations and session data.
+    
+    Falls back to a per-process LRU when Redis is not connected or a call to it
+    fails (entries written during an outage stay local to this process)."""
     
     def __init__(self):
-        self.redis = redis_client
         self.default_ttl = 3600  # 1 hour default TTL
+        self.local = TTLCache(maxsize=2048, ttl=self.default_ttl)
+        # Serializes read-modify-write of local chat histories
+        self._chat_lock = threading.Lock()
+    
+    @property
+    def redis(self):
+        # Resolved per call: this module may be imported before create_app() connects Redis
+        from app import redis_client
+        return redis_client
+    
+    def _local_get(self, key: str) -> Optional[Any]:
+        value = self.local.get(key)
+        return json.loads(value) if value is not None else None
+    
+    def _local_set(self, key: str, value: Any, ttl: int) -> bool:
+        self.local.set(key, json.dumps(value, default=str), ttl)
+        return True
     
     def get(self, key: str) -> Optional[Any]:
         """Get value from cache"""
         if not self.redis:
-            return None
+            return self._local_get(key)
         
         try:
             value = self.redis.get(key)
             if value:
                 return json.loads(value)
         except Exception as e:
-            logger.warning(f"Cache get error for key {key}: {e}")
+            logger.warning(f"Cache get error for key {key}, using local cache: {e}")
+            return self._local_get(key)
         
         return None
     
     def set(self, key: str, value: Any, ttl: Optional[int] = None) -> bool:
         """Set value in cache with optional TTL"""
+        ttl = ttl or self.default_ttl
         if not self.redis:
-            return False
+            return self._local_set(key, value, ttl)
         
         try:
-            ttl = ttl or self.default_ttl
             serialized_value = json.dumps(value, default=str)
             return self.redis.setex(key, ttl, serialized_value)
         except Exception as e:
-            logger.warning(f"Cache set error for key {key}: {e}")
-            return False
+            logger.warning(f"Cache set error for key {key}, using local cache: {e}")
+            return self._local_set(key, value, ttl)
     
     def delete(self, key: str) -> bool:
         """Delete key from cache"""
         if not self.redis:
-            return False
+            return self.local.delete(key)
         
         try:
             return bool(self.redis.delete(key))
         except Exception as e:
-            logger.warning(f"Cache delete error for key {key}: {e}")
-            return False
+            logger.warning(f"Cache delete error for key {key}, using local cache: {e}")
+            return self.local.delete(key)
+    
+    def ttl(self, key: str) -> Optional[float]:
+        """Seconds until key expires (inf if it never does), None if missing"""
+        if not self.redis:
+            return self.local.ttl_remaining(key)
+        
+        try:
+            remaining = self.redis.ttl(key)
+            if remaining == -1:
+                return float('inf')
+            return float(remaining) if remaining and remaining > 0 else None
+        except Exception as e:
+            logger.warning(f"Cache ttl error for key {key}, using local cache: {e}")
+            return self.local.ttl_remaining(key)
     
     def get_recommendations(self, family_id: str) -> Optional[list]:
         """Get cached recommendations for a family"""
@@ -58,28 +96,113 @@ class CacheService:
         """Cache recommendations for a family (2 hour TTL by default)"""
         return self.set(f"recommendations:{family_id}", recommendations, ttl)
     
+    def recommendations_ttl(self, family_id: str) -> Optional[float]:
+        """Seconds left on cached recommendations for a family, None if not cached"""
+        return self.ttl(f"recommendations:{family_id}")
+    
     def invalidate_recommendations(self, family_id: str) -> bool:
         """Invalidate cached recommendations when family profile changes"""
         return self.delete(f"recommendations:{family_id}")
     
+    # Chat histories are Redis lists (one JSON message per element) so appends
+    # and compaction are atomic and never overwrite each other's turns.
+    
     def get_chat_history(self, family_id: str) -> Optional[list]:
         """Get cached chat history for a family"""
-        return self.get(f"chat_history:{family_id}")
+        return self.get_chat(family_id)[0]
+    
+    def get_chat(self, family_id: str) -> Tuple[Optional[list], Optional[str]]:
+        """(history, running summary) for a family, read together"""
+        key, summary_key = f"chat_log:{family_id}", f"chat_summary:{family_id}"
+        if self.redis:
+            try:
+                pipe = self.redis.pipeline()
+                pipe.lrange(key, 0, -1)
+                pipe.get(summary_key)
+                messages, summary = pipe.execute()
+                return [json.loads(m) for m in messages] or None, json.loads(summary) if summary else None
+            except Exception as e:
+                logger.warning(f"Chat history get error for {family_id}: {e}")
+        with self._chat_lock:
+            return self._local_get(key), self._local_get(summary_key)
     
     def set_chat_history(self, family_id: str, messages: list, ttl: int = 86400) -> bool:
-        """Cache chat history for a family (24 hour TTL)"""
-        return self.set(f"chat_history:{family_id}", messages, ttl)
+        """Replace cached chat history for a family (24 hour TTL)"""
+        key = f"chat_log:{family_id}"
+        if self.redis:
+            try:
+                pipe = self.redis.pipeline()
+                pipe.delete(key)
+                if messages:
+                    pipe.rpush(key, *[json.dumps(m, default=str) for m in messages[-CHAT_HISTORY_LIMIT:]])
+                    pipe.expire(key, ttl)
+                pipe.execute()
+                return True
+            except Exception as e:
+                logger.warning(f"Chat history set error for {family_id}: {e}")
+        with self._chat_lock:
+            return self._local_set(key, messages[-CHAT_HISTORY_LIMIT:], ttl)
+    
+    def append_chat_messages(self, family_id: str, messages: List[dict], ttl: int = 86400) -> int:
+        """Atomically append messages (keeping the last 50); returns the history length afterwards"""
+        key = f"chat_log:{family_id}"
+        if self.redis:
+            try:
+                pipe = self.redis.pipeline()
+                pipe.rpush(key, *[json.dumps(m, default=str) for m in messages])
+                pipe.ltrim(key, -CHAT_HISTORY_LIMIT, -1)
+                pipe.expire(key, ttl)
+                return min(pipe.execute()[0], CHAT_HISTORY_LIMIT)
+            except Exception as e:
+                logger.warning(f"Chat history append error for {family_id}: {e}")
+        with self._chat_lock:
+            history = ((self._local_get(key) or []) + list(messages))[-CHAT_HISTORY_LIMIT:]
+            self._local_set(key, history, ttl)
+            return len(history)
     
     def append_chat_message(self, family_id: str, message: dict) -> bool:
         """Append a new message to chat history"""
-        history = self.get_chat_history(family_id) or []
-        history.append(message)
-        
-        # Keep only last 50 messages
-        if len(history) > 50:
-            history = history[-50:]
-        
-        return self.set_chat_history(family_id, history)
+        return self.append_chat_messages(family_id, [message]) > 0
+    
+    def compact_chat_history(self, family_id: str, older: list, summary: str, ttl: int = 86400) -> bool:
+        """Replace the `older` prefix of the history with `summary`, only if the history still starts with it"""
+        key, summary_key = f"chat_log:{family_id}", f"chat_summary:{family_id}"
+        if self.redis:
+            try:
+                with self.redis.pipeline() as pipe:
+                    # Retry when a turn is appended between the check and the write
+                    for _ in range(5):
+                        try:
+                            pipe.watch(key)
+                            head = [json.loads(m) for m in pipe.lrange(key, 0, len(older) - 1)]
+                            if head != older:
+                                pipe.unwatch()
+                                return False
+                            pipe.multi()
+                            pipe.ltrim(key, len(older), -1)
+                            pipe.setex(summary_key, ttl, json.dumps(summary))
+                            pipe.execute()
+                            return True
+                        except WatchError:
+                            continue
+                return False
+            except Exception as e:
+                logger.warning(f"Chat history compaction error for {family_id}: {e}")
+        with self._chat_lock:
+            history = self._local_get(key) or []
+            if history[:len(older)] != older:
+                return False
+            self._local_set(summary_key, summary, ttl)
+            self._local_set(key, history[len(older):], ttl)
+            return True
+    
+    def get_chat_summary(self, family_id: str) -> Optional[str]:
+        """Get the running summary of compacted chat turns"""
+        return self.get(f"chat_summary:{family_id}")
+    
+    def set_chat_summary(self, family_id: str, summary: str, ttl: int = 86400) -> bool:
+        """Cache the running chat summary (same 24 hour TTL as the history)"""
+        return self.set(f"chat_summary:{family_id}", summary, ttl)
 
 # Global cache service instance
 cache_service = CacheService()
\ No newline at end of file
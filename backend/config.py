@@ -22,6 +22,12 @@ class Config:
     # Google Maps API
     GOOGLE_MAPS_API_KEY = os.environ.get('GOOGLE_MAPS_API_KEY')
     
+    # Upstream base URLs (point these at scripts/upstream_standin.py to run offline)
+    ANTHROPIC_BASE_URL = os.environ.get('ANTHROPIC_BASE_URL') or 'https://api.anthropic.com'
+    CEREBRAS_BASE_URL = os.environ.get('CEREBRAS_BASE_URL') or 'https://api.cerebras.ai/v1'
+    GOOGLE_MAPS_BASE_URL = os.environ.get('GOOGLE_MAPS_BASE_URL') or 'https://maps.googleapis.com'
+    WIKIPEDIA_BASE_URL = os.environ.get('WIKIPEDIA_BASE_URL') or 'https://en.wikipedia.org'
+    
     # Fetch.ai configuration
     FETCHAI_ENABLED = os.environ.get('FETCHAI_ENABLED', 'false').lower() == 'true'
     FETCHAI_OEF_ADDR = os.environ.get('FETCHAI_OEF_ADDR', '127.0.0.1')
@@ -0,0 +1,103 @@
+"""
+Shared pytest fixtures for the backend tests
+"""
+
+import threading
+import time
+
+import pytest
+
+
+class FakeRedis:
+    """In-memory stand-in for the few redis-py calls the utils modules make (bytes out, like redis-py)."""
+
+    def __init__(self):
+        self.data = {}
+        self.expires = {}
+        self.fail = False
+        self._lock = threading.RLock()
+
+    def _check(self):
+        if self.fail:
+            raise ConnectionError("redis down")
+
+    def _live(self, key):
+        expires = self.expires.get(key)
+        if expires is not None and expires <= time.monotonic():
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+        return key in self.data
+
+    @staticmethod
+    def _bytes(value):
+        return value if isinstance(value, bytes) else str(value).encode()
+
+    def get(self, key):
+        self._check()
+        with self._lock:
+            return self.data[key] if self._live(key) else None
+
+    def set(self, key, value, nx=False, ex=None, px=None):
+        self._check()
+        with self._lock:
+            if nx and self._live(key):
+                return None
+            self.data[key] = self._bytes(value)
+            self.expires.pop(key, None)
+            if ex is not None or px is not None:
+                self.expires[key] = time.monotonic() + (ex if ex is not None else px / 1000)
+            return True
+
+    def setex(self, key, ttl, value):
+        return self.set(key, value, ex=ttl)
+
+    def delete(self, *keys):
+        self._check()
+        with self._lock:
+            removed = 0
+            for key in keys:
+                if self._live(key):
+                    removed += 1
+                self.data.pop(key, None)
+                self.expires.pop(key, None)
+            return removed
+
+    def exists(self, key):
+        self._check()
+        with self._lock:
+            return int(self._live(key))
+
+    def rpush(self, key, *values):
+        self._check()
+        with self._lock:
+            if not self._live(key):
+                self.data[key] = []
+            self.data[key].extend(self._bytes(v) for v in values)
+            return len(self.data[key])
+
+    def blpop(self, key, timeout=0):
+        until = time.monotonic() + timeout
+        while True:
+            self._check()
+            with self._lock:
+                if self._live(key) and self.data[key]:
+                    return key.encode(), self.data[key].pop(0)
+            if time.monotonic() >= until:
+                return None
+            time.sleep(0.01)
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    """A FakeRedis installed as `app.redis_client` for the duration of a test."""
+    import app
+    redis = FakeRedis()
+    monkeypatch.setattr(app, "redis_client", redis)
+    return redis
+
+
+@pytest.fixture
+def no_redis(monkeypatch):
+    """Run a test with Redis disconnected (process-memory fallbacks)."""
+    import app
+    monkeypatch.setattr(app, "redis_client", None)
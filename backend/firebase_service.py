@@ -2,6 +2,47 @@ import firebase_admin
 from firebase_admin import credentials, firestore
 import json
 import os
+import re
+import threading
+import time
+
+from utils.attribute_index import AttributeIndex
+from utils.geo_index import GeoIndex
+from utils.metrics import register_metrics
+
+# Seconds to wait for the programs listener's first snapshot before scanning instead
+PROGRAM_INDEX_READY_S = float(os.getenv("PROGRAM_INDEX_READY_S", "10"))
+# Full reload interval when the realtime listener is unavailable
+PROGRAM_INDEX_REFRESH_S = float(os.getenv("PROGRAM_INDEX_REFRESH_S", "300"))
+
+
+def program_location(program):
+    """(lat, lng) of a program document, or (None, None) if it has no usable coordinates."""
+    lat = program.get('latitude', program.get('lat'))
+    lng = program.get('longitude', program.get('lng'))
+    try:
+        return float(lat), float(lng)
+    except (TypeError, ValueError):
+        return None, None
+
+
+def program_price(program):
+    price = program.get('priceMonthly', program.get('price_monthly'))
+    return price if isinstance(price, (int, float)) else None
+
+
+def program_age_range(program):
+    age_range = program.get('ageRange') or [None, None]
+    return program.get('age_min', age_range[0]), program.get('age_max', age_range[-1])
+
+
+def program_zip(program):
+    zip_code = program.get('zip') or program.get('zipCode') or program.get('zip_code')
+    if zip_code:
+        return str(zip_code)[:5]
+    match = re.search(r'\b(\d{5})(?:-\d{4})?\b', program.get('address') or '')
+    return match.group(1) if match else None
+
 
 class FirebaseService:
     def __init__(self):
@@ -10,12 +51,20 @@ class FirebaseService:
             firebase_admin.initialize_app(cred)
         
         self.db = firestore.client()
+        self._program_index = None
+        self._program_attributes = AttributeIndex()
+        self._program_index_lock = threading.Lock()
+        self._program_index_ready = threading.Event()
+        self._program_watch = None
+        self._program_index_loaded_at = 0.0
+        register_metrics("program_index", self.program_index_snapshot)
     
     def add_program(self, program_data):
         """Add a single program to Firestore"""
         try:
             doc_ref = self.db.collection('programs').document()
             doc_ref.set(program_data)
+            self._index_program(doc_ref.id, program_data)
             return doc_ref.id
         except Exception as e:
             print(f"Error adding program: {e}")
@@ -25,39 +74,138 @@ class FirebaseService:
         """Add multiple programs to Firestore"""
         try:
             batch = self.db.batch()
+            added = []
             for program in programs_list:
                 doc_ref = self.db.collection('programs').document()
                 batch.set(doc_ref, program)
+                added.append((doc_ref.id, program))
             batch.commit()
+            for doc_id, program in added:
+                self._index_program(doc_id, program)
             return True
         except Exception as e:
             print(f"Error adding programs batch: {e}")
             return False
     
     def get_programs(self, filters=None):
-        """Get programs from Firestore with optional filters"""
+        """Get programs from Firestore with optional filters
+
+        With `lat`/`lng` (and `radius_m`, default 10 km) programs come from the
+        in-memory geo index, nearest first, each with its `distance_m`. `age`,
+        `max_price` and `categories` are answered by the in-memory attribute index.
+        """
         try:
-            query = self.db.collection('programs')
-            
-            if filters:
-                if 'zip' in filters:
-                    # Add zip-based filtering logic here
-                    pass
-                if 'max_price' in filters:
-                    query = query.where('priceMonthly', '<=', filters['max_price'])
+            filters = filters or {}
+            if filters.get('lat') is not None and filters.get('lng') is not None:
+                programs = self._nearby_programs(filters)
+            elif any(filters.get(k) is not None for k in ('age', 'max_price', 'categories')):
+                self.program_index()
+                programs = [dict(p) for p in self._program_attributes.select_values(**self._attribute_filters(filters))]
+            else:
+                programs = []
+                for doc in self.db.collection('programs').stream():
+                    program = doc.to_dict()
+                    program['id'] = doc.id
+                    programs.append(program)
             
-            docs = query.stream()
-            programs = []
-            for doc in docs:
-                program = doc.to_dict()
-                program['id'] = doc.id
-                programs.append(program)
+            if 'zip' in filters and filters.get('lat') is None:
+                # Programs in another zip are dropped; ones without any zip are kept
+                wanted = str(filters['zip'])[:5]
+                programs = [p for p in programs if program_zip(p) in (None, wanted)]
             
             return programs
         except Exception as e:
             print(f"Error getting programs: {e}")
             return []
     
+    # ---------- PROGRAM GEO INDEX ----------
+    
+    def program_index(self):
+        """Geo index over the programs collection, kept current by a realtime listener."""
+        with self._program_index_lock:
+            if self._program_index is None:
+                self._program_index = GeoIndex()
+                self._watch_programs()
+            elif self._program_watch is None and time.monotonic() - self._program_index_loaded_at > PROGRAM_INDEX_REFRESH_S:
+                self._load_programs()
+        if not self._program_index_ready.wait(PROGRAM_INDEX_READY_S):
+            print("Programs listener not ready; loading the collection directly")
+            with self._program_index_lock:
+                self._load_programs()
+        return self._program_index
+    
+    def _watch_programs(self):
+        def on_snapshot(col_snapshot, changes, read_time):
+            for change in changes:
+                if change.type.name == 'REMOVED':
+                    self._program_index.remove(change.document.id)
+                    self._program_attributes.remove(change.document.id)
+                else:
+                    self._index_program(change.document.id, change.document.to_dict() or {})
+            self._program_index_ready.set()
+        
+        try:
+            self._program_watch = self.db.collection('programs').on_snapshot(on_snapshot)
+        except Exception as e:
+            print(f"Programs listener unavailable, reloading every {PROGRAM_INDEX_REFRESH_S:.0f}s: {e}")
+            self._program_watch = None
+            self._load_programs()
+    
+    def _load_programs(self):
+        try:
+            docs = list(self.db.collection('programs').stream())
+        except Exception as e:
+            print(f"Error loading programs index: {e}")
+            return
+        seen = set()
+        for doc in docs:
+            seen.add(doc.id)
+            self._index_program(doc.id, doc.to_dict() or {})
+        for doc_id, _ in self._program_index.items():
+            if doc_id not in seen:
+                self._program_index.remove(doc_id)
+                self._program_attributes.remove(doc_id)
+        self._program_index_loaded_at = time.monotonic()
+        self._program_index_ready.set()
+    
+    def _index_program(self, doc_id, program):
+        if self._program_index is None:
+            return
+        lat, lng = program_location(program)
+        age_min, age_max = program_age_range(program)
+        program = dict(program, id=doc_id)
+        self._program_index.upsert(doc_id, lat, lng, program)
+        self._program_attributes.upsert(doc_id, program.get('category'), age_min, age_max, program_price(program), program)
+    
+    @staticmethod
+    def _attribute_filters(filters):
+        return {
+            'age': filters.get('age'),
+            'categories': filters.get('categories'),
+            'max_price': filters.get('max_price'),
+        }
+    
+    def _nearby_programs(self, filters):
+        index = self.program_index()
+        radius_m = float(filters.get('radius_m') or 10000)
+        matching = self._program_attributes.select_keys(**self._attribute_filters(filters))
+        programs = []
+        for doc_id, distance_m in index.radius(float(filters['lat']), float(filters['lng']), radius_m):
+            program = index.get(doc_id)
+            if program is None or doc_id not in matching:
+                continue
+            programs.append(dict(program, distance_m=round(distance_m)))
+        return programs
+    
+    def program_index_snapshot(self):
+        index = self._program_index
+        return {
+            "built": index is not None,
+            "realtime": self._program_watch is not None,
+            **(index.snapshot() if index is not None else {}),
+            "attributes": self._program_attributes.snapshot(),
+        }
+    
     def get_user_data(self, user_id):
         """Get user data from Firestore"""
         try:
@@ -1,38 +1,79 @@
-import os
 import json
-from openai import OpenAI
+import logging
+import os
+
+from utils.chat_providers import AnthropicChatProvider, OpenAIChatProvider, ProviderPool
+from utils.llm_clients import get_anthropic_client, get_cerebras_client
+from utils.llm_metrics import MeteredAnthropic, MeteredOpenAI
+from utils.metrics import register_metrics
+from utils.model_router import HAIKU
+from utils.similarity_cache import age_band, similarity_cache
+
+logger = logging.getLogger(__name__)
+
+# Conversation history sent with each chat call is capped at roughly this many tokens
+HISTORY_TOKEN_BUDGET = int(os.getenv("CHAT_HISTORY_TOKEN_BUDGET", "2000"))
+
+# Once a stored conversation passes SUMMARY_TRIGGER_MESSAGES, everything but the
+# last SUMMARY_KEEP_MESSAGES is folded into a running summary in the background
+SUMMARY_KEEP_MESSAGES = 2 * int(os.getenv("CHAT_SUMMARY_KEEP_TURNS", "4"))
+SUMMARY_TRIGGER_MESSAGES = SUMMARY_KEEP_MESSAGES + 6
+
+FALLBACK_ADVICE = {
+    "advice": "I'm having trouble processing your request right now. Please try again.",
+    "actionable_steps": ["Try rephrasing your question", "Check back in a moment"]
+}
+
+def estimate_tokens(text):
+    """Rough token count (~4 characters per token plus per-message overhead)"""
+    return len(text or "") // 4 + 4
+
+def trim_history(messages, budget=HISTORY_TOKEN_BUDGET):
+    """Most recent messages that fit in the token budget; the latest message is always kept"""
+    kept = []
+    used = 0
+    for message in reversed(messages):
+        cost = estimate_tokens(message.get("content"))
+        if kept and used + cost > budget:
+            break
+        kept.append(message)
+        used += cost
+    return list(reversed(kept))
 
 class ParentingChatService:
     def __init__(self):
-        self.client = OpenAI(
-            api_key=os.getenv('CEREBRAS_API_KEY'),
-            base_url="https://api.cerebras.ai/v1"
-        )
+        self.client = get_cerebras_client()
+        self.llm = MeteredOpenAI(self.client, provider="cerebras")
         self.model = "llama3.1-8b"  # Use smaller model for faster responses
+        # Chat replies fail over / hedge to Claude Haiku when Cerebras is slow or down
+        providers = [OpenAIChatProvider(self.llm, self.model)]
+        if os.getenv("ANTHROPIC_API_KEY") and os.getenv("CHAT_BACKUP_PROVIDER", "anthropic") == "anthropic":
+            providers.append(AnthropicChatProvider(MeteredAnthropic(get_anthropic_client()), HAIKU))
+        self.providers = ProviderPool(providers)
+        register_metrics("chat_providers", self.providers.snapshot)
+        # Near-identical behavior/activity requests reuse an earlier structured answer
+        self.behavior_cache = similarity_cache("chat.behavior")
+        self.activities_cache = similarity_cache("chat.activities")
         
-    def get_parenting_advice(self, messages, child_age=None, parenting_style=None, specific_challenge=None, kid_traits=None, intake=None):
+    def get_parenting_advice(self, messages, child_age=None, parenting_style=None, specific_challenge=None, kid_traits=None, intake=None, summary=None):
         """Get personalized parenting advice with context"""
         
-        # Build system prompt based on context
-        system_prompt = self._build_system_prompt(child_age, parenting_style, specific_challenge, kid_traits, intake)
-        
-        # Prepare messages with system context
-        chat_messages = [{"role": "system", "content": system_prompt}] + messages
+        chat_messages = self._chat_messages(messages, child_age, parenting_style, specific_challenge, kid_traits, intake, summary)
+        system_prompt = chat_messages[0]["content"]
         
         try:
-            print(f"🤖 Making request to Cerebras with model: {self.model}")
+            print(f"🤖 Making chat request (providers: {', '.join(p.name for p in self.providers.providers)})")
             print(f"📝 System prompt: {system_prompt[:200]}...")
             print(f"💬 Messages: {len(chat_messages)} messages")
             
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=chat_messages,
-                max_completion_tokens=800,
+            content = self.providers.complete(
+                "chat.advice",
+                chat_messages,
+                max_tokens=800,
                 temperature=0.7,  # Higher temperature for more variety
             )
             
-            print(f"✅ Got response from Cerebras")
-            content = response.choices[0].message.content
+            print(f"✅ Got chat response")
             print(f"📊 Raw response: {content[:200]}...")
             
             # Parse the response into structured format
@@ -45,13 +86,48 @@ class ParentingChatService:
             
         except Exception as e:
             print(f"Error getting parenting advice: {e}")
-            return {
-                "advice": "I'm having trouble processing your request right now. Please try again.",
-                "actionable_steps": ["Try rephrasing your question", "Check back in a moment"]
-            }
+            return dict(FALLBACK_ADVICE)
+    
+    def stream_parenting_advice(self, messages, child_age=None, parenting_style=None, specific_challenge=None, kid_traits=None, intake=None, summary=None):
+        """Stream advice as ("token", text) events, then one ("done", {advice, actionable_steps}) event.
+        
+        If the provider fails after tokens were sent, the last event is ("error", {error, advice,
+        actionable_steps}) with the fallback advice instead, so a truncated reply is never
+        passed off as a finished one.
+        """
+        chat_messages = self._chat_messages(messages, child_age, parenting_style, specific_challenge, kid_traits, intake, summary)
+        parts = []
+        try:
+            for delta in self.providers.stream(
+                "chat.advice_stream",
+                chat_messages,
+                max_tokens=800,
+                temperature=0.7,
+            ):
+                parts.append(delta)
+                yield "token", delta
+        except Exception as e:
+            logger.warning(f"Error streaming parenting advice after {len(parts)} tokens: {e}")
+            if parts:
+                yield "error", dict(FALLBACK_ADVICE, error="Reply interrupted")
+            else:
+                yield "done", dict(FALLBACK_ADVICE)
+            return
+        
+        content = "".join(parts)
+        yield "done", {
+            "advice": content,
+            "actionable_steps": self._extract_steps(content),
+        }
     
-    def analyze_child_behavior(self, behavior_description, child_age, context=""):
-        """Analyze child behavior and provide insights"""
+    def analyze_child_behavior(self, behavior_description, child_age, context="", raise_errors=False):
+        """Analyze child behavior and provide insights (a fallback answer on failure, unless raise_errors)"""
+        
+        cache_scope = age_band(child_age)
+        cache_text = f"{behavior_description} {context}"
+        cached = self.behavior_cache.get(cache_scope, cache_text)
+        if cached is not None:
+            return cached
         
         messages = [{
             "role": "user",
@@ -62,7 +138,8 @@ class ParentingChatService:
         Provide developmental insights, possible causes, and evidence-based strategies. Be supportive and non-judgmental."""
         
         try:
-            response = self.client.chat.completions.create(
+            response = self.llm.create(
+                "chat.behavior",
                 model=self.model,
                 messages=[{"role": "system", "content": system_prompt}] + messages,
                 max_completion_tokens=600,
@@ -94,10 +171,15 @@ class ParentingChatService:
                 }
             )
             
-            return json.loads(response.choices[0].message.content)
+            result = json.loads(response.choices[0].message.content)
+            if result.get("strategies"):
+                self.behavior_cache.set(cache_scope, cache_text, result)
+            return result
             
         except Exception as e:
             print(f"Error analyzing behavior: {e}")
+            if raise_errors:
+                raise
             return {
                 "analysis": "Unable to analyze behavior at this time.",
                 "developmental_stage": "Please try again",
@@ -105,14 +187,20 @@ class ParentingChatService:
                 "strategies": []
             }
     
-    def generate_activities(self, child_age, interests, available_time, materials_available="basic"):
-        """Generate age-appropriate activities"""
+    def generate_activities(self, child_age, interests, available_time, materials_available="basic", raise_errors=False):
+        """Generate age-appropriate activities (no activities on failure, unless raise_errors)"""
+        
+        cache_scope = (age_band(child_age), " ".join(str(available_time).lower().split()), " ".join(str(materials_available).lower().split()))
+        cached = self.activities_cache.get(cache_scope, str(interests))
+        if cached is not None:
+            return cached
         
         prompt = f"""Generate engaging activities for a {child_age}-year-old who likes {interests}. 
         Available time: {available_time}. Materials: {materials_available}."""
         
         try:
-            response = self.client.chat.completions.create(
+            response = self.llm.create(
+                "chat.activities",
                 model=self.model,
                 messages=[{
                     "role": "system", 
@@ -154,12 +242,51 @@ class ParentingChatService:
                 }
             )
             
-            return json.loads(response.choices[0].message.content)
+            result = json.loads(response.choices[0].message.content)
+            if result.get("activities"):
+                self.activities_cache.set(cache_scope, str(interests), result)
+            return result
             
         except Exception as e:
             print(f"Error generating activities: {e}")
+            if raise_errors:
+                raise
             return {"activities": []}
     
+    def summarize_conversation(self, messages, previous_summary=None):
+        """Fold older turns (and the previous summary) into one short summary; None on failure"""
+        transcript = "\n".join(f"{m['role'].upper()}: {m['content']}" for m in messages)
+        prompt = f"Conversation so far:\n{transcript}"
+        if previous_summary:
+            prompt = f"Earlier summary:\n{previous_summary}\n\n{prompt}"
+        
+        try:
+            response = self.llm.create(
+                "chat.summary",
+                model=self.model,
+                messages=[{
+                    "role": "system",
+                    "content": "Summarize this parenting conversation for the assistant's memory in under 150 words. Keep the child's details, the parent's concerns, advice already given and anything the parent said worked or didn't. Write plain prose, no preamble."
+                }, {
+                    "role": "user",
+                    "content": prompt
+                }],
+                max_completion_tokens=300,
+                temperature=0.2,
+            )
+            return response.choices[0].message.content.strip() or None
+        except Exception as e:
+            print(f"Error summarizing conversation: {e}")
+            return None
+    
+    def _chat_messages(self, messages, child_age, parenting_style, specific_challenge, kid_traits, intake, summary=None):
+        """System prompt built from context, then any running summary, then the conversation trimmed to the token budget"""
+        system_prompt = self._build_system_prompt(child_age, parenting_style, specific_challenge, kid_traits, intake)
+        chat_messages = [{"role": "system", "content": system_prompt}]
+        if summary:
+            chat_messages.append({"role": "system", "content": f"Summary of the earlier conversation: {summary}"})
+        return chat_messages + trim_history(messages)
+    
     def _build_system_prompt(self, child_age, parenting_style, specific_challenge, kid_traits, intake):
         """Build contextual system prompt"""
         
@@ -3,12 +3,20 @@ AI-powered recommendation engine: fetches REAL nearby businesses (Google/Yelp),
 then uses AI to rank/explain. Falls back gracefully.
 """
 
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from typing import List, Dict, Any, Optional
 import json
 import logging
+import os
+import random
+import threading
+import time
 from anthropic_service import AnthropicService
 
-from web_places_service import WebPlacesService
+from web_places_service import WebPlacesService, _distance_radius_by_transport
+from utils.catalog import CatalogColumns
+from utils.metrics import LatencyWindow, register_metrics
+from utils.ranker import FEATURES, AgreementStats, LocalRanker, RerankLog, explain, ranking_features
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -17,12 +25,36 @@ logger = logging.getLogger(__name__)
 class AIRecommendationEngine:
     """Blend web businesses with AI ranking & explanations (plus fallbacks)."""
 
-    def __init__(self, firebase_service=None, maps_service=None, places_service: Optional[WebPlacesService] = None):
-        self.anthropic_service = AnthropicService()
+    def __init__(self, firebase_service=None, maps_service=None, places_service: Optional[WebPlacesService] = None,
+                 anthropic_service: Optional[AnthropicService] = None):
+        self.anthropic_service = anthropic_service or AnthropicService()
         self.firebase_service = firebase_service
         self.maps_service = maps_service
         self.places_service = places_service or WebPlacesService()
 
+        # Re-rank: LLM (logging pairs for the distilled ranker) or the distilled ranker itself
+        self.ranker = LocalRanker.load()
+        self.rerank_mode = os.getenv("RERANK_MODE", "llm").lower()
+        if self.rerank_mode == "local" and self.ranker is None:
+            logger.warning("RERANK_MODE=local but no trained local ranker found; using the LLM re-rank")
+        self.shadow_rate = float(os.getenv("RERANK_SHADOW_RATE", "0.1"))
+        self.rerank_log = RerankLog()
+        self.agreement = AgreementStats()
+        self._shadow = ThreadPoolExecutor(max_workers=2, thread_name_prefix="rerank-shadow")
+        register_metrics("local_ranker", self.ranker_snapshot)
+
+        # Fallback cascade, highest priority first; all tiers run concurrently
+        self.tiers = [("web", self._web_tier), ("catalog", self._catalog_tier), ("ai_only", self._ai_only_tier)]
+        self.tier_deadline_s = float(os.getenv("RECS_TIER_DEADLINE_S", "30"))
+        self.ai_tier_delay_s = float(os.getenv("RECS_AI_TIER_DELAY_S", "0"))
+        self._tier_pool = ThreadPoolExecutor(
+            max_workers=int(os.getenv("RECS_TIER_WORKERS", "12")), thread_name_prefix="recs-tier"
+        )
+        self._tier_latency = {name: LatencyWindow() for name, _ in self.tiers}
+        self._tier_lock = threading.Lock()
+        self._tier_stats: Dict[str, int] = {}
+        register_metrics("recommendation_tiers", self.tiers_snapshot)
+
     # ---------- PUBLIC ----------
 
     def get_recommendations(
@@ -40,6 +72,7 @@ class AIRecommendationEngine:
         lat: Optional[float] = None,
         lng: Optional[float] = None,
         zip_code: Optional[str] = None,
+        kid_traits: Optional[Dict[str, float]] = None,
     ) -> List[Dict[str, Any]]:
         family_profile = {
             "budget_per_week": budget_per_week,
@@ -55,58 +88,161 @@ class AIRecommendationEngine:
             "lat": lat,
             "lng": lng,
             "zip_code": zip_code,
+            "kid_traits": kid_traits or {},
         }
         logger.info(f"Generating recommendations with family profile: {family_profile}")
 
+        return self._race_tiers(family_profile)
+
+    # ---------- TIERS ----------
+
+    def _race_tiers(self, family_profile: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        Start every tier at once and return the highest-priority non-empty result
+        (web > catalog > AI-only) as soon as no higher-priority tier is still running,
+        or whatever is best once the deadline passes. Losing tiers are told to stop.
+        """
+        cancel = threading.Event()
+        start = time.monotonic()
+        deadline = start + self.tier_deadline_s
+        # Geocode once for every tier, then give each tier its own profile copy
+        family_profile = dict(family_profile)
+        self._resolve_location(family_profile)
+        futures = {
+            self._tier_pool.submit(self._timed_tier, name, fn, dict(family_profile), cancel): name
+            for name, fn in self.tiers
+        }
+        pending = set(futures)
+        results: Dict[str, List[Dict[str, Any]]] = {}
+        try:
+            while True:
+                winner = None
+                for name, _ in self.tiers:
+                    if name not in results:
+                        break  # a higher-priority tier may still succeed
+                    if results[name]:
+                        winner = name
+                        break
+                if winner is not None or not pending:
+                    break
+                done, pending = wait(pending, timeout=max(0.0, deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+                if not done:
+                    self._count_tier("timeouts")
+                    winner = next((name for name, _ in self.tiers if results.get(name)), None)
+                    logger.warning(f"Recommendation tiers missed the {self.tier_deadline_s}s deadline; best finished: {winner}")
+                    break
+                for future in done:
+                    results[futures[future]] = future.result()
+        finally:
+            cancel.set()
+            for future in pending:
+                if future.cancel():
+                    self._count_tier("cancelled")
+
+        if winner is None:
+            # 4) Hard fallback
+            self._count_tier("fallback")
+            return self._get_fallback_recommendations(family_profile)
+        self._count_tier(winner)
+        logger.info(f"Recommendation tier {winner} won after {time.monotonic() - start:.2f}s")
+        return results[winner]
+
+    def _timed_tier(self, name: str, fn, family_profile: Dict[str, Any], cancel: threading.Event) -> List[Dict[str, Any]]:
+        started = time.monotonic()
+        ok = False
+        try:
+            items = fn(family_profile, cancel)
+            ok = True
+            return items or []
+        except Exception as e:
+            logger.error(f"Recommendation tier {name} failed: {e}")
+            return []
+        finally:
+            self._tier_latency[name].record(time.monotonic() - started, ok)
+
+    def _web_tier(self, family_profile: Dict[str, Any], cancel: threading.Event) -> List[Dict[str, Any]]:
         # 1) Web businesses near location
         web_items = self._fetch_from_web(family_profile)
-        if web_items:
-            ranked = self._rank_and_explain_with_ai(web_items, family_profile)
-            if ranked:
-                ranked.sort(key=lambda x: x.get("match_score", 0), reverse=True)
-                return ranked
-            # local backup score if AI fails
-            local = self._local_score(web_items, family_profile)
-            local.sort(key=lambda x: x.get("match_score", 0), reverse=True)
-            return local
+        ranked = self._rank_tier(web_items, family_profile, cancel)
+        if not ranked or cancel.is_set():
+            return ranked
+        # Place Details only for what is actually returned
+        return self.places_service.attach_details(ranked)
 
+    def _catalog_tier(self, family_profile: Dict[str, Any], cancel: threading.Event) -> List[Dict[str, Any]]:
         # 2) (Optional) Firebase catalog—keep if you still want to mix in-house data
         firebase_items = self._fetch_catalog(family_profile)
-        if firebase_items:
-            ranked = self._rank_and_explain_with_ai(firebase_items, family_profile)
-            if ranked:
-                ranked.sort(key=lambda x: x.get("match_score", 0), reverse=True)
-                return ranked
-            local = self._local_score(firebase_items, family_profile)
-            local.sort(key=lambda x: x.get("match_score", 0), reverse=True)
-            return local
-
-        # 3) AI-invented
+        return self._rank_tier(firebase_items, family_profile, cancel)
+
+    def _ai_only_tier(self, family_profile: Dict[str, Any], cancel: threading.Event) -> List[Dict[str, Any]]:
+        # 3) AI-invented (optionally held back a little: it costs a model call whenever it starts)
+        if self.ai_tier_delay_s > 0:
+            cancel.wait(self.ai_tier_delay_s)
+        if cancel.is_set():
+            return []
         ai_only = self._generate_ai_recommendations(family_profile)
-        if ai_only:
-            ai_only.sort(key=lambda x: x.get("match_score", 0), reverse=True)
-            return ai_only
+        ai_only.sort(key=lambda x: x.get("match_score", 0), reverse=True)
+        return ai_only
 
-        # 4) Hard fallback
-        return self._get_fallback_recommendations(family_profile)
+    def _rank_tier(self, items: List[Dict[str, Any]], family_profile: Dict[str, Any], cancel: threading.Event) -> List[Dict[str, Any]]:
+        if not items:
+            return []
+        # A higher-priority tier already won: skip the re-rank call
+        if cancel.is_set():
+            return []
+        ranked = self._rank_and_explain(items, family_profile)
+        if ranked:
+            ranked.sort(key=lambda x: x.get("match_score", 0), reverse=True)
+            return ranked
+        # local backup score if AI fails
+        return self._local_score(items, family_profile)
+
+    def _count_tier(self, outcome: str) -> None:
+        with self._tier_lock:
+            self._tier_stats[outcome] = self._tier_stats.get(outcome, 0) + 1
+
+    def tiers_snapshot(self) -> Dict[str, Any]:
+        with self._tier_lock:
+            stats = dict(self._tier_stats)
+        return {
+            "deadline_s": self.tier_deadline_s,
+            "outcomes": stats,
+            "latency": {name: window.snapshot() for name, window in self._tier_latency.items()},
+        }
 
     # ---------- FETCHERS ----------
 
+    def _resolve_location(self, family_profile: Dict[str, Any]) -> bool:
+        """Fill in the family's lat/lng (geocoding the zip if needed); False if unknown.
+
+        Called once per request by `_race_tiers`; tiers only check `_has_location`.
+        """
+        lat, lng = family_profile.get("lat"), family_profile.get("lng")
+        # Geocode zip via maps_service if needed
+        if (lat is None or lng is None) and self.maps_service and family_profile.get("zip_code"):
+            try:
+                results = self.maps_service.geocode_address(str(family_profile["zip_code"]))
+                if results:
+                    loc = results[0].get("geometry", {}).get("location") or {}
+                    lat, lng = float(loc.get("lat")), float(loc.get("lng"))
+            except Exception:
+                lat, lng = None, None
+        if lat is None or lng is None:
+            return False
+        # Also the distance feature for the ranker
+        family_profile["lat"], family_profile["lng"] = lat, lng
+        return True
+
+    @staticmethod
+    def _has_location(family_profile: Dict[str, Any]) -> bool:
+        return family_profile.get("lat") is not None and family_profile.get("lng") is not None
+
     def _fetch_from_web(self, family_profile: Dict[str, Any]) -> List[Dict[str, Any]]:
         try:
-            lat, lng = family_profile.get("lat"), family_profile.get("lng")
-            # Geocode zip via maps_service if needed
-            if (lat is None or lng is None) and self.maps_service and family_profile.get("zip_code"):
-                try:
-                    results = self.maps_service.geocode_address(str(family_profile["zip_code"]))
-                    if results:
-                        loc = results[0].get("geometry", {}).get("location") or {}
-                        lat, lng = float(loc.get("lat")), float(loc.get("lng"))
-                except Exception:
-                    lat, lng = None, None
-            if lat is None or lng is None:
+            if not self._has_location(family_profile):
                 logger.info("No lat/lng available; skipping web places fetch.")
                 return []
+            lat, lng = family_profile["lat"], family_profile["lng"]
 
             max_monthly = int(family_profile["budget_per_week"] * 4)
             items = self.places_service.search_activities(
@@ -119,6 +255,7 @@ class AIRecommendationEngine:
                 open_now=False,
                 min_rating=4.0,
                 per_category_limit=6,
+                details=False,
             )
             return items
         except Exception as e:
@@ -132,10 +269,14 @@ class AIRecommendationEngine:
             filters = {
                 "zip": family_profile.get("zip_code"),
                 "max_price": int(family_profile["budget_per_week"] * 4),
+                "radius_m": _distance_radius_by_transport(family_profile["transport"]),
                 "age": family_profile["child_age"],
                 "area_type": family_profile["area_type"],
                 "transport": family_profile["transport"],
             }
+            # Nearby programs only (geo index) when the family's location is known
+            if self._has_location(family_profile):
+                filters.update(lat=family_profile["lat"], lng=family_profile["lng"])
             filters = {k: v for k, v in filters.items() if v is not None}
             raw = self.firebase_service.get_programs(filters)
             return [self._normalize_program(p, family_profile) for p in raw if p]
@@ -156,8 +297,8 @@ class AIRecommendationEngine:
             address = p.get("address") or "See website"
             phone = p.get("phone") or "See website"
             website = p.get("website") or ""
-            lat = p.get("latitude", 42.3601)
-            lng = p.get("longitude", -71.0589)
+            lat = p.get("latitude", p.get("lat"))
+            lng = p.get("longitude", p.get("lng"))
             return {
                 "activity_id": p.get("id") or p.get("uid") or p.get("slug") or f"prog_{p.get('name','unknown')}",
                 "id": p.get("id") or p.get("uid") or p.get("slug") or f"prog_{p.get('name','unknown')}",
@@ -179,12 +320,87 @@ class AIRecommendationEngine:
                 "website": website,
                 "latitude": lat,
                 "longitude": lng,
+                "distance_km": round(p["distance_m"] / 1000, 2) if p.get("distance_m") is not None else None,
             }
         except Exception as e:
             logger.warning(f"Program normalization failed: {e}")
             return None
 
-    # ---------- AI RANKING ----------
+    # ---------- RANKING ----------
+
+    def _rank_and_explain(self, items: List[Dict[str, Any]], family_profile: Dict[str, Any]) -> List[Dict[str, Any]]:
+        if self.rerank_mode != "local" or self.ranker is None:
+            self.agreement.count("llm")
+            return self._rank_and_explain_with_ai(items, family_profile)
+        self.agreement.count("local")
+        ranked = self._rank_locally(items, family_profile)
+        if random.random() < self.shadow_rate:
+            # Shadow LLM re-rank: only for agreement stats (and more training pairs)
+            self._shadow.submit(self._rank_and_explain_with_ai, items, family_profile)
+        return ranked
+
+    def _rank_locally(self, items: List[Dict[str, Any]], family_profile: Dict[str, Any], top_k: int = 20) -> List[Dict[str, Any]]:
+        """Distilled-ranker scores for every item; the best top_k with template explanations."""
+        columns = CatalogColumns(items)
+        features = ranking_features(columns, family_profile)
+        scores = self.ranker.score(features)
+        ranked = []
+        for i in columns.top_k(scores, top_k):
+            item = dict(items[i])
+            item["match_score"] = float(scores[i])
+            item["ai_explanation"] = explain(item, features[i], family_profile)
+            ranked.append(item)
+        return ranked
+
+    def _record_llm_scores(
+        self,
+        shortlist: List[Dict[str, Any]],
+        features: Any,
+        rows: List[int],
+        llm_scores: List[float],
+        family_profile: Dict[str, Any],
+        model: Optional[str],
+    ) -> None:
+        """Log (features, LLM score) pairs for the trainer; compare with the local ranker if there is one."""
+        if not rows:
+            return
+        features = features[rows]
+        self.rerank_log.record(family_profile, [shortlist[i].get("id") for i in rows], features, llm_scores, model)
+        if self.ranker is not None:
+            self.agreement.record(self.ranker.score(features), llm_scores)
+
+    @staticmethod
+    def _compact_items(shortlist: List[Dict[str, Any]], features: Any) -> str:
+        """One short JSON line per item: position as id plus the fields that matter for ranking."""
+        distance = features[:, FEATURES.index("distance_km")]
+        has_distance = features[:, FEATURES.index("has_distance")]
+        lines = []
+        for i, it in enumerate(shortlist):
+            entry = {
+                "id": i,
+                "name": it.get("title"),
+                "category": it.get("category"),
+                "ages": f"{it.get('age_min', 0)}-{it.get('age_max', 18)}",
+                "usd_month": it.get("price_monthly"),
+            }
+            if has_distance[i]:
+                entry["km"] = round(float(distance[i]), 1)
+            if it.get("rating"):
+                entry["rating"] = it["rating"]
+            about = (it.get("description") or "").strip()
+            # Google's business_status and the normalizers' placeholders carry no signal
+            if about and not about.isupper() and about not in ("See details", "Local program"):
+                entry["about"] = about[:160]
+            lines.append(json.dumps({k: v for k, v in entry.items() if v is not None}, ensure_ascii=False, separators=(",", ":")))
+        return "\n".join(lines)
+
+    def ranker_snapshot(self) -> Dict[str, Any]:
+        return {
+            "mode": self.rerank_mode if self.ranker is not None else "llm",
+            "model": self.ranker.meta if self.ranker is not None else None,
+            "shadow_rate": self.shadow_rate,
+            **self.agreement.snapshot(),
+        }
 
     def _rank_and_explain_with_ai(self, items: List[Dict[str, Any]], family_profile: Dict[str, Any]) -> List[Dict[str, Any]]:
         try:
@@ -193,19 +409,21 @@ class AIRecommendationEngine:
             style = family_profile.get("parenting_style", "Balanced")
             priorities = ", ".join(family_profile.get("priorities_ranked", [])) or "Social, Emotional, Physical, Cognitive"
 
-            pre_sorted = self._local_score(items, family_profile)
-            shortlist = pre_sorted[:20]
+            shortlist = self._local_score(items, family_profile, top_k=20)
+            features = ranking_features(CatalogColumns(shortlist), family_profile)
 
+            # Compact wire format: positional ids and rank-relevant fields in, {id, score, explanation} out
             prompt = (
                 f"You are ranking real, local programs for a family.\n"
                 f"Child age: {child_age}. Budget/month: ${budget_month}. Parenting style: {style}. "
                 f"Priorities (in order): {priorities}.\n"
-                f"Return JSON array. For each item, keep all original fields but set: match_score (0–1 float), ai_explanation (<= 30 words).\n\n"
-                f"ITEMS:\n{json.dumps(shortlist, ensure_ascii=False)}\n\nOUTPUT JSON ARRAY ONLY."
+                f"Return a JSON array with one object per item: "
+                f'{{"id": <item id>, "score": <match 0-1 float>, "explanation": <= 30 words}}.\n\n'
+                f"ITEMS:\n{self._compact_items(shortlist, features)}\n\nOUTPUT JSON ARRAY ONLY."
             )
 
-            response = self.anthropic_service.client.messages.create(
-                model="claude-3-haiku-20240307",
+            response = self.anthropic_service.create_message(
+                "catalog.rerank",
                 max_tokens=1200,
                 messages=[{"role": "user", "content": prompt}],
             )
@@ -214,14 +432,30 @@ class AIRecommendationEngine:
             if s == -1 or e == 0:
                 logger.error("AI ranking response missing JSON array.")
                 return []
-            ranked = json.loads(content[s:e])
 
-            for r in ranked:
+            # Merge replies back onto the shortlist by id (unknown or repeated ids are dropped)
+            ranked, rows, llm_scores = [], [], []
+            for r in json.loads(content[s:e]):
                 try:
-                    r["match_score"] = float(r.get("match_score", 0.0))
-                    r["match_score"] = max(0.0, min(1.0, r["match_score"]))
-                except Exception:
-                    r["match_score"] = 0.0
+                    row = int(r["id"])
+                except (KeyError, TypeError, ValueError):
+                    continue
+                if not 0 <= row < len(shortlist) or row in rows:
+                    continue
+                try:
+                    score = max(0.0, min(1.0, float(r.get("score", 0.0))))
+                except (TypeError, ValueError):
+                    score = 0.0
+                item = dict(shortlist[row])
+                item["match_score"] = score
+                item["ai_explanation"] = str(r.get("explanation") or "")
+                ranked.append(item)
+                rows.append(row)
+                llm_scores.append(score)
+            try:
+                self._record_llm_scores(shortlist, features, rows, llm_scores, family_profile, getattr(response, "model", None))
+            except Exception as e:
+                logger.warning(f"Recording re-rank scores failed: {e}")
             return ranked
         except Exception as e:
             logger.error(f"AI re-ranking failed: {e}")
@@ -229,38 +463,25 @@ class AIRecommendationEngine:
 
     # ---------- LOCAL SCORING BACKUP ----------
 
-    def _local_score(self, items: List[Dict[str, Any]], family_profile: Dict[str, Any]) -> List[Dict[str, Any]]:
-        child_age = family_profile["child_age"]
-        budget_month = family_profile["budget_per_week"] * 4
-        priorities = family_profile.get("priorities_ranked", [])
-        pr_weights = {p: max(0.0, 1.0 - (i * 0.15)) for i, p in enumerate(priorities)}
-
-        scored = []
-        for it in items:
-            score = 0.5
-            if it.get("age_min", 0) <= child_age <= it.get("age_max", 18):
-                score += 0.2
-            else:
-                score -= 0.1
-            if it.get("price_monthly", 999999) <= budget_month:
-                score += 0.15
-            else:
-                score -= 0.1
-            score += pr_weights.get((it.get("category") or "").lower().capitalize(), 0.0)
-            it2 = dict(it)
-            it2["match_score"] = max(0.0, min(1.0, score))
-            scored.append(it2)
-
-        scored.sort(key=lambda x: x["match_score"], reverse=True)
-        return scored
+    def _local_score(
+        self, items: List[Dict[str, Any]], family_profile: Dict[str, Any], top_k: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """Heuristic scores, best first (ties keep catalog order); only the top_k items are copied out."""
+        columns = CatalogColumns(items)
+        scores = columns.local_scores(
+            family_profile["child_age"],
+            family_profile["budget_per_week"] * 4,
+            family_profile.get("priorities_ranked", []),
+        )
+        return columns.ranked(scores, top_k)
 
     # ---------- AI-ONLY + FALLBACK ----------
 
     def _generate_ai_recommendations(self, family_profile: Dict[str, Any]) -> List[Dict[str, Any]]:
         try:
             safe_inputs = json.dumps(family_profile, ensure_ascii=False)
-            response = self.anthropic_service.client.messages.create(
-                model="claude-3-haiku-20240307",
+            response = self.anthropic_service.create_message(
+                "catalog.ai_only",
                 max_tokens=1800,
                 messages=[{
                     "role": "user",
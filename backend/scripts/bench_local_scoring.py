@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Benchmark the columnar catalog scorer against the per-item loop it replaced.
+
+Builds a synthetic catalog of program dicts (age range, monthly price,
+category, coordinates, rating), then times for each size:
+
+- loop:  the original `_local_score` (score every dict, copy it, full sort)
+- cold:  pack the columns scoring reads, then `local_scores` + `top_k` (argpartition)
+         for the 20-item shortlist -- what `_local_score` pays per call
+- warm:  score + top_k again on the already packed columns (a reused catalog)
+
+and checks that both produce the same top 20 (ids and scores).
+
+    python scripts/bench_local_scoring.py --sizes 10000,100000,1000000
+"""
+
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+# Add the backend directory to Python path
+backend_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(backend_dir))
+
+from utils.catalog import CatalogColumns
+
+CATEGORIES = ["Physical", "social", "Cognitive", "emotional", "arts", None]
+PRIORITIES = ["Physical", "Social", "Cognitive", "Emotional"]
+
+
+def synthetic_catalog(n, seed=0):
+    rng = random.Random(seed)
+    items = []
+    for i in range(n):
+        age_min = rng.randint(0, 14)
+        item = {
+            "id": i,
+            "title": f"Program {i}",
+            "category": rng.choice(CATEGORIES),
+            "age_min": age_min,
+            "age_max": age_min + rng.randint(1, 8),
+            "latitude": 42.36 + rng.uniform(-0.2, 0.2),
+            "longitude": -71.06 + rng.uniform(-0.2, 0.2),
+            "rating": round(rng.uniform(3.0, 5.0), 1),
+        }
+        if rng.random() > 0.1:
+            item["price_monthly"] = rng.choice([0, 40, 80, 120, 200, 350])
+        items.append(item)
+    return items
+
+
+def loop_score(items, child_age, budget_month, priorities):
+    """The pre-columnar `_local_score`, verbatim."""
+    pr_weights = {p: max(0.0, 1.0 - (i * 0.15)) for i, p in enumerate(priorities)}
+    scored = []
+    for it in items:
+        score = 0.5
+        if it.get("age_min", 0) <= child_age <= it.get("age_max", 18):
+            score += 0.2
+        else:
+            score -= 0.1
+        if it.get("price_monthly", 999999) <= budget_month:
+            score += 0.15
+        else:
+            score -= 0.1
+        score += pr_weights.get((it.get("category") or "").lower().capitalize(), 0.0)
+        it2 = dict(it)
+        it2["match_score"] = max(0.0, min(1.0, score))
+        scored.append(it2)
+    scored.sort(key=lambda x: x["match_score"], reverse=True)
+    return scored
+
+
+def best_of(repeat, fn):
+    best, result = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Columnar vs per-item local scoring")
+    parser.add_argument('--sizes', default="10000,100000,1000000", help="comma-separated catalog sizes")
+    parser.add_argument('--repeat', type=int, default=3, help="runs per measurement (best is reported)")
+    parser.add_argument('--top', type=int, default=20, help="shortlist size")
+    args = parser.parse_args()
+
+    child_age, budget_month = 7, 120.0
+    print(f"{'items':>9}  {'loop':>9}  {'cold':>9}  {'warm':>9}  {'cold x':>7}  {'warm x':>7}  top-{args.top}")
+    for n in (int(s) for s in args.sizes.split(",")):
+        items = synthetic_catalog(n)
+
+        def columnar(columns):
+            return columns.ranked(columns.local_scores(child_age, budget_month, PRIORITIES), args.top)
+
+        loop_s, legacy = best_of(args.repeat, lambda: loop_score(items, child_age, budget_month, PRIORITIES))
+        cold_s, top = best_of(args.repeat, lambda: columnar(CatalogColumns(items)))
+        columns = CatalogColumns(items)
+        columnar(columns)
+        warm_s, _ = best_of(args.repeat, lambda: columnar(columns))
+        same = [(it["id"], it["match_score"]) for it in legacy[:args.top]] == [
+            (it["id"], it["match_score"]) for it in top
+        ]
+        print(
+            f"{n:>9}  {loop_s * 1000:>7.1f}ms  {cold_s * 1000:>7.1f}ms  {warm_s * 1000:>7.2f}ms  "
+            f"{loop_s / cold_s:>6.1f}x  {loop_s / warm_s:>6.0f}x  {'identical' if same else 'MISMATCH'}"
+        )
+        if not same:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Distill logged LLM re-rank scores into the local ranker.
+
+Reads the (features, LLM score) pairs the recommendation engine appends to
+`RERANK_LOG_PATH` (one line per re-rank call), fits a standardized ridge
+regression on them, reports agreement with the LLM on held-out calls and
+writes the model `LocalRanker` loads (`LOCAL_RANKER_PATH`):
+
+    python scripts/train_ranker.py --log logs/rerank_pairs.jsonl --out models/local_ranker.json
+
+Then set `RERANK_MODE=local` (keep `RERANK_SHADOW_RATE` > 0 to keep measuring
+agreement in production via the `local_ranker` metrics section).
+"""
+
+import argparse
+import json
+import random
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+
+# Add the backend directory to Python path
+backend_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(backend_dir))
+
+from utils.ranker import DEFAULT_LOG_PATH, DEFAULT_MODEL_PATH, FEATURES, AgreementStats, LocalRanker
+
+
+def load_calls(path):
+    """[(X, y)] per logged re-rank call; lines from other feature sets are skipped."""
+    calls, skipped = [], 0
+    with open(path) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                skipped += 1
+                continue
+            if record.get("features") != FEATURES or not record.get("items"):
+                skipped += 1
+                continue
+            X = np.array([it["x"] for it in record["items"]], dtype=np.float64)
+            y = np.array([it["llm_score"] for it in record["items"]], dtype=np.float64)
+            calls.append((X, y))
+    if skipped:
+        print(f"Skipped {skipped} malformed or outdated lines")
+    return calls
+
+
+def fit(X, y, l2):
+    mean = X.mean(axis=0)
+    scale = X.std(axis=0)
+    scale[scale == 0] = 1.0
+    Z = (X - mean) / scale
+    bias = y.mean()
+    weights = np.linalg.solve(Z.T @ Z + l2 * np.eye(Z.shape[1]), Z.T @ (y - bias))
+    return LocalRanker(mean, scale, weights, bias)
+
+
+def evaluate(ranker, calls):
+    stats = AgreementStats()
+    for X, y in calls:
+        stats.record(ranker.score(X), y)
+    snapshot = stats.snapshot()
+    return {k: snapshot[k] for k in ("mean_abs_error", "spearman", "top5_overlap")}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the local ranker from logged LLM re-rank scores")
+    parser.add_argument('--log', default=str(DEFAULT_LOG_PATH), help="re-rank pairs (JSON lines)")
+    parser.add_argument('--out', default=str(DEFAULT_MODEL_PATH), help="model file to write")
+    parser.add_argument('--holdout', type=float, default=0.2, help="fraction of calls held out for evaluation")
+    parser.add_argument('--l2', type=float, default=1.0, help="ridge penalty")
+    parser.add_argument('--min-pairs', type=int, default=200, help="refuse to train on fewer pairs")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    calls = load_calls(args.log)
+    pairs = sum(len(y) for _, y in calls)
+    print(f"Loaded {pairs} pairs from {len(calls)} re-rank calls")
+    if pairs < args.min_pairs:
+        print(f"✗ Need at least {args.min_pairs} pairs; keep RERANK_MODE=llm and collect more")
+        return 1
+
+    # Split by call so held-out families are unseen
+    random.Random(args.seed).shuffle(calls)
+    n_holdout = int(len(calls) * args.holdout) if len(calls) > 1 else 0
+    holdout, train = calls[:n_holdout], calls[n_holdout:]
+    X = np.vstack([X for X, _ in train])
+    y = np.concatenate([y for _, y in train])
+
+    ranker = fit(X, y, args.l2)
+    metrics = {"train": evaluate(ranker, train)}
+    if holdout:
+        metrics["holdout"] = evaluate(ranker, holdout)
+
+    # Refit on everything for the shipped model; report the held-out numbers
+    ranker = fit(np.vstack([X for X, _ in calls]), np.concatenate([y for _, y in calls]), args.l2)
+    ranker.meta = {
+        "trained_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "pairs": pairs,
+        "calls": len(calls),
+        "l2": args.l2,
+        "metrics": metrics,
+    }
+
+    batch = np.vstack([X for X, _ in calls[:50]])
+    start = time.perf_counter()
+    for _ in range(100):
+        ranker.score(batch)
+    per_item_us = (time.perf_counter() - start) / (100 * len(batch)) * 1e6
+
+    out = Path(args.out)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(ranker.to_dict(), indent=2))
+
+    for name, weight in sorted(zip(FEATURES, ranker.weights), key=lambda fw: -abs(fw[1])):
+        print(f"  {name:16s} {weight:+.4f}")
+    for split, m in metrics.items():
+        print(f"{split:8s} MAE {m['mean_abs_error']}  spearman {m['spearman']}  top-5 overlap {m['top5_overlap']}")
+    print(f"Scoring: {per_item_us:.2f} µs/item")
+    print(f"✓ Wrote {out}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+Record/replay stand-in servers for the backend's upstreams.
+
+Record mode proxies to the real upstream and appends every exchange to
+`<fixtures>/<upstream>.jsonl` (API keys and auth headers are never stored).
+Replay mode serves those fixtures locally with a configurable latency
+distribution, so the whole backend can be benchmarked with no network.
+
+Point the backend at the stand-ins through the base URLs in config.py:
+
+    python scripts/upstream_standin.py replay --all --port 9100 --latency lognormal:600:0.5
+    # prints ANTHROPIC_BASE_URL=http://127.0.0.1:9100 ... to export before `python server.py`
+
+Latency specs (milliseconds): recorded (default), fixed:MS, uniform:LO:HI,
+normal:MEAN:STD, lognormal:MEDIAN:SIGMA. `--latency-scale` multiplies any of them.
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+import requests
+
+UPSTREAMS = {
+    "anthropic": {"url": "https://api.anthropic.com", "env": "ANTHROPIC_BASE_URL", "suffix": ""},
+    "cerebras": {"url": "https://api.cerebras.ai", "env": "CEREBRAS_BASE_URL", "suffix": "/v1"},
+    "google": {"url": "https://maps.googleapis.com", "env": "GOOGLE_MAPS_BASE_URL", "suffix": ""},
+    "wikipedia": {"url": "https://en.wikipedia.org", "env": "WIKIPEDIA_BASE_URL", "suffix": ""},
+}
+
+# Never written to fixtures or used in match keys
+SECRET_PARAMS = {"key", "api_key"}
+DROP_REQUEST_HEADERS = {"host", "content-length", "accept-encoding", "connection"}
+KEEP_RESPONSE_HEADERS = {"content-type", "request-id", "x-request-id"}
+
+
+# ---------- FIXTURES ----------
+
+def _clean_query(query: str) -> str:
+    pairs = [(k, v) for k, v in parse_qsl(query, keep_blank_values=True) if k not in SECRET_PARAMS]
+    return urlencode(sorted(pairs))
+
+
+def _canonical_body(body: bytes) -> str:
+    if not body:
+        return ""
+    try:
+        return json.dumps(json.loads(body), sort_keys=True, separators=(",", ":"))
+    except ValueError:
+        return body.decode("utf-8", errors="replace")
+
+
+def fixture_key(method: str, path: str, query: str, body: bytes) -> str:
+    raw = "\n".join([method.upper(), path, _clean_query(query), _canonical_body(body)])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class FixtureStore:
+    """Append-only JSONL fixtures for one upstream, indexed by exact key and by method+path."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.by_key = {}
+        self.by_route = {}
+        self._lock = threading.Lock()
+        if path.exists():
+            with path.open(encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        self._index(json.loads(line))
+
+    def _index(self, fx):
+        self.by_key[fx["key"]] = fx
+        self.by_route.setdefault((fx["method"], fx["path"]), []).append(fx)
+
+    def append(self, fx):
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with self.path.open("a", encoding="utf-8") as f:
+                f.write(json.dumps(fx, ensure_ascii=False) + "\n")
+            self._index(fx)
+
+    def lookup(self, key, method, path, strict):
+        fx = self.by_key.get(key)
+        if fx or strict:
+            return fx
+        # Lenient: any recorded exchange for the same endpoint (varied benchmark inputs)
+        candidates = self.by_route.get((method, path))
+        return random.choice(candidates) if candidates else None
+
+
+# ---------- LATENCY ----------
+
+def parse_latency(spec: str, scale: float):
+    """Return fn(recorded_ms) -> seconds to wait before replying."""
+    kind, *args = spec.split(":")
+    vals = [float(a) for a in args]
+    if kind == "recorded":
+        sample = lambda recorded_ms: recorded_ms or 0.0
+    elif kind == "fixed":
+        sample = lambda _: vals[0]
+    elif kind == "uniform":
+        sample = lambda _: random.uniform(vals[0], vals[1])
+    elif kind == "normal":
+        sample = lambda _: max(0.0, random.gauss(vals[0], vals[1]))
+    elif kind == "lognormal":
+        sample = lambda _: random.lognormvariate(math.log(vals[0]), vals[1])
+    else:
+        raise ValueError(f"Unknown latency spec '{spec}'")
+    return lambda recorded_ms: sample(recorded_ms) * scale / 1000.0
+
+
+# ---------- SERVER ----------
+
+def make_handler(upstream, store, mode, latency, strict, chunk_delay_s):
+    upstream_url = UPSTREAMS[upstream]["url"]
+
+    class StandinHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _handle(self):
+            parts = urlsplit(self.path)
+            length = int(self.headers.get("Content-Length") or 0)
+            body = self.rfile.read(length) if length else b""
+            key = fixture_key(self.command, parts.path, parts.query, body)
+            if mode == "record":
+                self._record(parts, body, key)
+            else:
+                self._replay(parts, key)
+
+        def _record(self, parts, body, key):
+            headers = {k: v for k, v in self.headers.items() if k.lower() not in DROP_REQUEST_HEADERS}
+            start = time.monotonic()
+            try:
+                resp = requests.request(
+                    self.command, upstream_url + self.path, headers=headers, data=body or None, timeout=120
+                )
+            except requests.RequestException as e:
+                self._send(502, {"content-type": "application/json"}, json.dumps({"error": str(e)}).encode())
+                return
+            latency_ms = (time.monotonic() - start) * 1000
+            fx = {
+                "key": key,
+                "method": self.command,
+                "path": parts.path,
+                "query": _clean_query(parts.query),
+                "request_body": _canonical_body(body),
+                "status": resp.status_code,
+                "headers": {k.lower(): v for k, v in resp.headers.items() if k.lower() in KEEP_RESPONSE_HEADERS},
+                "body": resp.text,
+                "latency_ms": round(latency_ms, 1),
+                "recorded_at": time.time(),
+            }
+            store.append(fx)
+            self._send(resp.status_code, fx["headers"], resp.content)
+
+        def _replay(self, parts, key):
+            fx = store.lookup(key, self.command, parts.path, strict)
+            if fx is None:
+                msg = {"error": f"no fixture for {self.command} {parts.path}", "upstream": upstream}
+                self._send(404, {"content-type": "application/json"}, json.dumps(msg).encode())
+                return
+            time.sleep(latency(fx.get("latency_ms")))
+            body = fx["body"].encode("utf-8")
+            if "text/event-stream" in fx["headers"].get("content-type", ""):
+                self._stream(fx["status"], fx["headers"], body)
+            else:
+                self._send(fx["status"], fx["headers"], body)
+
+        def _send(self, status, headers, body):
+            self.send_response(status)
+            for k, v in headers.items():
+                self.send_header(k, v)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _stream(self, status, headers, body):
+            """Replay SSE one event at a time (first-event latency already applied)."""
+            self.send_response(status)
+            for k, v in headers.items():
+                self.send_header(k, v)
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for event in body.split(b"\n\n"):
+                if not event.strip():
+                    continue
+                chunk = event + b"\n\n"
+                self.wfile.write(f"{len(chunk):x}\r\n".encode() + chunk + b"\r\n")
+                self.wfile.flush()
+                time.sleep(chunk_delay_s)
+            self.wfile.write(b"0\r\n\r\n")
+
+        do_GET = do_POST = do_PUT = do_DELETE = _handle
+
+        def log_message(self, fmt, *args):
+            sys.stderr.write(f"[{upstream}] {fmt % args}\n")
+
+    return StandinHandler
+
+
+def serve(upstream, port, args):
+    store = FixtureStore(Path(args.fixtures) / f"{upstream}.jsonl")
+    latency = parse_latency(args.latency, args.latency_scale)
+    handler = make_handler(upstream, store, args.mode, latency, args.strict, args.chunk_delay_ms / 1000.0)
+    server = ThreadingHTTPServer((args.host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"{UPSTREAMS[upstream]['env']}=http://{args.host}:{port}{UPSTREAMS[upstream]['suffix']}"
+          f"  # {args.mode} {upstream}, {len(store.by_key)} fixtures")
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record/replay stand-ins for Anthropic, Cerebras, Google and Wikipedia")
+    parser.add_argument("mode", choices=["record", "replay"])
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--upstream", choices=sorted(UPSTREAMS))
+    target.add_argument("--all", action="store_true", help="serve every upstream on consecutive ports")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--fixtures", default=str(Path(__file__).parent.parent / "fixtures"))
+    parser.add_argument("--latency", default="recorded", help="replay latency distribution (see module docstring)")
+    parser.add_argument("--latency-scale", type=float, default=1.0)
+    parser.add_argument("--chunk-delay-ms", type=float, default=15.0, help="delay between replayed SSE events")
+    parser.add_argument("--strict", action="store_true", help="replay only exact request matches")
+    args = parser.parse_args()
+
+    upstreams = sorted(UPSTREAMS) if args.all else [args.upstream]
+    for offset, upstream in enumerate(upstreams):
+        serve(upstream, args.port + offset, args)
+
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        print("\nStopping stand-ins")
+
+
+if __name__ == "__main__":
+    main()
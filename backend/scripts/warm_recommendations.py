@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Pre-generate recommendations for the most common family profile buckets.
+
+Reads every document in the Firestore `users` collection, builds and quantizes each
+family's profile the same way `/api/recommend` does (`utils.recommend.family_profile`,
+`quantize_profile`), and warms the shared recommendation cache for the most frequent
+buckets, most common first, under a concurrency cap. Run it nightly before morning traffic:
+
+    python scripts/warm_recommendations.py --top 200 --concurrency 4 --min-ttl 7200
+
+- Buckets whose cached entry still has more than `--min-ttl` seconds left are skipped.
+- Progress is checkpointed to `--state`; rerunning the same day resumes where it
+  stopped (`--restart` ignores the checkpoint).
+- Before warming, a sample of users is checked: the key warmed for each must equal the
+  key of the (double URL-encoded) request the intake screen sends for it.
+- Needs Redis (`REDIS_URL`): without it warmed entries would only live in this process.
+"""
+
+import argparse
+import json
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date
+from pathlib import Path
+from urllib.parse import parse_qsl, quote, urlencode
+
+from werkzeug.datastructures import MultiDict
+
+# Add the backend directory to Python path
+backend_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(backend_dir))
+
+from app import create_app
+import app as app_module
+from utils.llm_metrics import llm_metrics
+from utils.recommend import family_profile, get_engine, quantize_profile
+
+
+def live_request_args(profile):
+    """Query args the intake screen sends for this profile (values encodeURIComponent()'d, then form-encoded again)."""
+    def component(value):
+        return quote(str(value), safe="-_.!~*'()")
+
+    pairs = [('budget_per_week_usd', profile['budget_per_week'])]
+    pairs += [('support_available', component(v)) for v in profile['support_available']]
+    if profile['transport']:
+        pairs.append(('transport', component(profile['transport'])))
+    pairs.append(('hours_per_week_with_kid', profile['hours_per_week_with_kid']))
+    if profile['parenting_style']:
+        pairs.append(('parenting_style', component(profile['parenting_style'])))
+    pairs.append(('child_age', profile['child_age']))
+    if profile['area_type']:
+        pairs.append(('area_type', component(profile['area_type'])))
+    pairs += [('priorities_ranked', component(v)) for v in profile['priorities_ranked']]
+    if profile['zip']:
+        pairs.append(('zip', component(str(profile['zip']).strip())))
+    query = urlencode([(k, '' if v is None else v) for k, v in pairs])
+    return MultiDict(parse_qsl(query, keep_blank_values=True))
+
+
+def check_live_keys(users, engine, sample=20):
+    """Stored users whose warmed key differs from the key their live /api/recommend request would use."""
+    mismatched = []
+    for user_data in users[:sample]:
+        profile = family_profile(user_data)
+        live = family_profile(user_data, live_request_args(profile))
+        if engine.profile_key(quantize_profile(profile)) != engine.profile_key(quantize_profile(live)):
+            mismatched.append((quantize_profile(profile), quantize_profile(live)))
+    return mismatched
+
+
+def common_buckets(users, engine, top):
+    """[(key, canonical profile, user count)] for the `top` most frequent buckets."""
+    counts = Counter()
+    canonical_by_key = {}
+    for user_data in users:
+        canonical = quantize_profile(family_profile(user_data))
+        key = engine.profile_key(canonical)
+        counts[key] += 1
+        canonical_by_key[key] = canonical
+    print(f"Scanned {len(users)} users into {len(counts)} profile buckets")
+    return [(key, canonical_by_key[key], n) for key, n in counts.most_common(top)]
+
+
+def load_state(path, restart):
+    today = date.today().isoformat()
+    if path.exists() and not restart:
+        state = json.loads(path.read_text())
+        if state.get('date') == today:
+            return state
+    return {'date': today, 'done': {}}
+
+
+def save_state(path, state):
+    tmp = path.with_suffix(path.suffix + '.tmp')
+    tmp.write_text(json.dumps(state, indent=2))
+    tmp.replace(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Warm the recommendation cache for common profile buckets")
+    parser.add_argument('--top', type=int, default=200, help="number of most frequent buckets to warm")
+    parser.add_argument('--concurrency', type=int, default=4, help="profiles generated at once (each is up to 4 model calls)")
+    parser.add_argument('--min-ttl', type=float, default=7200, help="skip buckets whose cache entry has more than this many seconds left")
+    parser.add_argument('--state', default=str(backend_dir / 'warm_recommendations.state.json'), help="checkpoint file")
+    parser.add_argument('--restart', action='store_true', help="ignore today's checkpoint")
+    parser.add_argument('--dry-run', action='store_true', help="list buckets without generating")
+    args = parser.parse_args()
+
+    create_app()
+    if app_module.db is None:
+        print("✗ Firebase not initialized. Check your credentials.")
+        return 2
+    if app_module.redis_client is None and not args.dry_run:
+        print("✗ Redis not connected; warmed entries would not reach the API servers. Set REDIS_URL.")
+        return 2
+
+    engine = get_engine()
+    users = []
+    for doc in app_module.db.collection('users').stream():
+        user_data = doc.to_dict() or {}
+        profile = family_profile(user_data)
+        # Same requirement as /api/recommend
+        if profile['budget_per_week'] is not None and profile['child_age'] is not None:
+            users.append(user_data)
+    mismatched = check_live_keys(users, engine)
+    if mismatched:
+        for warmed, live in mismatched[:5]:
+            print(f"  warmed {json.dumps(warmed, sort_keys=True)}\n  live   {json.dumps(live, sort_keys=True)}")
+        print(f"✗ {len(mismatched)} sampled users would not hit their warmed bucket; fix utils.recommend.family_profile first")
+        return 2
+    buckets = common_buckets(users, engine, args.top)
+    if args.dry_run:
+        for key, canonical, n in buckets:
+            print(f"{n:5d}  {key}  {json.dumps(canonical, sort_keys=True)}")
+        return 0
+
+    state_path = Path(args.state)
+    state = load_state(state_path, args.restart)
+    pending = [(key, canonical, n) for key, canonical, n in buckets if state['done'].get(key) not in ('stored', 'fresh')]
+    print(f"Warming {len(pending)} buckets ({len(buckets) - len(pending)} already done today), concurrency {args.concurrency}")
+
+    outcomes = Counter()
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        futures = {pool.submit(engine.warm_profile, canonical, args.min_ttl): (key, n) for key, canonical, n in pending}
+        for i, future in enumerate(as_completed(futures), 1):
+            key, n = futures[future]
+            try:
+                outcome = future.result()
+            except Exception as e:
+                print(f"  {key}: {e}")
+                outcome = 'failed'
+            outcomes[outcome] += 1
+            state['done'][key] = outcome
+            save_state(state_path, state)
+            elapsed = time.monotonic() - start
+            generated = outcomes['stored'] + outcomes['failed']
+            rate = generated / elapsed * 60 if elapsed > 0 else 0.0
+            print(f"[{i}/{len(pending)}] {outcome:6s} {key} ({n} users) — {rate:.1f} generations/min")
+
+    elapsed = time.monotonic() - start
+    llm = llm_metrics.snapshot()
+    tokens = sum(site['output_tokens'] for name, site in llm.items() if name.startswith('recommend.'))
+    print(
+        f"\nDone in {elapsed:.1f}s: {outcomes['stored']} stored, {outcomes['fresh']} still fresh, "
+        f"{outcomes['failed']} failed; {tokens} output tokens"
+        + (f", {tokens / elapsed:.0f} tokens/s" if elapsed > 0 else "")
+    )
+    return 1 if outcomes['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
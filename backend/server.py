@@ -1,13 +1,24 @@
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request, stream_with_context
 from app import create_app
+from app.services.cache_service import cache_service
+from config import Config
 from utils.maps_service import GoogleMapsService
 from firebase_service import FirebaseService
 from anthropic_service import AnthropicService
-from openai_service import ParentingChatService
+from openai_service import FALLBACK_ADVICE, SUMMARY_KEEP_MESSAGES, SUMMARY_TRIGGER_MESSAGES, ParentingChatService
+from utils.jobs import job_queue
+from utils.metrics import collect_metrics
+from utils.recommend import family_profile, get_engine, get_recommendations, model_calls_per_generation
+from utils.rate_limit import rate_limited
+from utils.singleflight import request_key
 from dotenv import load_dotenv
 import requests
+from concurrent.futures import ThreadPoolExecutor
+import json
 import logging
 import os
+import re
+import uuid
 
 load_dotenv()
 
@@ -18,14 +29,62 @@ maps_service = GoogleMapsService()
 firebase_service = FirebaseService()
 anthropic_service = AnthropicService()
 chat_service = ParentingChatService()
+# Long-lived recommendation engine: shared Anthropic client/connection pool and frozen tools
+get_engine()
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+def wikipedia_image(name: str) -> str | None:
+    """Best-effort Wikipedia image URL for a person's name"""
+    try:
+        # 1) Try Wikipedia title search for the person
+        s = requests.get(
+            f'{Config.WIKIPEDIA_BASE_URL}/w/rest.php/v1/search/title',
+            params={'q': name, 'limit': 1}, timeout=5
+        )
+        if s.ok:
+            data = s.json() or {}
+            pages = data.get('pages') or []
+            if pages:
+                key = pages[0].get('key')
+                if key:
+                    # 2) Fetch summary to get thumbnail/original image
+                    summary = requests.get(
+                        f'{Config.WIKIPEDIA_BASE_URL}/api/rest_v1/page/summary/{key}',
+                        timeout=5
+                    )
+                    if summary.ok:
+                        js = summary.json() or {}
+                        img = (
+                            (js.get('originalimage') or {}).get('source')
+                            or (js.get('thumbnail') or {}).get('source')
+                        )
+                        return img
+    except Exception:
+        pass
+    return None
+
+def enrich_with_images(profiles, on_progress=None):
+    """Set imageUrl on profiles that lack one; on_progress(done, total) after each"""
+    profiles = profiles or []
+    for i, p in enumerate(profiles, 1):
+        if not p.get('imageUrl') and p.get('name'):
+            img = wikipedia_image(p['name'])
+            if img:
+                p['imageUrl'] = img
+        if on_progress:
+            on_progress(i, len(profiles))
+
 @app.route('/', methods=['GET'])
 def home():
     return jsonify({'message': 'Flask backend server is running!', 'status': 'success'})
 
+@app.route('/api/metrics', methods=['GET'])
+def metrics():
+    """Per-call-site LLM token/latency accounting and model routing state"""
+    return jsonify(collect_metrics())
+
 @app.route('/api/programs', methods=['GET'])
 def get_programs():
     try:
@@ -61,6 +120,7 @@ def add_programs():
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/geocode', methods=['GET'])
+@rate_limited('places', upstreams={'google': 1})
 def geocode():
     address = request.args.get('address')
     if not address:
@@ -69,6 +129,7 @@ def geocode():
     return jsonify({'results': results})
 
 @app.route('/api/nearby-places', methods=['GET'])
+@rate_limited('places', upstreams={'google': 1})
 def nearby_places():
     try:
         lat = request.args.get('lat', type=float)
@@ -87,6 +148,7 @@ def nearby_places():
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/extraordinary-people', methods=['POST'])
+@rate_limited('research', upstreams={'anthropic': 1})
 def generate_extraordinary_people():
     try:
         payload = request.get_json(silent=True) or {}
@@ -103,40 +165,7 @@ def generate_extraordinary_people():
         profiles = anthropic_service.generate_profiles(search_query)
 
         # Attempt to enrich with image URLs (best-effort)
-        def enrich_with_image(name: str) -> str | None:
-            try:
-                # 1) Try Wikipedia title search for the person
-                s = requests.get(
-                    'https://en.wikipedia.org/w/rest.php/v1/search/title',
-                    params={'q': name, 'limit': 1}, timeout=5
-                )
-                if s.ok:
-                    data = s.json() or {}
-                    pages = data.get('pages') or []
-                    if pages:
-                        key = pages[0].get('key')
-                        if key:
-                            # 2) Fetch summary to get thumbnail/original image
-                            summary = requests.get(
-                                f'https://en.wikipedia.org/api/rest_v1/page/summary/{key}',
-                                timeout=5
-                            )
-                            if summary.ok:
-                                js = summary.json() or {}
-                                img = (
-                                    (js.get('originalimage') or {}).get('source')
-                                    or (js.get('thumbnail') or {}).get('source')
-                                )
-                                return img
-            except Exception:
-                pass
-            return None
-
-        for p in profiles or []:
-            if not p.get('imageUrl') and p.get('name'):
-                img = enrich_with_image(p['name'])
-                if img:
-                    p['imageUrl'] = img
+        enrich_with_images(profiles)
         interpretation = anthropic_service.interpret_search(search_query)
 
         return jsonify({
@@ -149,49 +178,165 @@ def generate_extraordinary_people():
         logger.exception("extraordinary-people failed")
         return jsonify({'error': str(e)}), 500
 
+def load_chat_context(data):
+    """child_age, kid_traits and intake for a chat request (request child_age wins over the database)"""
+    user_id = data.get('user_id', 'default_user')  # In real app, get from auth
+    request_child_age = data.get('child_age')
+    child_age = request_child_age
+    kid_traits = None
+    try:
+        user_data = firebase_service.get_user_data(user_id)
+        print(f"🔍 Chat - Retrieved user data: {user_data}")
+        
+        if child_age is None and user_data and 'child_age' in user_data:
+            child_age = user_data['child_age']
+        if user_data and 'kid_traits' in user_data:
+            kid_traits = user_data['kid_traits']
+            print(f"🧒 Found kid traits: {kid_traits}")
+        else:
+            print("❌ No kid traits found in user data")
+        # Pull intake block for prompt context if present
+        intake = user_data.get('intake') if user_data else None
+    except Exception as e:
+        print(f"Could not fetch user data: {e}")
+        intake = None
+    print(f"🧮 Chat - Using child_age: {child_age} (request: {request_child_age}, user_id: {user_id})")
+    return child_age, kid_traits, intake
+
+# Conversation ids are issued by the server (uuid4 hex) and name Redis keys
+CONVERSATION_ID_RE = re.compile(r'[0-9a-f]{32}')
+
+def load_chat_messages(data):
+    """(messages, conversation_id, summary, new_turns) for a chat request.
+
+    Legacy clients send the whole `messages` list (conversation_id is None).
+    Conversation clients send only the new `message` plus the `conversation_id`
+    from the previous reply (omitted on the first turn); history is kept
+    server-side. Only server-issued ids are accepted: a malformed one raises
+    ValueError, and one with no stored conversation (never issued, or expired)
+    is replaced by a fresh id. `new_turns` (the new user message) is stored
+    together with the reply by `save_chat_reply`, so a failed reply leaves no
+    dangling user turn. `summary` covers turns already compacted out of the
+    stored history.
+    """
+    message = (data.get('message') or '').strip()
+    conversation_id = data.get('conversation_id')
+    if not message and not conversation_id:
+        return data.get('messages', []), None, None, []
+    
+    if conversation_id is not None and not (
+        isinstance(conversation_id, str) and CONVERSATION_ID_RE.fullmatch(conversation_id)
+    ):
+        raise ValueError('Invalid conversation_id')
+    history, summary = cache_service.get_chat(conversation_id) if conversation_id else (None, None)
+    if not history and not summary:
+        conversation_id = uuid.uuid4().hex
+    history = history or []
+    new_turns = [{'role': 'user', 'content': message}] if message else []
+    return history + new_turns, conversation_id, summary, new_turns
+
+def save_chat_reply(conversation_id, new_turns, response):
+    if response.get('advice') == FALLBACK_ADVICE['advice']:
+        return
+    length = cache_service.append_chat_messages(
+        conversation_id, new_turns + [{'role': 'assistant', 'content': response['advice']}]
+    )
+    if length > SUMMARY_TRIGGER_MESSAGES:
+        # At most one compaction per conversation queued or running at a time
+        job_queue.submit('chat_summary', {'conversation_id': conversation_id}, dedupe_key=f"chat_summary:{conversation_id}")
+
+def compact_conversation(payload, progress=None):
+    """Fold all but the last turns of a stored conversation into its running summary"""
+    conversation_id = payload['conversation_id']
+    history, previous = cache_service.get_chat(conversation_id)
+    history = history or []
+    older = history[:-SUMMARY_KEEP_MESSAGES]
+    if len(history) <= SUMMARY_TRIGGER_MESSAGES or not older:
+        return {'compacted': 0}
+    
+    summary = chat_service.summarize_conversation(older, previous)
+    if not summary:
+        return {'compacted': 0}
+    
+    # Atomic compare-and-set: turns appended meanwhile stay, and a changed prefix aborts
+    if not cache_service.compact_chat_history(conversation_id, older, summary):
+        return {'compacted': 0}
+    return {'compacted': len(older)}
+
+job_queue.register('chat_summary', compact_conversation)
+
 @app.route('/api/chat', methods=['POST'])
+@rate_limited('chat', upstreams={'cerebras': 1})
 def chat():
     try:
         data = request.get_json()
-        messages = data.get('messages', [])
-        user_id = data.get('user_id', 'default_user')  # In real app, get from auth
+        try:
+            messages, conversation_id, summary, new_turns = load_chat_messages(data)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
         if not messages:
             return jsonify({'error': 'Messages are required'}), 400
         
-        # Determine child age: request-provided value takes precedence over database
-        request_child_age = data.get('child_age')
-        child_age = request_child_age
-        kid_traits = None
-        try:
-            user_data = firebase_service.get_user_data(user_id)
-            print(f"🔍 Chat - Retrieved user data: {user_data}")
-            
-            if child_age is None and user_data and 'child_age' in user_data:
-                child_age = user_data['child_age']
-            if user_data and 'kid_traits' in user_data:
-                kid_traits = user_data['kid_traits']
-                print(f"🧒 Found kid traits: {kid_traits}")
-            else:
-                print("❌ No kid traits found in user data")
-            # Pull intake block for prompt context if present
-            intake = user_data.get('intake') if user_data else None
-        except Exception as e:
-            print(f"Could not fetch user data: {e}")
-            intake = None
-        print(f"🧮 Chat - Using child_age: {child_age} (request: {request_child_age}, user_id: {user_id})")
+        child_age, kid_traits, intake = load_chat_context(data)
         
         parenting_style = data.get('parenting_style')
         specific_challenge = data.get('specific_challenge')
         
         response = chat_service.get_parenting_advice(
-            messages, child_age, parenting_style, specific_challenge, kid_traits, intake
+            messages, child_age, parenting_style, specific_challenge, kid_traits, intake, summary
         )
+        if conversation_id:
+            save_chat_reply(conversation_id, new_turns, response)
+            response['conversation_id'] = conversation_id
         
         return jsonify(response)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def sse_event(event, payload):
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+@app.route('/api/chat/stream', methods=['POST'])
+@rate_limited('chat', upstreams={'cerebras': 1})
+def chat_stream():
+    """Same input as /api/chat; replies as server-sent events.
+
+    `token` events carry {"text": ...} as the model produces it; a final `done`
+    event carries {"advice", "actionable_steps"} computed from the full reply
+    (plus `conversation_id` for conversation requests). If the model fails
+    mid-reply the stream ends with an `error` event ({"error"} plus fallback
+    advice) instead, and nothing is stored in the conversation.
+    """
+    try:
+        data = request.get_json()
+        try:
+            messages, conversation_id, summary, new_turns = load_chat_messages(data)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        if not messages:
+            return jsonify({'error': 'Messages are required'}), 400
+        
+        child_age, kid_traits, intake = load_chat_context(data)
+        events = chat_service.stream_parenting_advice(
+            messages, child_age, data.get('parenting_style'), data.get('specific_challenge'), kid_traits, intake, summary
+        )
+        
+        def generate():
+            for event, payload in events:
+                if event == 'done' and conversation_id:
+                    save_chat_reply(conversation_id, new_turns, payload)
+                    payload['conversation_id'] = conversation_id
+                yield sse_event(event, {'text': payload} if event == 'token' else payload)
+        
+        return Response(stream_with_context(generate()), mimetype='text/event-stream', headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no',
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/user/<user_id>/age', methods=['POST'])
 def update_child_age(user_id):
     try:
@@ -303,96 +448,195 @@ def get_user_data(user_id):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+BATCH_MAX_ITEMS = int(os.getenv('BATCH_MAX_ITEMS', '50'))
+# Shared by all batch requests, so it also caps total concurrent model calls from batches
+batch_pool = ThreadPoolExecutor(max_workers=int(os.getenv('BATCH_CONCURRENCY', '4')), thread_name_prefix='batch')
+
+def run_batch(items, parse, fn):
+    """One {'result'} or {'error'} per item, in input order; identical inputs run once.
+
+    fn is called with raise_errors=True, so a failed model call is that item's
+    error rather than a fallback answer.
+    """
+    keys = []
+    futures = {}
+    for item in items:
+        if not isinstance(item, dict):
+            keys.append(ValueError('Each item must be a JSON object'))
+            continue
+        try:
+            args = parse(item)
+        except ValueError as e:
+            keys.append(e)
+            continue
+        key = request_key(fn.__name__, *args)
+        if key not in futures:
+            futures[key] = batch_pool.submit(fn, *args, raise_errors=True)
+        keys.append(key)
+    
+    results = []
+    for key in keys:
+        if isinstance(key, ValueError):
+            results.append({'error': str(key)})
+            continue
+        try:
+            results.append({'result': futures[key].result()})
+        except Exception as e:
+            results.append({'error': str(e)})
+    return results
+
+def batch_items(data):
+    items = data.get('items') if data else None
+    if not isinstance(items, list) or not items:
+        raise ValueError('items must be a non-empty list')
+    if len(items) > BATCH_MAX_ITEMS:
+        raise ValueError(f'At most {BATCH_MAX_ITEMS} items per batch')
+    return items
+
+def batch_cost():
+    """Rate-limit units for a batch request: one per item"""
+    items = (request.get_json(silent=True) or {}).get('items')
+    return len(items) if isinstance(items, list) and items else 1
+
+def parse_behavior_request(data):
+    behavior = data.get('behavior_description', '')
+    child_age = data.get('child_age', '')
+    context = data.get('context', '')
+    if not behavior or not child_age:
+        raise ValueError('Behavior description and child age are required')
+    return behavior, child_age, context
+
+def parse_activities_request(data):
+    child_age = data.get('child_age', '')
+    interests = data.get('interests', '')
+    available_time = data.get('available_time', '30 minutes')
+    materials = data.get('materials_available', 'basic household items')
+    if not child_age or not interests:
+        raise ValueError('Child age and interests are required')
+    return child_age, interests, available_time, materials
+
 @app.route('/api/analyze-behavior', methods=['POST'])
+@rate_limited('ai', upstreams={'cerebras': 1})
 def analyze_behavior():
     try:
         data = request.get_json()
-        behavior = data.get('behavior_description', '')
-        child_age = data.get('child_age', '')
-        context = data.get('context', '')
-        
-        if not behavior or not child_age:
-            return jsonify({'error': 'Behavior description and child age are required'}), 400
+        try:
+            args = parse_behavior_request(data)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        response = chat_service.analyze_child_behavior(behavior, child_age, context)
+        response = chat_service.analyze_child_behavior(*args)
         
         return jsonify(response)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/analyze-behavior/batch', methods=['POST'])
+@rate_limited('ai', cost=batch_cost, upstreams={'cerebras': 1})
+def analyze_behavior_batch():
+    """{"items": [<analyze-behavior body>, ...]} -> {"results": [{"result"} | {"error"}, ...]} in input order"""
+    try:
+        try:
+            items = batch_items(request.get_json())
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        return jsonify({'results': run_batch(items, parse_behavior_request, chat_service.analyze_child_behavior)})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/generate-activities', methods=['POST'])
+@rate_limited('ai', upstreams={'cerebras': 1})
 def generate_activities():
     try:
         data = request.get_json()
-        child_age = data.get('child_age', '')
-        interests = data.get('interests', '')
-        available_time = data.get('available_time', '30 minutes')
-        materials = data.get('materials_available', 'basic household items')
-        
-        if not child_age or not interests:
-            return jsonify({'error': 'Child age and interests are required'}), 400
+        try:
+            args = parse_activities_request(data)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        response = chat_service.generate_activities(child_age, interests, available_time, materials)
+        response = chat_service.generate_activities(*args)
         
         return jsonify(response)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/generate-activities/batch', methods=['POST'])
+@rate_limited('ai', cost=batch_cost, upstreams={'cerebras': 1})
+def generate_activities_batch():
+    """{"items": [<generate-activities body>, ...]} -> {"results": [{"result"} | {"error"}, ...]} in input order"""
+    try:
+        try:
+            items = batch_items(request.get_json())
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        return jsonify({'results': run_batch(items, parse_activities_request, chat_service.generate_activities)})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def run_deep_research(payload, progress=None):
+    """Deep research + image enrichment + interpretation; runs on a job worker"""
+    progress = progress or (lambda fraction, stage: None)
+    query = payload['query']
+
+    progress(0.05, 'researching')
+    profiles = anthropic_service.deep_research(query)
+
+    # Best-effort image enrichment for deep research as well
+    progress(0.6, 'enriching')
+    enrich_with_images(profiles, lambda done, total: progress(0.6 + 0.3 * done / total, 'enriching'))
+
+    progress(0.9, 'interpreting')
+    interpretation = anthropic_service.interpret_search(f"Deep research on: {query}")
+
+    return {
+        'profiles': profiles,
+        'interpretation': interpretation
+    }
+
+job_queue.register('deep_research', run_deep_research)
+
 @app.route('/api/deep-research', methods=['POST'])
+@rate_limited('research', upstreams={'anthropic': 2})
 def deep_research():
+    """Queue a deep research job (202 + job id); pass "wait": true for the old blocking reply"""
     try:
         data = request.get_json()
         query = data.get('query', '')
         
         if not query:
             return jsonify({'error': 'Query is required'}), 400
-        
-        # Generate deep research profiles
-        profiles = anthropic_service.deep_research(query)
 
-        # Best-effort image enrichment for deep research as well
-        def enrich_with_image(name: str) -> str | None:
-            try:
-                s = requests.get(
-                    'https://en.wikipedia.org/w/rest.php/v1/search/title',
-                    params={'q': name, 'limit': 1}, timeout=5
-                )
-                if s.ok:
-                    data = s.json() or {}
-                    pages = data.get('pages') or []
-                    if pages:
-                        key = pages[0].get('key')
-                        if key:
-                            summary = requests.get(
-                                f'https://en.wikipedia.org/api/rest_v1/page/summary/{key}',
-                                timeout=5
-                            )
-                            if summary.ok:
-                                js = summary.json() or {}
-                                img = (
-                                    (js.get('originalimage') or {}).get('source')
-                                    or (js.get('thumbnail') or {}).get('source')
-                                )
-                                return img
-            except Exception:
-                pass
-            return None
-
-        for p in profiles or []:
-            if not p.get('imageUrl') and p.get('name'):
-                img = enrich_with_image(p['name'])
-                if img:
-                    p['imageUrl'] = img
+        if data.get('wait'):
+            return jsonify(run_deep_research({'query': query}))
 
-        interpretation = anthropic_service.interpret_search(f"Deep research on: {query}")
-        
+        job_id = job_queue.submit('deep_research', {'query': query})
         return jsonify({
-            'profiles': profiles,
-            'interpretation': interpretation
-        })
+            'job_id': job_id,
+            'status': 'queued',
+            'status_url': f'/api/deep-research/{job_id}'
+        }), 202
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/deep-research/<job_id>', methods=['GET'])
+def deep_research_status(job_id):
+    """Poll a deep research job: status, progress, and profiles once done"""
+    job = job_queue.get(job_id)
+    if not job or job.get('type') != 'deep_research':
+        return jsonify({'error': 'Job not found'}), 404
+
+    response = {
+        'job_id': job_id,
+        'status': job['status'],
+        'progress': job['progress'],
+        'stage': job['stage'],
+    }
+    if job['status'] == 'done':
+        response.update(job['result'] or {})
+    elif job['status'] == 'failed':
+        response['error'] = job.get('error')
+    return jsonify(response)
+
 @app.route('/api/user/<user_id>/preferences', methods=['POST'])
 def save_user_preferences(user_id):
     try:
@@ -432,8 +676,8 @@ def save_user_preferences(user_id):
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/recommend', methods=['GET'])
+@rate_limited('recommend', upstreams={'anthropic': model_calls_per_generation, 'google': 20})
 def recommend():
-    from utils.recommend import get_recommendations
     try:
         # Get family ID first
         family_id = request.args.get('family_id', 'default_user')
@@ -443,16 +687,17 @@ def recommend():
         user_data = firebase_service.get_user_data(family_id) or {}
         logger.info(f"📊 Retrieved user data for {family_id}: {user_data}")
         
-        # Use URL params with Firebase data as fallback
-        budget_per_week = request.args.get('budget_per_week_usd', type=float) or user_data.get('budget_per_week_usd')
-        child_age = request.args.get('child_age', type=int) or user_data.get('child_age')
+        # URL params with Firebase data (top level, then intake) as fallback; shared with the cache warmer
+        profile = family_profile(user_data, request.args)
+        budget_per_week = profile['budget_per_week']
+        child_age = profile['child_age']
         
         if budget_per_week is None or child_age is None:
             return jsonify({'error': 'Missing required parameters: budget_per_week_usd and child_age'}), 400
 
-        support_available = request.args.getlist('support_available') or user_data.get('support_available', [])
-        transport = request.args.get('transport') or user_data.get('transport')
-        hours_per_week_with_kid = request.args.get('hours_per_week_with_kid', type=int) or user_data.get('hours_per_week_with_kid')
+        support_available = profile['support_available']
+        transport = profile['transport']
+        hours_per_week_with_kid = profile['hours_per_week_with_kid']
 
         # Robust bool parsing with Firebase fallback
         raw_spouse = request.args.get('spouse', default=None)
@@ -462,14 +707,14 @@ def recommend():
         elif 'spouse' in user_data:
             spouse = user_data['spouse']
 
-        parenting_style = request.args.get('parenting_style') or user_data.get('parenting_style')
+        parenting_style = profile['parenting_style']
         number_of_kids = request.args.get('number_of_kids', type=int) or user_data.get('number_of_kids')
-        area_type = request.args.get('area_type') or user_data.get('area_type')
-        priorities_ranked = request.args.getlist('priorities_ranked') or user_data.get('priorities_ranked', [])
+        area_type = profile['area_type']
+        priorities_ranked = profile['priorities_ranked']
         # Optional location inputs
         lat = request.args.get('lat', type=float)
         lng = request.args.get('lng', type=float)
-        user_zip = request.args.get('zip')
+        user_zip = profile['zip']
         if (lat is None or lng is None) and user_zip:
             try:
                 geo = maps_service.geocode_address(user_zip)
@@ -545,9 +790,10 @@ def recommend():
         except Exception as e:
             logger.warning(f"Nearby enrichment failed: {e}")
 
-        if not recommendations:
-            # Fallback to simple format for backward compatibility
-            recommendations = {
+        missing_domains = [d for d in ('cognitive', 'physical', 'emotional', 'social') if not isinstance(recommendations.get(d), dict)]
+        if missing_domains:
+            # Fallback to simple format for backward compatibility (per domain, so one failed domain doesn't drop the rest)
+            fallback = {
                 "cognitive": {
                     "parenting_advice": "Focus on age-appropriate learning activities that match your child's interests",
                     "activity_types": ["Reading together", "Educational games", "STEM activities"],
@@ -609,6 +855,8 @@ def recommend():
                     }]
                 }
             }
+            for domain in missing_domains:
+                recommendations[domain] = fallback[domain]
         print("SERVER_FINAL_RECS_KEYS", list(recommendations.keys()) if isinstance(recommendations, dict) else type(recommendations))
         return jsonify({
             'success': True,
@@ -634,6 +882,9 @@ def recommend():
         logger.exception("recommend endpoint failed")
         return jsonify({'error': f'Failed to get recommendations: {str(e)}'}), 500
 
+# Start background job workers for this process
+job_queue.start()
+
 if __name__ == '__main__':
     # If you stick with module-level singletons, disable the reloader to avoid double init
     app.run(host='0.0.0.0', port=8001, debug=True, use_reloader=False)
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Tests for the bitmap attribute index (utils/attribute_index.py) and Activity.index()
+"""
+
+import math
+import os
+import random
+import sys
+import threading
+import time
+
+# Add the backend directory to Python path
+sys.path.insert(0, os.path.dirname(__file__))
+
+import app
+from app.models import Activity
+from utils.attribute_index import AttributeIndex
+
+CATEGORIES = ["sports", "arts", "music", "stem", None]
+
+
+def random_row(rng, key):
+    age_min = rng.choice([None, rng.randint(0, 12), rng.uniform(0, 12)])
+    age_max = rng.choice([None, rng.randint(6, 25), rng.uniform(6, 25)])
+    price = rng.choice([None, float("nan"), rng.randint(0, 300), rng.uniform(0, 300)])
+    return key, rng.choice(CATEGORIES), age_min, age_max, price, {"id": key}
+
+
+def brute_force(rows, index, age=None, categories=None, max_price=None):
+    """Keys the index should select, following its documented whole-year and unknown-price rules."""
+    keys = set()
+    for key, category, age_min, age_max, price, _ in rows.values():
+        if categories is not None and category not in categories:
+            continue
+        if age is not None:
+            lo, hi = index._age_years(age_min, age_max)
+            if age < 0 or not lo <= min(math.floor(age), index.max_age) <= hi:
+                continue
+        price = index._price(price)
+        if max_price is not None and price is not None and price > max_price:
+            continue
+        keys.add(key)
+    return keys
+
+
+def random_query(rng):
+    return {
+        "age": rng.choice([None, -1, rng.randint(0, 25), rng.uniform(0, 25)]),
+        "categories": rng.choice([None, [], rng.sample(CATEGORIES, rng.randint(1, 3))]),
+        "max_price": rng.choice([None, rng.randint(0, 300), rng.uniform(0, 300)]),
+    }
+
+
+def test_select_matches_brute_force_after_rebuild_and_updates():
+    rng = random.Random(7)
+    index = AttributeIndex()
+    rows = {key: random_row(rng, key) for key in range(500)}
+    index.rebuild(rows.values())
+    for step in range(2000):
+        if step % 3 == 0:
+            key = rng.randrange(700)
+            rows[key] = random_row(rng, key)
+            index.upsert(*rows[key])
+        elif step % 3 == 1:
+            key = rng.randrange(700)
+            rows.pop(key, None)
+            index.remove(key)
+        query = random_query(rng)
+        expected = brute_force(rows, index, **query)
+        assert index.select_keys(**query) == expected, query
+        assert sorted(v["id"] for v in index.select_values(**query)) == sorted(expected)
+    assert len(index) == len(rows)
+
+
+def test_rebuild_skips_duplicate_keys_and_reuses_freed_slots():
+    index = AttributeIndex()
+    index.rebuild([("a", "arts", 3, 8, 10, 1), ("a", "music", 3, 8, 10, 2), ("b", "arts", 3, 8, 99, 3)])
+    assert len(index) == 2
+    assert index.get("a") == 1
+    index.remove("b")
+    index.upsert("c", "stem", 5, 5, None, 4)
+    assert index.snapshot()["free_slots"] == 0
+    assert index.select_keys(age=5, max_price=0) == {"c"}
+    assert index.select_keys(categories=["arts"], max_price=50) == {"a"}
+
+
+# ---------- Activity.index ----------
+
+class FakeDoc:
+    def __init__(self, store):
+        self.store = store
+
+    def document(self, doc_id):
+        store = self.store
+
+        class Ref:
+            def set(self, data):
+                store[doc_id] = data
+
+        return Ref()
+
+
+class FakeDb:
+    def __init__(self):
+        self.docs = {}
+
+    def collection(self, name):
+        return FakeDoc(self.docs)
+
+
+def activity(doc_id, category="arts", price=10):
+    return Activity({"title": doc_id, "category": category, "age_min": 4, "age_max": 10, "price_monthly": price}, doc_id)
+
+
+def reset_index(monkeypatch):
+    monkeypatch.setattr(Activity, "_index", None)
+    monkeypatch.setattr(Activity, "_index_built_at", 0.0)
+    monkeypatch.setattr(Activity, "_index_pending", None)
+    monkeypatch.setattr(app, "db", FakeDb())
+
+
+def test_activity_index_rebuild_does_not_block_readers_or_drop_saves(monkeypatch):
+    reset_index(monkeypatch)
+    monkeypatch.setattr(Activity, "get_all", classmethod(lambda cls: [activity("old")]))
+    first = Activity.index()
+    assert first.select_keys(age=6) == {"old"}
+
+    # Next rebuild blocks inside the collection read until released
+    reading, release = threading.Event(), threading.Event()
+
+    def slow_get_all(cls):
+        reading.set()
+        release.wait(5)
+        return [activity("old"), activity("listed")]
+
+    monkeypatch.setattr(Activity, "get_all", classmethod(slow_get_all))
+    monkeypatch.setattr(Activity, "_index_built_at", time.monotonic() - Activity.INDEX_TTL_S - 1)
+    rebuilt = {}
+    rebuilder = threading.Thread(target=lambda: rebuilt.setdefault("index", Activity.index()))
+    rebuilder.start()
+    assert reading.wait(5)
+
+    # Readers get the old index straight away, and a save lands in it
+    start = time.monotonic()
+    assert Activity.index() is first
+    activity("saved", category="music").save()
+    assert time.monotonic() - start < 1
+    assert "saved" in first.select_keys(categories=["music"])
+
+    release.set()
+    rebuilder.join(5)
+    fresh = rebuilt["index"]
+    assert fresh is not first and Activity.index() is fresh
+    # The save made mid-rebuild was not in the collection read, but survives the swap
+    assert fresh.select_keys(age=6) == {"old", "listed", "saved"}
+    assert Activity._index_pending is None
+
+
+def test_activity_index_failed_rebuild_keeps_old_index(monkeypatch):
+    reset_index(monkeypatch)
+    monkeypatch.setattr(Activity, "get_all", classmethod(lambda cls: [activity("old")]))
+    first = Activity.index()
+
+    def broken(cls):
+        raise RuntimeError("firestore down")
+
+    monkeypatch.setattr(Activity, "get_all", classmethod(broken))
+    monkeypatch.setattr(Activity, "_index_built_at", time.monotonic() - Activity.INDEX_TTL_S - 1)
+    try:
+        Activity.index()
+    except RuntimeError:
+        pass
+    assert Activity._index is first
+    assert Activity._index_pending is None
+    assert not Activity._index_rebuild_lock.locked()
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Tests for chat provider failover and hedging (utils/chat_providers.py)
+"""
+
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+# Add the backend directory to Python path
+sys.path.insert(0, os.path.dirname(__file__))
+
+from utils.chat_providers import AnthropicChatProvider, ChatProvider, ProviderPool
+
+MESSAGES = [{"role": "user", "content": "hi"}]
+
+
+class FakeProvider(ChatProvider):
+    def __init__(self, name, reply="ok", delay=0.0, fail=None, fail_on_create=None):
+        self.name = name
+        self.reply = reply
+        self.delay = delay
+        self.fail = fail
+        self.fail_on_create = fail_on_create
+        self.calls = 0
+
+    def complete(self, call_site, messages, max_tokens, temperature):
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.fail:
+            raise self.fail
+        return self.reply
+
+    def stream(self, call_site, messages, max_tokens, temperature):
+        self.calls += 1
+        if self.fail_on_create:
+            raise self.fail_on_create
+        return self._deltas()
+
+    def _deltas(self):
+        time.sleep(self.delay)
+        if self.fail:
+            raise self.fail
+        for word in self.reply.split():
+            yield word
+
+
+def pool(*providers, hedge=False):
+    return ProviderPool(list(providers), hedge=hedge, hedge_min_s=0.05, hedge_max_s=0.05)
+
+
+def collect(stream, timeout=5.0):
+    """Drain a stream on another thread so a hang fails the test instead of blocking it."""
+    result = {}
+
+    def run():
+        try:
+            result["deltas"] = list(stream)
+        except Exception as e:
+            result["error"] = e
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(timeout)
+    assert not thread.is_alive(), "stream never finished"
+    return result
+
+
+def test_complete_fails_over_to_backup():
+    primary = FakeProvider("primary", fail=RuntimeError("down"))
+    backup = FakeProvider("backup", reply="from backup")
+    chat = pool(primary, backup)
+    assert chat.complete("test", MESSAGES) == "from backup"
+    assert chat.snapshot()["failovers"] == 1
+    assert chat.snapshot()["served_by"] == {"backup": 1}
+
+
+def test_complete_raises_when_every_provider_fails():
+    chat = pool(FakeProvider("a", fail=RuntimeError("a down")), FakeProvider("b", fail=RuntimeError("b down")))
+    with pytest.raises(RuntimeError, match="b down"):
+        chat.complete("test", MESSAGES)
+
+
+def test_complete_hedges_slow_primary():
+    primary = FakeProvider("primary", reply="slow", delay=1.0)
+    backup = FakeProvider("backup", reply="fast")
+    chat = pool(primary, backup, hedge=True)
+    start = time.monotonic()
+    assert chat.complete("test", MESSAGES) == "fast"
+    assert time.monotonic() - start < 0.8
+    assert chat.snapshot()["hedges"] == 1
+
+
+def test_stream_fails_over_on_error_before_first_token():
+    primary = FakeProvider("primary", fail=RuntimeError("down"))
+    backup = FakeProvider("backup", reply="hello there")
+    result = collect(pool(primary, backup).stream("test", MESSAGES))
+    assert result == {"deltas": ["hello", "there"]}
+
+
+def test_stream_hedges_slow_primary():
+    primary = FakeProvider("primary", reply="slow reply", delay=1.0)
+    backup = FakeProvider("backup", reply="fast reply")
+    chat = pool(primary, backup, hedge=True)
+    result = collect(chat.stream("test", MESSAGES))
+    assert result == {"deltas": ["fast", "reply"]}
+    assert chat.snapshot()["hedges"] == 1
+
+
+def test_stream_creation_error_alone_raises():
+    broken = FakeProvider("broken", fail_on_create=KeyError("content"))
+    result = collect(pool(broken).stream("test", MESSAGES))
+    assert isinstance(result.get("error"), KeyError)
+
+
+def test_stream_creation_error_fails_over_to_backup():
+    broken = FakeProvider("broken", fail_on_create=KeyError("content"))
+    backup = FakeProvider("backup", reply="still here")
+    result = collect(pool(broken, backup).stream("test", MESSAGES))
+    assert result == {"deltas": ["still", "here"]}
+
+
+def test_anthropic_provider_bad_message_does_not_hang():
+    class Llm:
+        provider = "anthropic"
+
+        def stream(self, call_site, **kwargs):
+            return iter(["never"])
+
+    broken = AnthropicChatProvider(Llm(), "model")
+    result = collect(pool(broken).stream("test", [{"role": "user"}]))
+    assert isinstance(result.get("error"), KeyError)
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Tests for the geohash index (utils/geo_index.py)
+"""
+
+import math
+import os
+import random
+import sys
+
+# Add the backend directory to Python path
+sys.path.insert(0, os.path.dirname(__file__))
+
+from utils.geo_index import GeoIndex, cell_center, cell_size, geohash, haversine_m
+
+
+def great_circle_m(lat1, lng1, lat2, lng2):
+    """Independent (scalar, math-module) haversine for the brute-force checks."""
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp, dl = p2 - p1, math.radians(lng2 - lng1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * 6371000.0 * math.asin(math.sqrt(min(1.0, a)))
+
+
+def test_geohash_known_values_and_cell_center():
+    assert geohash(57.64911, 10.40744, 11) == "u4pruydqqvj"
+    assert geohash(37.7749, -122.4194, 5) == "9q8yy"
+    lat, lng = cell_center(37.7749, -122.4194, 6)
+    cell_lat, cell_lng = cell_size(6)
+    assert geohash(lat, lng, 6) == geohash(37.7749, -122.4194, 6)
+    assert abs(lat - 37.7749) <= cell_lat / 2 and abs(lng + 122.4194) <= cell_lng / 2
+
+
+def test_haversine_matches_scalar_formula():
+    assert abs(float(haversine_m(40.7128, -74.0060, 34.0522, -118.2437)) - 3935746) < 1000
+    assert float(haversine_m(10.0, 20.0, 10.0, 20.0)) == 0.0
+
+
+def wrap_lng(lng):
+    return (lng + 180.0) % 360.0 - 180.0
+
+
+def random_points(rng, n, center, spread):
+    lat0, lng0 = center
+    return {i: (lat0 + rng.uniform(-spread, spread), wrap_lng(lng0 + rng.uniform(-spread, spread))) for i in range(n)}
+
+
+def check_radius(index, points, lat, lng, radius_m):
+    got = index.radius(lat, lng, radius_m)
+    distances = {k: great_circle_m(lat, lng, *p) for k, p in points.items()}
+    expected = {k for k, d in distances.items() if d <= radius_m}
+    # Points right on the boundary may round either way between the two formulas
+    borderline = {k for k, d in distances.items() if abs(d - radius_m) < 0.01}
+    assert {k for k, _ in got} ^ expected <= borderline
+    assert [d for _, d in got] == sorted(d for _, d in got)
+    for key, d in got:
+        assert abs(d - distances[key]) < 0.01
+
+
+def test_radius_matches_brute_force():
+    rng = random.Random(3)
+    for center in [(37.77, -122.42), (-33.87, 151.21), (64.14, -21.94), (0.0, 179.9), (0.0, 0.0)]:
+        points = random_points(rng, 2000, center, 0.6)
+        index = GeoIndex()
+        for key, (lat, lng) in points.items():
+            index.upsert(key, lat, lng)
+        for _ in range(20):
+            lat = center[0] + rng.uniform(-0.5, 0.5)
+            lng = wrap_lng(center[1] + rng.uniform(-0.5, 0.5))
+            check_radius(index, points, lat, lng, rng.choice([500, 2000, 8000, 25000, 100000]))
+
+
+def test_radius_tracks_moves_and_removals():
+    rng = random.Random(5)
+    points = random_points(rng, 500, (40.71, -74.0), 0.3)
+    index = GeoIndex(precision=6)
+    for key, (lat, lng) in points.items():
+        index.upsert(key, lat, lng, value={"id": key})
+    for key in range(0, 500, 3):
+        points[key] = (40.71 + rng.uniform(-0.3, 0.3), -74.0 + rng.uniform(-0.3, 0.3))
+        index.upsert(key, *points[key], value={"id": key})
+    for key in range(1, 500, 5):
+        points.pop(key)
+        index.remove(key)
+    # Kept without coordinates: retrievable but never matched
+    index.upsert("unlocated", None, None, value="no coords")
+    assert index.get("unlocated") == "no coords"
+    for _ in range(20):
+        check_radius(index, points, 40.71 + rng.uniform(-0.2, 0.2), -74.0 + rng.uniform(-0.2, 0.2), rng.choice([1000, 5000, 20000]))
+    assert index.snapshot()["located"] == len(points)
+    assert len(index) == len(points) + 1
+
+
+def test_bbox_matches_brute_force():
+    rng = random.Random(11)
+    points = random_points(rng, 1500, (51.5, -0.12), 0.5)
+    index = GeoIndex()
+    for key, (lat, lng) in points.items():
+        index.upsert(key, lat, lng)
+    for _ in range(30):
+        lat_a, lat_b = sorted(51.5 + rng.uniform(-0.6, 0.6) for _ in range(2))
+        lng_a, lng_b = sorted(-0.12 + rng.uniform(-0.6, 0.6) for _ in range(2))
+        expected = {k for k, (lat, lng) in points.items() if lat_a <= lat <= lat_b and lng_a <= lng <= lng_b}
+        assert set(index.bbox(lat_a, lng_a, lat_b, lng_b)) == expected
+
+
+def test_radius_crosses_the_antimeridian():
+    rng = random.Random(1)
+    index = GeoIndex()
+    # Dense enough that queries visit cells instead of scanning everything
+    for key in range(5000):
+        index.upsert(key, rng.uniform(-1, 1), rng.uniform(-180, 180))
+    index.upsert("east", 0.0, 179.95)
+    index.upsert("west", 0.0, -179.95)
+    for lng in (179.97, -179.97):
+        found = {k for k, _ in index.radius(0.0, lng, 20000)}
+        assert {"east", "west"} <= found
+
+
+def test_empty_index_and_huge_radius():
+    index = GeoIndex()
+    assert index.radius(0.0, 0.0, 1000) == []
+    index.upsert("a", 10.0, 10.0)
+    index.upsert("b", -10.0, -170.0)
+    # Larger than the query-cell cap: falls back to scanning every point
+    assert {k for k, _ in index.radius(0.0, 0.0, 20_000_000)} == {"a", "b"}
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Tests for the background job queue (utils/jobs.py)
+"""
+
+import os
+import sys
+import threading
+import time
+import uuid
+
+import pytest
+
+# Add the backend directory to Python path
+sys.path.insert(0, os.path.dirname(__file__))
+
+from utils.jobs import JobQueue
+
+
+def make_queue():
+    """A queue with one worker and a handler that blocks until `release` is set."""
+    jobs = JobQueue(name=f"test-{uuid.uuid4().hex[:8]}", workers=1)
+    started, release = threading.Event(), threading.Event()
+    runs = []
+
+    def handler(payload, progress):
+        started.set()
+        release.wait(5)
+        runs.append(payload)
+        return {"echo": payload["n"]}
+
+    jobs.register("echo", handler)
+    return jobs, started, release, runs
+
+
+def wait_for(jobs, job_id, status="done", timeout=5.0):
+    until = time.monotonic() + timeout
+    while time.monotonic() < until:
+        job = jobs.get(job_id)
+        if job and job["status"] == status:
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"job {job_id} never reached {status}: {jobs.get(job_id)}")
+
+
+def check_dedupe(jobs, started, release, runs):
+    first = jobs.submit("echo", {"n": 1}, dedupe_key="conv-1")
+    assert started.wait(5)
+    # Same key while the first job runs: the running job is reused
+    assert jobs.submit("echo", {"n": 2}, dedupe_key="conv-1") == first
+    # Other keys (and no key) are independent
+    other = jobs.submit("echo", {"n": 3}, dedupe_key="conv-2")
+    plain = jobs.submit("echo", {"n": 4})
+    assert len({first, other, plain}) == 3
+
+    release.set()
+    assert wait_for(jobs, first)["result"] == {"echo": 1}
+    wait_for(jobs, other)
+    wait_for(jobs, plain)
+    assert sorted(p["n"] for p in runs) == [1, 3, 4]
+    # Once the job finished, its key is free again
+    again = jobs.submit("echo", {"n": 5}, dedupe_key="conv-1")
+    assert again != first
+    assert wait_for(jobs, again)["result"] == {"echo": 5}
+
+
+def test_dedupe_in_process_memory(no_redis):
+    check_dedupe(*make_queue())
+
+
+def test_dedupe_with_redis(fake_redis):
+    check_dedupe(*make_queue())
+    assert not any(k.startswith("jobs:") and ":dedupe:" in k for k in fake_redis.data)
+
+
+def test_falls_back_to_process_memory_when_redis_fails(fake_redis):
+    jobs, started, release, runs = make_queue()
+    fake_redis.fail = True
+    release.set()
+    first = jobs.submit("echo", {"n": 1}, dedupe_key="conv-1")
+    assert wait_for(jobs, first)["result"] == {"echo": 1}
+    assert runs == [{"n": 1}]
+
+
+def test_failed_job_reports_error_and_releases_key(no_redis):
+    jobs = JobQueue(name=f"test-{uuid.uuid4().hex[:8]}", workers=1)
+
+    def broken(payload, progress):
+        progress(0.5, "halfway")
+        raise RuntimeError("model down")
+
+    jobs.register("broken", broken)
+    first = jobs.submit("broken", {}, dedupe_key="k")
+    job = wait_for(jobs, first, status="failed")
+    assert job["error"] == "model down"
+    assert jobs.submit("broken", {}, dedupe_key="k") != first
+
+
+def test_unknown_job_type_is_rejected(no_redis):
+    jobs = JobQueue(name=f"test-{uuid.uuid4().hex[:8]}", workers=1)
+    with pytest.raises(KeyError):
+        jobs.submit("missing", {})
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Tests for the per-user / per-upstream token buckets (utils/rate_limit.py)
+"""
+
+import os
+import sys
+
+import pytest
+from flask import Flask, jsonify
+
+# Add the backend directory to Python path
+sys.path.insert(0, os.path.dirname(__file__))
+
+import utils.rate_limit as rate_limit
+from utils.rate_limit import Limit, RateLimiter, rate_limited
+
+# Effectively no refill during a test (one token every ~17 minutes)
+SLOW = 0.06
+
+
+@pytest.fixture
+def limiter(monkeypatch, no_redis):
+    limiter = RateLimiter(
+        limits={
+            "chat": Limit(SLOW, 5),
+            "upstream:anthropic": Limit(SLOW, 4),
+            "upstream:google": Limit(SLOW, 1),
+        },
+        enabled=True,
+    )
+    monkeypatch.setattr(rate_limit, "rate_limiter", limiter)
+    return limiter
+
+
+@pytest.fixture
+def client(limiter):
+    app = Flask(__name__)
+
+    @app.route("/model", methods=["POST"])
+    @rate_limited("chat", upstreams={"anthropic": lambda: 2})
+    def model():
+        return jsonify({"ok": True})
+
+    @app.route("/both", methods=["POST"])
+    @rate_limited("chat", upstreams={"anthropic": 1, "google": 1})
+    def both():
+        return jsonify({"ok": True})
+
+    @app.route("/batch", methods=["POST"])
+    @rate_limited("chat", cost=lambda: 3, upstreams={"anthropic": 1})
+    def batch():
+        return jsonify({"ok": True})
+
+    return app.test_client()
+
+
+def tokens(limiter, name, subject):
+    state = limiter._local.get(f"ratelimit:{name}:{subject}")
+    return None if state is None else round(state[0], 2)
+
+
+def post(client, path, user="u1"):
+    return client.post(path, json={"user_id": user})
+
+
+def test_upstream_rejection_refunds_the_callers_bucket(client, limiter):
+    assert post(client, "/both").status_code == 200
+    assert tokens(limiter, "chat", "user:u1") == 4
+    assert tokens(limiter, "upstream:anthropic", "all") == 3
+
+    # google's single token is gone: rejected after chat and anthropic were charged
+    response = post(client, "/both")
+    assert response.status_code == 429
+    assert response.get_json()["limit"] == "upstream:google"
+    assert int(response.headers["Retry-After"]) >= 1
+    # ... and both are refunded, so the rejected request cost nothing
+    assert tokens(limiter, "chat", "user:u1") == 4
+    assert tokens(limiter, "upstream:anthropic", "all") == 3
+
+
+def test_caller_rejection_charges_no_upstream(client, limiter):
+    assert limiter.acquire("chat", "user:u1", 5) == 0
+    before = tokens(limiter, "upstream:anthropic", "all")
+    response = post(client, "/both")
+    assert response.status_code == 429
+    assert response.get_json()["limit"] == "chat"
+    assert tokens(limiter, "upstream:anthropic", "all") == before
+
+
+def test_per_call_upstream_cost(client, limiter):
+    # Two model calls per request against a burst of four
+    assert post(client, "/model").status_code == 200
+    assert post(client, "/model").status_code == 200
+    assert tokens(limiter, "upstream:anthropic", "all") == 0
+    response = post(client, "/model")
+    assert response.status_code == 429
+    assert response.get_json()["limit"] == "upstream:anthropic"
+    # Two requests took one caller token each; the rejected third was refunded
+    assert tokens(limiter, "chat", "user:u1") == 3
+
+
+def test_request_cost_multiplies_upstream_cost(client, limiter):
+    assert post(client, "/batch").status_code == 200
+    assert tokens(limiter, "chat", "user:u1") == 2
+    assert tokens(limiter, "upstream:anthropic", "all") == 1
+    response = post(client, "/batch")
+    assert response.status_code == 429
+    assert tokens(limiter, "chat", "user:u1") == 2
+
+
+def test_refund_never_exceeds_capacity(limiter):
+    assert limiter.acquire("chat", "u", 1) == 0
+    limiter.refund("chat", "u", 3)
+    assert tokens(limiter, "chat", "u") == 5
+    # Refunding a bucket that was never charged does not create one
+    limiter.refund("chat", "nobody", 1)
+    assert tokens(limiter, "chat", "nobody") is None
+
+
+def test_redis_errors_fall_back_to_local_buckets(limiter, fake_redis):
+    fake_redis.fail = True
+    assert limiter.acquire("upstream:google", "all") == 0
+    assert limiter.acquire("upstream:google", "all") > 0
+    limiter.refund("upstream:google", "all", 1)
+    assert limiter.acquire("upstream:google", "all") == 0
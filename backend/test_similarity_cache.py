@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Tests for the near-duplicate response cache (utils/similarity_cache.py)
+"""
+
+import os
+import sys
+import time
+
+# Add the backend directory to Python path
+sys.path.insert(0, os.path.dirname(__file__))
+
+from utils.similarity_cache import SimilarityCache, age_band, content_words, jaccard
+
+
+def test_content_words_drop_framing_numbers_and_plurals():
+    assert content_words("My 4-year-old has tantrums at bedtime") == {"tantrum", "bedtime"}
+    assert content_words("Tantrums at bedtime, age 4") == {"tantrum", "bedtime"}
+    assert content_words("the of and") == frozenset()
+
+
+def test_age_bands():
+    assert [age_band(a) for a in (1, 3, "5", 8, 12, 15)] == ["infant", "toddler", "preschool", "early", "middle", "teen"]
+    assert age_band(None) == age_band("n/a") == "unknown"
+
+
+def test_near_duplicates_share_an_answer():
+    cache = SimilarityCache("test", threshold=0.8)
+    cache.set("behavior:toddler", "4-year-old tantrums at bedtime", {"advice": "routine"})
+    assert cache.get("behavior:toddler", "tantrums at bedtime, age 4") == {"advice": "routine"}
+    assert cache.snapshot()["exact_hits"] == 1
+
+
+def test_dissimilar_text_and_other_scopes_miss():
+    cache = SimilarityCache("test", threshold=0.8)
+    cache.set("behavior:toddler", "tantrums at bedtime", {"advice": "routine"})
+    assert cache.get("behavior:toddler", "refuses vegetables at dinner") is None
+    assert cache.get("behavior:teen", "tantrums at bedtime") is None
+    assert cache.get("behavior:toddler", "") is None
+    assert cache.snapshot()["misses"] == 2
+
+
+def test_lookup_matches_brute_force_best_jaccard():
+    cache = SimilarityCache("test", threshold=0.6)
+    texts = [
+        "tantrums bedtime crying screaming",
+        "tantrums bedtime crying hitting",
+        "picky eating vegetables dinner",
+        "sibling fighting toys sharing",
+        "screen time limits tablet",
+    ]
+    for i, text in enumerate(texts):
+        cache.set("scope", text, i)
+    for query in ["tantrums bedtime crying", "vegetables dinner picky", "sibling toys fighting hitting", "homework math"]:
+        words = content_words(query)
+        scores = {i: jaccard(words, content_words(t)) for i, t in enumerate(texts)}
+        best = max(scores.values())
+        found = cache.get("scope", query)
+        # LSH can only miss candidates, never invent them; at these similarities it finds a best one
+        if best < 0.6:
+            assert found is None, query
+        else:
+            assert found is not None and scores[found] == best, query
+
+
+def test_results_are_copies_and_entries_expire():
+    cache = SimilarityCache("test", ttl=0.1)
+    cache.set("scope", "tantrums bedtime", {"steps": ["a"]})
+    first = cache.get("scope", "tantrums bedtime")
+    first["steps"].append("mutated")
+    assert cache.get("scope", "tantrums bedtime") == {"steps": ["a"]}
+    time.sleep(0.15)
+    assert cache.get("scope", "tantrums bedtime") is None
+
+
+def test_evicted_entries_leave_no_buckets():
+    cache = SimilarityCache("test", maxsize=2)
+    for text in ["tantrums bedtime", "picky eating", "sibling fighting"]:
+        cache.set("scope", text, text)
+    assert cache.get("scope", "tantrums bedtime") is None
+    assert cache.snapshot()["size"] == 2
+    live = {entry_id for bucket in cache._buckets.values() for entry_id in bucket}
+    assert len(live) == 2
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Tests for request coalescing (utils/singleflight.py)
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+# Add the backend directory to Python path
+sys.path.insert(0, os.path.dirname(__file__))
+
+from utils.singleflight import SingleFlight, request_key
+
+
+def flight(**kwargs):
+    kwargs.setdefault("poll_interval_s", 0.02)
+    return SingleFlight("test", **kwargs)
+
+
+def lock_key(key):
+    return f"singleflight:test:lock:{key}"
+
+
+def result_key(key):
+    return f"singleflight:test:result:{key}"
+
+
+def test_request_key_ignores_case_whitespace_and_key_order():
+    assert request_key("ns", "Bedtime  Tantrums", {"b": 1, "a": 2}) == request_key("ns", "bedtime tantrums", {"a": 2, "b": 1})
+    assert request_key("ns", "bedtime") != request_key("ns", "bathtime")
+    assert request_key("ns", "x") != request_key("other", "x")
+
+
+def test_local_waiters_share_the_leaders_call(no_redis):
+    group = flight()
+    release = threading.Event()
+    calls = []
+
+    def fn():
+        calls.append(1)
+        release.wait(5)
+        return {"items": [1, 2]}
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        futures = [pool.submit(group.do, "k", fn) for _ in range(8)]
+        until = time.monotonic() + 5
+        while group.snapshot()["local_waiters"] < 7 and time.monotonic() < until:
+            time.sleep(0.01)
+        release.set()
+        results = [f.result(5) for f in futures]
+
+    assert len(calls) == 1
+    assert all(r == {"items": [1, 2]} for r in results)
+    # Every caller gets its own copy
+    assert len({id(r) for r in results}) == 8
+    stats = group.snapshot()
+    assert (stats["leaders"], stats["local_waiters"], stats["in_flight"]) == (1, 7, 0)
+
+
+def test_leader_error_reaches_waiters_and_next_call_retries(no_redis):
+    group = flight()
+    release = threading.Event()
+
+    def fail():
+        release.wait(5)
+        raise RuntimeError("upstream down")
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        leader = pool.submit(group.do, "k", fail)
+        while group.snapshot()["in_flight"] == 0:
+            time.sleep(0.01)
+        waiter = pool.submit(group.do, "k", lambda: "unused")
+        while group.snapshot()["local_waiters"] == 0:
+            time.sleep(0.01)
+        release.set()
+        for future in (leader, waiter):
+            with pytest.raises(RuntimeError, match="upstream down"):
+                future.result(5)
+    assert group.do("k", lambda: "fresh") == "fresh"
+
+
+def test_local_waiter_runs_the_call_itself_past_its_deadline(no_redis):
+    group = flight()
+    release = threading.Event()
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        leader = pool.submit(group.do, "k", lambda: release.wait(5) and "slow")
+        while group.snapshot()["in_flight"] == 0:
+            time.sleep(0.01)
+        start = time.monotonic()
+        assert group.do("k", lambda: "own", deadline=time.monotonic() + 0.1) == "own"
+        assert time.monotonic() - start < 1
+        release.set()
+        assert leader.result(5) == "slow"
+    assert group.snapshot()["local_fallthrough"] == 1
+
+
+def test_leader_publishes_result_and_releases_lock(fake_redis):
+    group = flight()
+    assert group.do("k", lambda: {"answer": 42}) == {"answer": 42}
+    assert json.loads(fake_redis.get(result_key("k"))) == {"answer": 42}
+    assert fake_redis.get(lock_key("k")) is None
+    # A later caller (any process) within the result TTL reuses it
+    assert group.do("k", lambda: {"answer": 0}) == {"answer": 42}
+    assert group.snapshot()["remote_waiters"] == 1
+
+
+def test_unshareable_results_are_not_published(fake_redis):
+    group = flight()
+    assert group.do("k", lambda: []) == []
+    assert fake_redis.get(result_key("k")) is None
+
+
+def test_remote_waiter_gets_other_processs_result(fake_redis):
+    group = flight()
+    fake_redis.set(lock_key("k"), "other-process", nx=True, px=5000)
+    threading.Timer(0.1, lambda: fake_redis.setex(result_key("k"), 30, json.dumps({"from": "other"}))).start()
+    assert group.do("k", lambda: {"from": "self"}) == {"from": "other"}
+    assert group.snapshot()["remote_waiters"] == 1
+
+
+def test_remote_waiter_falls_through_when_leader_lock_expires(fake_redis):
+    group = flight()
+    # A leader that died without publishing: its lock just expires
+    fake_redis.set(lock_key("k"), "dead-process", nx=True, px=150)
+    start = time.monotonic()
+    assert group.do("k", lambda: "self") == "self"
+    assert 0.1 <= time.monotonic() - start < 2
+    assert group.snapshot()["remote_fallthrough"] == 1
+
+
+def test_remote_wait_is_bounded_by_lock_ttl_and_deadline(fake_redis):
+    # The other process's lock never goes away (e.g. it was taken with a longer TTL)
+    fake_redis.set(lock_key("k"), "stuck-process", nx=True, px=60000)
+    group = flight(lock_ttl_s=0.2)
+    start = time.monotonic()
+    assert group.do("k", lambda: "self") == "self"
+    assert time.monotonic() - start < 1
+
+    group = flight(lock_ttl_s=60)
+    start = time.monotonic()
+    assert group.do("k", lambda: "self", deadline=time.monotonic() + 0.2) == "self"
+    assert time.monotonic() - start < 1
+
+
+def test_redis_errors_run_the_call_directly(fake_redis):
+    fake_redis.fail = True
+    group = flight()
+    assert group.do("k", lambda: "direct") == "direct"
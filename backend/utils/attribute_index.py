@@ -0,0 +1,244 @@
+"""
+In-memory attribute index for "category in S, age fits, price <= budget" filters.
+
+Each row gets a slot number. Every category and every age year (0..max_age)
+has a bitmap of the slots it covers, and priced rows are kept in a sorted
+(price, slot) array. A query ANDs a handful of bitmaps (64 rows per machine
+word) and applies the price bound from whichever side of the sorted array is
+shorter, so it never visits individual rows outside the answer. Bitmaps are
+plain Python ints (built in bulk through NumPy), so there is no extra
+dependency; rows can be upserted and removed one at a time.
+"""
+from bisect import bisect_left, bisect_right, insort
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Sequence, Set, Tuple
+import math
+import threading
+
+import numpy as np
+
+Entry = Tuple[Hashable, Optional[str], Optional[float], Optional[float], Optional[float], Any]
+
+
+def _bitmap(slots: Iterable[int]) -> int:
+    slots = np.fromiter(slots, dtype=np.int64)
+    if not len(slots):
+        return 0
+    packed = np.zeros(int(slots.max()) // 8 + 1, dtype=np.uint8)
+    np.bitwise_or.at(packed, slots >> 3, (1 << (slots & 7)).astype(np.uint8))
+    return int.from_bytes(packed.tobytes(), "little")
+
+
+def _slots(bitmap: int) -> np.ndarray:
+    if not bitmap:
+        return np.empty(0, dtype=np.int64)
+    packed = np.frombuffer(bitmap.to_bytes((bitmap.bit_length() + 7) // 8, "little"), dtype=np.uint8)
+    return np.flatnonzero(np.unpackbits(packed, bitorder="little"))
+
+
+class AttributeIndex:
+    def __init__(self, max_age: int = 21):
+        self.max_age = max_age
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self) -> None:
+        self._slot_of: Dict[Hashable, int] = {}
+        self._keys: List[Optional[Hashable]] = []
+        self._values: List[Any] = []
+        self._rows: List[Optional[Tuple[Optional[str], int, int, Optional[float]]]] = []
+        self._free: List[int] = []
+        self._live = 0
+        self._unpriced = 0
+        self._categories: Dict[Optional[str], int] = {}
+        self._ages = [0] * (self.max_age + 1)
+        self._by_price: List[Tuple[float, int]] = []
+        # Price masks by cut-off position in _by_price; valid until a price changes
+        self._price_masks: Dict[int, int] = {}
+
+    def _age_years(self, age_min: Optional[float], age_max: Optional[float]) -> Tuple[int, int]:
+        # Whole years the range touches (a superset for fractional ages); unknown bounds are 0 / max_age
+        lo = 0 if age_min is None else math.floor(age_min)
+        hi = self.max_age if age_max is None else math.floor(age_max)
+        return max(0, lo), min(self.max_age, hi)
+
+    @staticmethod
+    def _price(price: Optional[float]) -> Optional[float]:
+        return float(price) if isinstance(price, (int, float)) and not math.isnan(price) else None
+
+    # ---------- UPDATES ----------
+
+    def rebuild(self, entries: Iterable[Entry]) -> None:
+        """Replace the contents with (key, category, age_min, age_max, price, value) rows."""
+        by_category: Dict[Optional[str], List[int]] = {}
+        by_age: List[List[int]] = [[] for _ in range(self.max_age + 1)]
+        unpriced: List[int] = []
+        with self._lock:
+            self._reset()
+            for key, category, age_min, age_max, price, value in entries:
+                if key in self._slot_of:
+                    continue
+                slot = len(self._keys)
+                lo, hi = self._age_years(age_min, age_max)
+                price = self._price(price)
+                self._slot_of[key] = slot
+                self._keys.append(key)
+                self._values.append(value)
+                self._rows.append((category, lo, hi, price))
+                by_category.setdefault(category, []).append(slot)
+                for year in range(lo, hi + 1):
+                    by_age[year].append(slot)
+                if price is None:
+                    unpriced.append(slot)
+                else:
+                    self._by_price.append((price, slot))
+            self._live = _bitmap(range(len(self._keys)))
+            self._unpriced = _bitmap(unpriced)
+            self._categories = {category: _bitmap(slots) for category, slots in by_category.items()}
+            self._ages = [_bitmap(slots) for slots in by_age]
+            self._by_price.sort()
+
+    def upsert(
+        self,
+        key: Hashable,
+        category: Optional[str],
+        age_min: Optional[float],
+        age_max: Optional[float],
+        price: Optional[float],
+        value: Any = None,
+    ) -> None:
+        with self._lock:
+            self.remove(key)
+            slot = self._free.pop() if self._free else len(self._keys)
+            if slot == len(self._keys):
+                self._keys.append(None)
+                self._values.append(None)
+                self._rows.append(None)
+            lo, hi = self._age_years(age_min, age_max)
+            price = self._price(price)
+            bit = 1 << slot
+            self._slot_of[key] = slot
+            self._keys[slot] = key
+            self._values[slot] = value
+            self._rows[slot] = (category, lo, hi, price)
+            self._live |= bit
+            self._categories[category] = self._categories.get(category, 0) | bit
+            for year in range(lo, hi + 1):
+                self._ages[year] |= bit
+            if price is None:
+                self._unpriced |= bit
+            else:
+                insort(self._by_price, (price, slot))
+            self._price_masks.clear()
+
+    def remove(self, key: Hashable) -> None:
+        with self._lock:
+            slot = self._slot_of.pop(key, None)
+            if slot is None:
+                return
+            category, lo, hi, price = self._rows[slot]
+            mask = ~(1 << slot)
+            self._live &= mask
+            self._categories[category] &= mask
+            if not self._categories[category]:
+                del self._categories[category]
+            for year in range(lo, hi + 1):
+                self._ages[year] &= mask
+            if price is None:
+                self._unpriced &= mask
+            else:
+                del self._by_price[bisect_left(self._by_price, (price, slot))]
+            self._price_masks.clear()
+            self._keys[slot] = self._values[slot] = self._rows[slot] = None
+            self._free.append(slot)
+
+    # ---------- QUERIES ----------
+
+    def __len__(self) -> int:
+        return len(self._slot_of)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        slot = self._slot_of.get(key)
+        return default if slot is None else self._values[slot]
+
+    def categories(self) -> List[Optional[str]]:
+        with self._lock:
+            return list(self._categories)
+
+    def select(
+        self, age: Optional[float] = None, categories: Optional[Sequence[Optional[str]]] = None, max_price: Optional[float] = None
+    ) -> int:
+        """
+        Bitmap of rows matching every given filter. Unknown prices pass a price bound;
+        the age filter works in whole years, so callers needing exact bounds re-check the result.
+        """
+        with self._lock:
+            bitmap = self._live
+            if categories is not None:
+                wanted = 0
+                for category in categories:
+                    wanted |= self._categories.get(category, 0)
+                bitmap &= wanted
+            if age is not None:
+                if age < 0:
+                    return 0
+                # Ranges are stored clipped to max_age, so older ages share its bitmap
+                bitmap &= self._ages[min(math.floor(age), self.max_age)]
+            if max_price is not None and bitmap:
+                n = bisect_right(self._by_price, (max_price, math.inf))
+                if n < len(self._by_price):
+                    bitmap &= self._price_mask(n)
+            return bitmap
+
+    def _price_mask(self, n: int) -> int:
+        """Rows priced within the first n entries of the sorted price array, plus unpriced rows."""
+        mask = self._price_masks.get(n)
+        if mask is None:
+            # Build from whichever side of the cut-off is smaller
+            if n <= len(self._by_price) - n:
+                mask = _bitmap(slot for _, slot in self._by_price[:n]) | self._unpriced
+            else:
+                mask = ~_bitmap(slot for _, slot in self._by_price[n:])
+            if len(self._price_masks) >= 64:
+                self._price_masks.clear()
+            self._price_masks[n] = mask
+        return mask
+
+    def select_values(
+        self, age: Optional[float] = None, categories: Optional[Sequence[Optional[str]]] = None, max_price: Optional[float] = None
+    ) -> List[Any]:
+        """Values of the rows matching `select(...)`, in slot order, read under the same lock."""
+        with self._lock:
+            return self.values(self.select(age, categories, max_price))
+
+    def select_keys(
+        self, age: Optional[float] = None, categories: Optional[Sequence[Optional[str]]] = None, max_price: Optional[float] = None
+    ) -> Set[Hashable]:
+        """Keys of the rows matching `select(...)`, read under the same lock."""
+        with self._lock:
+            return set(self.keys(self.select(age, categories, max_price)))
+
+    # A bitmap names slots, which are reused after removals: only resolve one
+    # while no update can run in between (or use select_values / select_keys).
+
+    def keys(self, bitmap: int) -> List[Hashable]:
+        """Keys of a selected bitmap, in slot order."""
+        with self._lock:
+            return [self._keys[slot] for slot in _slots(bitmap)]
+
+    def values(self, bitmap: int) -> List[Any]:
+        with self._lock:
+            return [self._values[slot] for slot in _slots(bitmap)]
+
+    def contains(self, bitmap: int, key: Hashable) -> bool:
+        with self._lock:
+            slot = self._slot_of.get(key)
+            return slot is not None and bool(bitmap >> slot & 1)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "rows": len(self._slot_of),
+                "categories": len(self._categories),
+                "priced": len(self._by_price),
+                "free_slots": len(self._free),
+            }
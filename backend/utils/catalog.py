@@ -0,0 +1,159 @@
+"""
+Columnar view of a program/activity catalog for vectorized scoring.
+
+`CatalogColumns` packs the fields scoring needs (age range, monthly price,
+category, coordinates, rating) into NumPy arrays on first use, so scoring a family
+against the whole catalog is a handful of array operations instead of a
+Python loop over item dicts. Items themselves are kept by reference and only
+the ones a caller actually returns are copied.
+
+`top_k` breaks score ties by catalog order, so results match the stable
+`list.sort(..., reverse=True)` the per-item loops used.
+"""
+from functools import cached_property
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+import math
+
+import numpy as np
+
+UNKNOWN_PRICE = 999999.0
+
+Getter = Callable[[Any, str, Any], Any]
+
+
+def _dict_get(item: Any, field: str, default: Any) -> Any:
+    return item.get(field, default)
+
+
+def _attr_get(item: Any, field: str, default: Any) -> Any:
+    return getattr(item, field, default)
+
+
+def _number(value: Any, default: float) -> float:
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return default
+    return default if math.isnan(number) else number
+
+
+class CatalogColumns:
+    """Catalog items packed into parallel arrays (one row per item)."""
+
+    def __init__(self, items: Sequence[Any], get: Getter = _dict_get):
+        self.items = items
+        self._get = get
+
+    def _column(self, field: str, default: float) -> np.ndarray:
+        get = self._get
+        values = [get(it, field, None) for it in self.items]
+        try:
+            # Bulk conversion; None becomes NaN
+            column = np.array(values, dtype=np.float64)
+        except (TypeError, ValueError):
+            column = np.fromiter((_number(v, np.nan) for v in values), np.float64, len(values))
+        if column.ndim != 1:
+            column = np.fromiter((_number(v, np.nan) for v in values), np.float64, len(values))
+        if not np.isnan(default):
+            column[np.isnan(column)] = default
+        return column
+
+    # Columns are packed on first use, so scoring only pays for the fields it reads
+
+    @cached_property
+    def age_min(self) -> np.ndarray:
+        return self._column("age_min", 0.0)
+
+    @cached_property
+    def age_max(self) -> np.ndarray:
+        return self._column("age_max", 18.0)
+
+    @cached_property
+    def price(self) -> np.ndarray:
+        # Unknown price: same sentinel the per-item loops used
+        return self._column("price_monthly", UNKNOWN_PRICE)
+
+    @cached_property
+    def latitude(self) -> np.ndarray:
+        return self._column("latitude", np.nan)
+
+    @cached_property
+    def longitude(self) -> np.ndarray:
+        return self._column("longitude", np.nan)
+
+    @cached_property
+    def rating(self) -> np.ndarray:
+        return self._column("rating", np.nan)
+
+    @cached_property
+    def _category_codes(self) -> Tuple[np.ndarray, List[str]]:
+        # Raw category strings -> small integer codes; per-category lookups cost O(#categories)
+        get = self._get
+        codes: Dict[str, int] = {}
+        column = np.array([codes.setdefault(get(it, "category", None) or "", len(codes)) for it in self.items], dtype=np.int32)
+        return column, list(codes)
+
+    @property
+    def category(self) -> np.ndarray:
+        return self._category_codes[0]
+
+    @property
+    def categories(self) -> List[str]:
+        return self._category_codes[1]
+
+    @classmethod
+    def from_objects(cls, items: Sequence[Any]) -> "CatalogColumns":
+        """Columns over model objects (attributes instead of dict keys)."""
+        return cls(items, get=_attr_get)
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    # ---------- PRIMITIVES ----------
+
+    def age_fits(self, child_age: float) -> np.ndarray:
+        return (self.age_min <= child_age) & (child_age <= self.age_max)
+
+    def category_values(self, value_for: Callable[[str], float]) -> np.ndarray:
+        """Per-item value of a function of the item's raw category string."""
+        table = np.array([value_for(c) for c in self.categories] or [0.0], dtype=np.float64)
+        return table[self.category]
+
+    # ---------- SCORING ----------
+
+    def local_scores(self, child_age: float, budget_month: float, priorities: Sequence[str]) -> np.ndarray:
+        """
+        Heuristic match score in [0, 1] (same formula and float operation order as the
+        old per-item loop): base 0.5, +0.2/-0.1 for age fit, +0.15/-0.1 for budget fit,
+        plus a priority weight of 1 - 0.15 * rank for the item's category.
+        """
+        pr_weights = {p: max(0.0, 1.0 - (i * 0.15)) for i, p in enumerate(priorities)}
+        score = 0.5 + np.where(self.age_fits(child_age), 0.2, -0.1)
+        score = score + np.where(self.price <= budget_month, 0.15, -0.1)
+        score = score + self.category_values(lambda c: pr_weights.get(c.lower().capitalize(), 0.0))
+        return np.clip(score, 0.0, 1.0)
+
+    @staticmethod
+    def top_k(scores: np.ndarray, k: Optional[int] = None, mask: Optional[np.ndarray] = None) -> np.ndarray:
+        """Indices of the k best scores (all if k is None), best first, ties in catalog order."""
+        idx = np.arange(len(scores)) if mask is None else np.flatnonzero(mask)
+        if k is not None and k < len(idx):
+            if k <= 0:
+                return idx[:0]
+            sub = scores[idx]
+            # k-th best value, then everything strictly better plus the first ties up to k
+            kth = -np.partition(-sub, k - 1)[k - 1]
+            better = idx[sub > kth]
+            ties = idx[sub == kth][: k - len(better)]
+            idx = np.concatenate([better, ties])
+        # lexsort: last key is primary -> descending score, then ascending index
+        return idx[np.lexsort((idx, -scores[idx]))]
+
+    def ranked(self, scores: np.ndarray, k: Optional[int] = None, mask: Optional[np.ndarray] = None) -> List[Dict[str, Any]]:
+        """Copies of the top items (dict catalogs) with `match_score` set."""
+        out = []
+        for i in self.top_k(scores, k, mask):
+            item = dict(self.items[i])
+            item["match_score"] = float(scores[i])
+            out.append(item)
+        return out
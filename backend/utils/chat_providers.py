@@ -0,0 +1,345 @@
+"""
+Provider failover and hedging for chat completions.
+
+`ProviderPool` takes an ordered list of chat backends (primary first). Each
+call goes to the primary; if it has not answered by its own recent p95
+latency (time to first token for streams), the same request is also sent to
+the next provider and whichever answers first wins. A provider that errors is
+failed over immediately. While the primary misses its SLO or error budget
+it is demoted behind the backup, with an occasional probe call so recovery is
+noticed (same policy as `utils.model_router`).
+
+- `CHAT_HEDGE` = 1 | 0 (default 1) enables hedged requests
+- `CHAT_HEDGE_MIN_MS` / `CHAT_HEDGE_MAX_MS` clamp the hedge delay (default 1000 / 8000)
+- `CHAT_SLO_MS` / `CHAT_TTFT_SLO_MS` p95 health thresholds (default 8000 / 3000)
+- `CHAT_PROVIDER_WORKERS` = threads per pool for calls and for stream readers (default 16)
+"""
+from abc import ABC, abstractmethod
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import logging
+import os
+import queue
+import threading
+import time
+
+from utils.metrics import LatencyWindow
+
+logger = logging.getLogger(__name__)
+
+
+class ChatProvider(ABC):
+    """One chat backend: OpenAI-style messages in, text (or text deltas) out."""
+
+    name = "provider"
+    model = ""
+
+    @abstractmethod
+    def complete(self, call_site: str, messages: List[Dict[str, str]], max_tokens: int, temperature: float) -> str:
+        ...
+
+    @abstractmethod
+    def stream(self, call_site: str, messages: List[Dict[str, str]], max_tokens: int, temperature: float) -> Iterator[str]:
+        ...
+
+
+class OpenAIChatProvider(ChatProvider):
+    """OpenAI-compatible backend (Cerebras) through a `MeteredOpenAI` client."""
+
+    def __init__(self, llm, model: str):
+        self.llm = llm
+        self.name = llm.provider
+        self.model = model
+
+    def complete(self, call_site, messages, max_tokens, temperature):
+        response = self.llm.create(
+            call_site, model=self.model, messages=messages, max_completion_tokens=max_tokens, temperature=temperature
+        )
+        return response.choices[0].message.content
+
+    def stream(self, call_site, messages, max_tokens, temperature):
+        return self.llm.stream(
+            call_site, model=self.model, messages=messages, max_completion_tokens=max_tokens, temperature=temperature
+        )
+
+
+class AnthropicChatProvider(ChatProvider):
+    """Anthropic backend through a `MeteredAnthropic` client."""
+
+    def __init__(self, llm, model: str):
+        self.llm = llm
+        self.name = llm.provider
+        self.model = model
+
+    @staticmethod
+    def _convert(messages: List[Dict[str, str]]) -> Tuple[str, List[Dict[str, str]]]:
+        """System text plus user/assistant turns that start with a user turn and alternate."""
+        system = "\n\n".join(m["content"] for m in messages if m["role"] == "system")
+        turns: List[Dict[str, str]] = []
+        for m in messages:
+            if m["role"] == "system" or (not turns and m["role"] != "user"):
+                continue
+            if turns and turns[-1]["role"] == m["role"]:
+                turns[-1] = {"role": m["role"], "content": f"{turns[-1]['content']}\n\n{m['content']}"}
+            else:
+                turns.append({"role": m["role"], "content": m["content"]})
+        return system, turns
+
+    def _kwargs(self, messages, max_tokens, temperature) -> Dict[str, Any]:
+        system, turns = self._convert(messages)
+        kwargs = {"model": self.model, "messages": turns, "max_tokens": max_tokens, "temperature": temperature}
+        if system:
+            kwargs["system"] = system
+        return kwargs
+
+    def complete(self, call_site, messages, max_tokens, temperature):
+        response = self.llm.create(call_site, **self._kwargs(messages, max_tokens, temperature))
+        return "".join(block.text for block in response.content if getattr(block, "type", "") == "text")
+
+    def stream(self, call_site, messages, max_tokens, temperature):
+        return self.llm.stream(call_site, **self._kwargs(messages, max_tokens, temperature))
+
+
+class ProviderPool:
+    def __init__(
+        self,
+        providers: List[ChatProvider],
+        hedge: Optional[bool] = None,
+        hedge_min_s: Optional[float] = None,
+        hedge_max_s: Optional[float] = None,
+        slo_ms: Optional[float] = None,
+        ttft_slo_ms: Optional[float] = None,
+        error_budget: float = 0.3,
+        min_samples: int = 5,
+        probe_every: int = 10,
+    ):
+        if not providers:
+            raise ValueError("ProviderPool needs at least one provider")
+        self.providers = list(providers)
+        self.hedge = hedge if hedge is not None else os.getenv("CHAT_HEDGE", "1") == "1"
+        self.hedge_min_s = hedge_min_s if hedge_min_s is not None else float(os.getenv("CHAT_HEDGE_MIN_MS", "1000")) / 1000
+        self.hedge_max_s = hedge_max_s if hedge_max_s is not None else float(os.getenv("CHAT_HEDGE_MAX_MS", "8000")) / 1000
+        self.slo_ms = {
+            "complete": slo_ms if slo_ms is not None else float(os.getenv("CHAT_SLO_MS", "8000")),
+            "stream": ttft_slo_ms if ttft_slo_ms is not None else float(os.getenv("CHAT_TTFT_SLO_MS", "3000")),
+        }
+        self.error_budget = error_budget
+        self.min_samples = min_samples
+        self.probe_every = probe_every
+        # complete: total latency; stream: time to first token
+        self._windows = {(p.name, kind): LatencyWindow() for p in self.providers for kind in ("complete", "stream")}
+        workers = int(os.getenv("CHAT_PROVIDER_WORKERS", "16"))
+        # Bounded pools: hedged losers that already started run to completion, but never
+        # more than this many at once (queued losers are cancelled once a winner is in)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="chat-provider")
+        self._stream_executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="chat-stream")
+        self._lock = threading.Lock()
+        self._demoted_calls = 0
+        self._stats: Dict[str, Any] = {"calls": 0, "hedges": 0, "failovers": 0, "demoted": 0, "served_by": {}}
+
+    # ---------- HEALTH ----------
+
+    def _count(self, stat: str, provider: Optional[ChatProvider] = None) -> None:
+        with self._lock:
+            if provider is None:
+                self._stats[stat] += 1
+            else:
+                self._stats[stat][provider.name] = self._stats[stat].get(provider.name, 0) + 1
+
+    def _problem(self, provider: ChatProvider) -> Optional[str]:
+        for kind, slo_ms in self.slo_ms.items():
+            window = self._windows[(provider.name, kind)]
+            if window.count() < self.min_samples:
+                continue
+            if window.error_rate() > self.error_budget:
+                return "errors"
+            p95 = window.percentile(95)
+            if p95 is not None and p95 * 1000 > slo_ms:
+                return "latency"
+        return None
+
+    def _order(self) -> List[ChatProvider]:
+        primary, backups = self.providers[0], self.providers[1:]
+        problem = self._problem(primary) if backups else None
+        with self._lock:
+            if problem is None:
+                self._demoted_calls = 0
+                return list(self.providers)
+            self._demoted_calls += 1
+            if self._demoted_calls % self.probe_every == 0:
+                return list(self.providers)
+            self._stats["demoted"] += 1
+        logger.info(f"Chat provider {primary.name} demoted ({problem})")
+        return backups + [primary]
+
+    def _hedge_delay(self, provider: ChatProvider, kind: str) -> float:
+        window = self._windows[(provider.name, kind)]
+        p95 = window.percentile(95) if window.count() >= self.min_samples else None
+        if p95 is None:
+            return self.hedge_max_s
+        return min(self.hedge_max_s, max(self.hedge_min_s, p95))
+
+    def _site(self, call_site: str, provider: ChatProvider) -> str:
+        # The primary keeps the plain call site so existing llm metrics stay comparable
+        return call_site if provider is self.providers[0] else f"{call_site}.{provider.name}"
+
+    # ---------- CALLS ----------
+
+    def _timed_complete(self, provider: ChatProvider, call_site: str, messages, max_tokens, temperature) -> str:
+        start = time.monotonic()
+        ok = False
+        try:
+            text = provider.complete(self._site(call_site, provider), messages, max_tokens, temperature)
+            ok = True
+            return text
+        finally:
+            self._windows[(provider.name, "complete")].record(time.monotonic() - start, ok)
+
+    def complete(self, call_site: str, messages: List[Dict[str, str]], max_tokens: int = 800, temperature: float = 0.7) -> str:
+        """Text of the first successful reply; raises the last error if every provider fails."""
+        self._count("calls")
+        order = self._order()
+        pending = {}
+        errors: List[Exception] = []
+
+        def launch() -> ChatProvider:
+            provider = order[len(pending) + len(errors)]
+            pending[self._executor.submit(self._timed_complete, provider, call_site, messages, max_tokens, temperature)] = provider
+            return provider
+
+        current = launch()
+        while pending:
+            can_hedge = self.hedge and len(pending) + len(errors) < len(order)
+            done, _ = wait(
+                pending, timeout=self._hedge_delay(current, "complete") if can_hedge else None, return_when=FIRST_COMPLETED
+            )
+            if not done:
+                self._count("hedges")
+                current = launch()
+                continue
+            for future in done:
+                provider = pending.pop(future)
+                try:
+                    text = future.result()
+                except Exception as e:
+                    logger.warning(f"Chat provider {provider.name} failed: {e}")
+                    errors.append(e)
+                    continue
+                self._count("served_by", provider)
+                for loser in pending:
+                    loser.cancel()
+                return text
+            if not pending and len(errors) < len(order):
+                self._count("failovers")
+                current = launch()
+        raise errors[-1]
+
+    def stream(self, call_site: str, messages: List[Dict[str, str]], max_tokens: int = 800, temperature: float = 0.7) -> Iterator[str]:
+        """Deltas from whichever provider produces a first token first; later errors from it propagate."""
+        self._count("calls")
+        order = self._order()
+        events: "queue.Queue[Tuple[ChatProvider, str, Any]]" = queue.Queue()
+        cancelled = set()
+        launched: List[ChatProvider] = []
+        pumps = []
+
+        def pump(provider: ChatProvider) -> None:
+            # Every pump ends with exactly one "end" event, or the consumer would wait forever
+            deltas = None
+            try:
+                if provider.name in cancelled:
+                    # Queued behind a full pool until the race was already decided
+                    return
+                start = time.monotonic()
+                ttft = None
+                try:
+                    deltas = provider.stream(self._site(call_site, provider), messages, max_tokens, temperature)
+                    for delta in deltas:
+                        if ttft is None:
+                            ttft = time.monotonic() - start
+                            self._windows[(provider.name, "stream")].record(ttft, True)
+                        if provider.name in cancelled:
+                            break
+                        events.put((provider, "delta", delta))
+                except Exception as e:
+                    if ttft is None:
+                        self._windows[(provider.name, "stream")].record(time.monotonic() - start, False)
+                    events.put((provider, "error", e))
+            finally:
+                try:
+                    # Closes the SDK stream (and its connection) when this provider lost the race
+                    getattr(deltas, "close", lambda: None)()
+                except Exception as e:
+                    logger.warning(f"Chat provider {provider.name} stream close failed: {e}")
+                events.put((provider, "end", None))
+
+        def launch() -> None:
+            provider = order[len(launched)]
+            launched.append(provider)
+            pumps.append(self._stream_executor.submit(pump, provider))
+
+        winner = None
+        ended = 0
+        errors: List[Exception] = []
+        launch()
+        try:
+            while True:
+                can_hedge = winner is None and self.hedge and len(launched) < len(order)
+                try:
+                    provider, kind, value = events.get(
+                        timeout=self._hedge_delay(launched[-1], "stream") if can_hedge else None
+                    )
+                except queue.Empty:
+                    self._count("hedges")
+                    launch()
+                    continue
+
+                if winner is None:
+                    if kind == "delta":
+                        winner = provider
+                        cancelled.update(p.name for p in launched if p is not provider)
+                        self._count("served_by", provider)
+                        yield value
+                    elif kind == "error":
+                        logger.warning(f"Chat provider {provider.name} failed: {value}")
+                        errors.append(value)
+                    elif kind == "end":
+                        ended += 1
+                        if ended == len(launched):
+                            if len(launched) < len(order):
+                                self._count("failovers")
+                                launch()
+                            elif errors:
+                                raise errors[-1]
+                            else:
+                                return
+                    continue
+
+                if provider is not winner:
+                    continue
+                if kind == "delta":
+                    yield value
+                elif kind == "error":
+                    raise value
+                else:
+                    return
+        finally:
+            # Consumer gone or a winner finished: stop every other stream at its next chunk
+            cancelled.update(p.name for p in launched)
+            for future in pumps:
+                future.cancel()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = {k: (dict(v) if isinstance(v, dict) else v) for k, v in self._stats.items()}
+        stats["order"] = [p.name for p in self.providers]
+        stats["providers"] = {
+            p.name: {
+                "model": p.model,
+                "problem": self._problem(p),
+                "latency": self._windows[(p.name, "complete")].snapshot(),
+                "ttft": self._windows[(p.name, "stream")].snapshot(),
+            }
+            for p in self.providers
+        }
+        return stats
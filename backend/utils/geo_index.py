@@ -0,0 +1,185 @@
+"""
+In-memory geohash index for radius and bounding-box queries.
+
+Points are bucketed by geohash cell (precision 5, roughly 5 x 5 km). A query
+visits only the cells overlapping its bounding box and then filters the
+candidates by exact great-circle distance, so its cost tracks the number of
+nearby points rather than the size of the catalog. Points can be inserted,
+moved and removed one at a time, which lets callers keep the index in sync
+with a changing collection.
+"""
+from typing import Any, Dict, Hashable, Iterator, List, Optional, Set, Tuple
+import math
+import threading
+
+import numpy as np
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+EARTH_RADIUS_M = 6371000.0
+
+# Above this many cells a query scans every point instead
+_MAX_QUERY_CELLS = 4096
+
+
+def geohash(lat: float, lng: float, precision: int = 5) -> str:
+    lat_lo, lat_hi, lng_lo, lng_hi = -90.0, 90.0, -180.0, 180.0
+    chars, bits, ch, even = [], 0, 0, True
+    while len(chars) < precision:
+        if even:
+            mid = (lng_lo + lng_hi) / 2
+            ch = (ch << 1) | (lng >= mid)
+            lng_lo, lng_hi = (mid, lng_hi) if lng >= mid else (lng_lo, mid)
+        else:
+            mid = (lat_lo + lat_hi) / 2
+            ch = (ch << 1) | (lat >= mid)
+            lat_lo, lat_hi = (mid, lat_hi) if lat >= mid else (lat_lo, mid)
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(_BASE32[ch])
+            bits, ch = 0, 0
+    return "".join(chars)
+
+
+def cell_size(precision: int) -> Tuple[float, float]:
+    """(lat degrees, lng degrees) covered by one cell."""
+    lng_bits = (5 * precision + 1) // 2
+    lat_bits = 5 * precision // 2
+    return 180.0 / (1 << lat_bits), 360.0 / (1 << lng_bits)
+
+
+def cell_center(lat: float, lng: float, precision: int) -> Tuple[float, float]:
+    """Centre of the geohash cell containing the point."""
+    cell_lat, cell_lng = cell_size(precision)
+    row = min(math.floor((lat + 90.0) / cell_lat), (1 << (5 * precision // 2)) - 1)
+    col = min(math.floor((lng + 180.0) / cell_lng), (1 << ((5 * precision + 1) // 2)) - 1)
+    return -90.0 + (row + 0.5) * cell_lat, -180.0 + (col + 0.5) * cell_lng
+
+
+def haversine_m(lat1, lng1, lat2, lng2):
+    """Great-circle distance in meters; works elementwise on NumPy arrays."""
+    lat1, lng1, lat2, lng2 = np.radians(lat1), np.radians(lng1), np.radians(lat2), np.radians(lng2)
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def _radius_dlng(lat: float, radius_m: float) -> float:
+    coslat = max(math.cos(math.radians(lat)), 1e-6)
+    return min(180.0, math.degrees(radius_m / (EARTH_RADIUS_M * coslat)))
+
+
+def radius_bbox(lat: float, lng: float, radius_m: float) -> Tuple[float, float, float, float]:
+    """(min_lat, min_lng, max_lat, max_lng) enclosing a circle, clipped at the antimeridian."""
+    dlat = math.degrees(radius_m / EARTH_RADIUS_M)
+    dlng = _radius_dlng(lat, radius_m)
+    return max(-90.0, lat - dlat), max(-180.0, lng - dlng), min(90.0, lat + dlat), min(180.0, lng + dlng)
+
+
+def radius_bboxes(lat: float, lng: float, radius_m: float) -> List[Tuple[float, float, float, float]]:
+    """`radius_bbox` plus, for a circle crossing the antimeridian, the box covering its wrapped part."""
+    box = radius_bbox(lat, lng, radius_m)
+    boxes = [box]
+    dlng = _radius_dlng(lat, radius_m)
+    if lng + dlng > 180.0:
+        boxes.append((box[0], -180.0, box[2], lng + dlng - 360.0))
+    if lng - dlng < -180.0:
+        boxes.append((box[0], lng - dlng + 360.0, box[2], 180.0))
+    return boxes
+
+
+class GeoIndex:
+    """Keyed points (with an optional value each) bucketed by geohash cell."""
+
+    def __init__(self, precision: int = 5):
+        self.precision = precision
+        self._cell_lat, self._cell_lng = cell_size(precision)
+        self._cells: Dict[str, Set[Hashable]] = {}
+        self._points: Dict[Hashable, Tuple[float, float, str]] = {}
+        self._values: Dict[Hashable, Any] = {}
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        return self._values.get(key, default)
+
+    def items(self) -> Iterator[Tuple[Hashable, Any]]:
+        with self._lock:
+            return iter(list(self._values.items()))
+
+    def upsert(self, key: Hashable, lat: Optional[float], lng: Optional[float], value: Any = None) -> None:
+        """Insert or move `key`. Without coordinates the value is kept but never matches a query."""
+        with self._lock:
+            self._unlink(key)
+            self._values[key] = value
+            if lat is None or lng is None:
+                return
+            cell = geohash(lat, lng, self.precision)
+            self._points[key] = (lat, lng, cell)
+            self._cells.setdefault(cell, set()).add(key)
+
+    def remove(self, key: Hashable) -> None:
+        with self._lock:
+            self._unlink(key)
+            self._values.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cells.clear()
+            self._points.clear()
+            self._values.clear()
+
+    def _unlink(self, key: Hashable) -> None:
+        point = self._points.pop(key, None)
+        if point is not None:
+            bucket = self._cells.get(point[2])
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self._cells[point[2]]
+
+    # ---------- QUERIES ----------
+
+    def _candidates(self, min_lat: float, min_lng: float, max_lat: float, max_lng: float) -> List[Hashable]:
+        rows = math.floor(max_lat / self._cell_lat) - math.floor(min_lat / self._cell_lat) + 1
+        cols = math.floor(max_lng / self._cell_lng) - math.floor(min_lng / self._cell_lng) + 1
+        if rows * cols > min(_MAX_QUERY_CELLS, len(self._cells) or 1):
+            return list(self._points)
+        keys: List[Hashable] = []
+        seen: Set[str] = set()
+        for r in range(rows):
+            # Sample the middle of each cell row/column so every overlapping cell is hit once
+            lat = min(max_lat, (math.floor(min_lat / self._cell_lat) + r + 0.5) * self._cell_lat)
+            for c in range(cols):
+                lng = min(max_lng, (math.floor(min_lng / self._cell_lng) + c + 0.5) * self._cell_lng)
+                cell = geohash(max(-90.0, lat), max(-180.0, lng), self.precision)
+                if cell not in seen:
+                    seen.add(cell)
+                    keys.extend(self._cells.get(cell, ()))
+        return keys
+
+    def bbox(self, min_lat: float, min_lng: float, max_lat: float, max_lng: float) -> List[Hashable]:
+        """Keys inside the box (edges inclusive)."""
+        with self._lock:
+            return [
+                key for key in self._candidates(min_lat, min_lng, max_lat, max_lng)
+                if min_lat <= self._points[key][0] <= max_lat and min_lng <= self._points[key][1] <= max_lng
+            ]
+
+    def radius(self, lat: float, lng: float, radius_m: float) -> List[Tuple[Hashable, float]]:
+        """(key, distance in meters) within `radius_m`, nearest first."""
+        with self._lock:
+            # dict.fromkeys: wrapped boxes may overlap the main one near the poles
+            keys = list(dict.fromkeys(k for box in radius_bboxes(lat, lng, radius_m) for k in self._candidates(*box)))
+            if not keys:
+                return []
+            points = np.array([self._points[k][:2] for k in keys], dtype=np.float64)
+        distances = haversine_m(points[:, 0], points[:, 1], lat, lng)
+        inside = np.flatnonzero(distances <= radius_m)
+        order = inside[np.argsort(distances[inside], kind="stable")]
+        return [(keys[i], float(distances[i])) for i in order]
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"items": len(self._values), "located": len(self._points), "cells": len(self._cells)}
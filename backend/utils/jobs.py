@@ -0,0 +1,230 @@
+"""
+Background job queue for long-running LLM work (e.g. deep research).
+
+Jobs are registered by type and executed by a small pool of daemon worker
+threads started in every process. When Redis is connected (`app.redis_client`)
+the queue and job records live in Redis, so any worker process can pick up a
+job and any request worker can report its status; otherwise both stay in
+process memory.
+"""
+from typing import Any, Callable, Dict, Optional, Tuple
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+JobFn = Callable[[Dict[str, Any], Callable[[float, str], None]], Any]
+
+
+def _redis():
+    from app import redis_client
+    return redis_client
+
+
+class JobQueue:
+    def __init__(self, name: str = "default", workers: Optional[int] = None, ttl: int = 3600):
+        self.name = name
+        self.workers = workers or int(os.getenv("JOB_WORKERS", "2"))
+        self.ttl = ttl
+        self._handlers: Dict[str, JobFn] = {}
+        self._local_queue: "queue.Queue[str]" = queue.Queue()
+        self._local_jobs: Dict[str, Dict[str, Any]] = {}
+        self._local_dedupe: Dict[str, Tuple[str, float]] = {}
+        self._lock = threading.Lock()
+        self._started = False
+
+    # ---------- PUBLIC ----------
+
+    def register(self, job_type: str, fn: JobFn) -> None:
+        """fn(payload, progress) -> JSON-serializable result; progress(fraction, stage)."""
+        self._handlers[job_type] = fn
+
+    def submit(self, job_type: str, payload: Dict[str, Any], dedupe_key: Optional[str] = None) -> str:
+        """
+        Queue a job and return its id. With a dedupe_key, a job already queued or
+        running under the same key is reused (its id is returned) instead.
+        """
+        if job_type not in self._handlers:
+            raise KeyError(f"Unknown job type '{job_type}'")
+        self.start()
+        job_id = uuid.uuid4().hex
+        if dedupe_key is not None:
+            existing = self._claim(dedupe_key, job_id)
+            if existing is not None:
+                return existing
+        now = time.time()
+        self._save({
+            "id": job_id,
+            "type": job_type,
+            "status": "queued",
+            "progress": 0.0,
+            "stage": "queued",
+            "payload": payload,
+            "result": None,
+            "error": None,
+            "dedupe_key": dedupe_key,
+            "created_at": now,
+            "updated_at": now,
+        })
+        redis = _redis()
+        if redis is not None:
+            try:
+                redis.rpush(self._queue_key(), job_id)
+                return job_id
+            except Exception as e:
+                logger.warning(f"Redis enqueue failed, running job {job_id} in process: {e}")
+        self._local_queue.put(job_id)
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        redis = _redis()
+        if redis is not None:
+            try:
+                raw = redis.get(self._job_key(job_id))
+                if raw:
+                    return json.loads(raw)
+            except Exception as e:
+                logger.warning(f"Redis job lookup failed for {job_id}: {e}")
+        with self._lock:
+            self._prune_local()
+            job = self._local_jobs.get(job_id)
+            return dict(job) if job else None
+
+    # ---------- STORAGE ----------
+
+    def _queue_key(self) -> str:
+        return f"jobs:{self.name}:queue"
+
+    def _job_key(self, job_id: str) -> str:
+        return f"jobs:{self.name}:{job_id}"
+
+    def _save(self, job: Dict[str, Any]) -> None:
+        job["updated_at"] = time.time()
+        redis = _redis()
+        if redis is not None:
+            try:
+                redis.setex(self._job_key(job["id"]), self.ttl, json.dumps(job, default=str))
+                return
+            except Exception as e:
+                logger.warning(f"Redis job save failed for {job['id']}: {e}")
+        with self._lock:
+            self._local_jobs[job["id"]] = dict(job)
+
+    def _dedupe_key(self, key: str) -> str:
+        return f"jobs:{self.name}:dedupe:{key}"
+
+    def _claim(self, key: str, job_id: str) -> Optional[str]:
+        """Claim `key` for job_id; returns the id already holding it, or None once claimed."""
+        redis = _redis()
+        if redis is not None:
+            try:
+                for _ in range(3):
+                    if redis.set(self._dedupe_key(key), job_id, nx=True, ex=self.ttl):
+                        return None
+                    holder = redis.get(self._dedupe_key(key))
+                    if holder:
+                        return holder.decode() if isinstance(holder, bytes) else holder
+                return None
+            except Exception as e:
+                logger.warning(f"Redis dedupe claim failed for {key}: {e}")
+        with self._lock:
+            holder = self._local_dedupe.get(key)
+            if holder is not None and holder[1] > time.time() - self.ttl:
+                return holder[0]
+            self._local_dedupe[key] = (job_id, time.time())
+            return None
+
+    def _release(self, key: str, job_id: str) -> None:
+        redis = _redis()
+        if redis is not None:
+            try:
+                holder = redis.get(self._dedupe_key(key))
+                if (holder.decode() if isinstance(holder, bytes) else holder) == job_id:
+                    redis.delete(self._dedupe_key(key))
+            except Exception as e:
+                logger.warning(f"Redis dedupe release failed for {key}: {e}")
+        with self._lock:
+            if self._local_dedupe.get(key, ("",))[0] == job_id:
+                del self._local_dedupe[key]
+
+    def _prune_local(self) -> None:
+        cutoff = time.time() - self.ttl
+        for job_id in [k for k, v in self._local_jobs.items() if v["updated_at"] < cutoff]:
+            del self._local_jobs[job_id]
+
+    # ---------- WORKERS ----------
+
+    def start(self) -> None:
+        """Start this process's worker threads (idempotent)."""
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        for i in range(self.workers):
+            threading.Thread(target=self._worker_loop, name=f"jobs-{self.name}-{i}", daemon=True).start()
+
+    def _next_job_id(self) -> Optional[str]:
+        try:
+            return self._local_queue.get_nowait()
+        except queue.Empty:
+            pass
+        redis = _redis()
+        if redis is not None:
+            try:
+                popped = redis.blpop(self._queue_key(), timeout=1)
+                if popped:
+                    job_id = popped[1]
+                    return job_id.decode() if isinstance(job_id, bytes) else job_id
+                return None
+            except Exception as e:
+                logger.warning(f"Redis dequeue failed: {e}")
+        try:
+            return self._local_queue.get(timeout=1)
+        except queue.Empty:
+            return None
+
+    def _worker_loop(self) -> None:
+        while True:
+            job_id = self._next_job_id()
+            if job_id:
+                self._run(job_id)
+
+    def _run(self, job_id: str) -> None:
+        job = self.get(job_id)
+        if not job:
+            logger.warning(f"Job {job_id} expired before it ran")
+            return
+        handler = self._handlers.get(job["type"])
+        if handler is None:
+            job.update(status="failed", error=f"No handler for job type '{job['type']}'")
+            self._save(job)
+            if job.get("dedupe_key"):
+                self._release(job["dedupe_key"], job_id)
+            return
+
+        def progress(fraction: float, stage: str) -> None:
+            job.update(progress=round(max(0.0, min(1.0, fraction)), 3), stage=stage)
+            self._save(job)
+
+        job.update(status="running", stage="running")
+        self._save(job)
+        start = time.monotonic()
+        try:
+            job["result"] = handler(job["payload"], progress)
+            job.update(status="done", progress=1.0, stage="done")
+        except Exception as e:
+            logger.exception(f"Job {job_id} ({job['type']}) failed")
+            job.update(status="failed", error=str(e))
+        job["duration_s"] = round(time.monotonic() - start, 3)
+        self._save(job)
+        if job.get("dedupe_key"):
+            self._release(job["dedupe_key"], job_id)
+
+
+# Global queue shared by the API process
+job_queue = JobQueue()
@@ -0,0 +1,96 @@
+"""
+Process-wide LLM SDK clients with shared, instrumented HTTP connection pools.
+
+Building an `Anthropic()` / `OpenAI()` client per request also builds a new
+connection pool, so every call pays for a fresh TCP + TLS handshake. These
+singletons are created once per worker and are safe to share across threads.
+Each pool counts requests against new connections / TLS handshakes so
+keep-alive reuse shows up under `http_pools` in `/api/metrics`.
+"""
+from typing import Any, Dict
+import os
+import threading
+
+import anthropic
+import httpx
+import openai
+
+from config import Config
+from utils.metrics import register_metrics
+
+POOL_LIMITS = httpx.Limits(
+    max_connections=int(os.getenv("LLM_MAX_CONNECTIONS", "32")),
+    max_keepalive_connections=int(os.getenv("LLM_MAX_KEEPALIVE", "16")),
+    keepalive_expiry=float(os.getenv("LLM_KEEPALIVE_EXPIRY_S", "60")),
+)
+
+
+class PoolStats:
+    """Requests vs. new TCP connections / TLS handshakes seen by one HTTP pool."""
+
+    def __init__(self):
+        self.requests = 0
+        self.new_connections = 0
+        self.tls_handshakes = 0
+        self._lock = threading.Lock()
+
+    def _trace(self, event_name: str, info: Dict[str, Any]) -> None:
+        if event_name == "connection.connect_tcp.complete":
+            with self._lock:
+                self.new_connections += 1
+        elif event_name == "connection.start_tls.complete":
+            with self._lock:
+                self.tls_handshakes += 1
+
+    def on_request(self, request: httpx.Request) -> None:
+        with self._lock:
+            self.requests += 1
+        request.extensions["trace"] = self._trace
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            reused = max(0, self.requests - self.new_connections)
+            return {
+                "requests": self.requests,
+                "new_connections": self.new_connections,
+                "tls_handshakes": self.tls_handshakes,
+                "reused_connections": reused,
+                "reuse_ratio": round(reused / self.requests, 3) if self.requests else None,
+            }
+
+
+_pool_stats: Dict[str, PoolStats] = {}
+_clients: Dict[str, Any] = {}
+_lock = threading.Lock()
+
+
+def _pool_kwargs(name: str) -> Dict[str, Any]:
+    stats = _pool_stats.setdefault(name, PoolStats())
+    return {"limits": POOL_LIMITS, "event_hooks": {"request": [stats.on_request]}}
+
+
+def get_anthropic_client() -> anthropic.Anthropic:
+    """Shared Anthropic client (reads ANTHROPIC_API_KEY)."""
+    with _lock:
+        if "anthropic" not in _clients:
+            _clients["anthropic"] = anthropic.Anthropic(
+                api_key=os.getenv("ANTHROPIC_API_KEY"),
+                base_url=Config.ANTHROPIC_BASE_URL,
+                http_client=anthropic.DefaultHttpxClient(**_pool_kwargs("anthropic")),
+            )
+        return _clients["anthropic"]
+
+
+def get_cerebras_client() -> openai.OpenAI:
+    """Shared OpenAI-compatible client pointed at Cerebras (reads CEREBRAS_API_KEY)."""
+    with _lock:
+        if "cerebras" not in _clients:
+            _clients["cerebras"] = openai.OpenAI(
+                api_key=os.getenv("CEREBRAS_API_KEY"),
+                base_url=Config.CEREBRAS_BASE_URL,
+                http_client=openai.DefaultHttpxClient(**_pool_kwargs("cerebras")),
+            )
+        return _clients["cerebras"]
+
+
+register_metrics("http_pools", lambda: {name: s.snapshot() for name, s in sorted(_pool_stats.items())})
@@ -0,0 +1,211 @@
+"""
+Token and latency accounting for LLM calls.
+
+`MeteredAnthropic` / `MeteredOpenAI` wrap the SDK clients used by the services.
+Every call is tagged with a call site and records input/output/cached tokens,
+time to first token and total latency into the process-wide `llm_metrics`,
+which backs the `llm` section of `/api/metrics`.
+"""
+from typing import Any, Dict, Optional
+import logging
+import threading
+import time
+
+from utils.metrics import LatencyWindow, register_metrics
+
+logger = logging.getLogger(__name__)
+
+
+class CallSiteStats:
+    """Cumulative counters plus rolling latency windows for one call site."""
+
+    def __init__(self, provider: str):
+        self.provider = provider
+        self.calls = 0
+        self.errors = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.cached_tokens = 0
+        self.models: Dict[str, int] = {}
+        self.latency = LatencyWindow()
+        self.ttft = LatencyWindow()
+
+    def snapshot(self) -> Dict[str, Any]:
+        calls = max(self.calls, 1)
+        return {
+            "provider": self.provider,
+            "calls": self.calls,
+            "errors": self.errors,
+            "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens,
+            "cached_tokens": self.cached_tokens,
+            "avg_input_tokens": round(self.input_tokens / calls, 1),
+            "avg_output_tokens": round(self.output_tokens / calls, 1),
+            "models": dict(self.models),
+            "latency": self.latency.snapshot(),
+            "ttft": self.ttft.snapshot(),
+        }
+
+
+class LLMMetrics:
+    def __init__(self):
+        self._sites: Dict[str, CallSiteStats] = {}
+        self._lock = threading.Lock()
+
+    def record(
+        self,
+        call_site: str,
+        provider: str,
+        model: Optional[str],
+        latency_s: float,
+        ttft_s: Optional[float] = None,
+        usage: Optional[Dict[str, int]] = None,
+        ok: bool = True,
+    ) -> None:
+        usage = usage or {}
+        with self._lock:
+            stats = self._sites.get(call_site)
+            if stats is None:
+                stats = self._sites[call_site] = CallSiteStats(provider)
+            stats.calls += 1
+            if not ok:
+                stats.errors += 1
+            stats.input_tokens += usage.get("input_tokens", 0)
+            stats.output_tokens += usage.get("output_tokens", 0)
+            stats.cached_tokens += usage.get("cached_tokens", 0)
+            if model:
+                stats.models[model] = stats.models.get(model, 0) + 1
+        stats.latency.record(latency_s, ok)
+        if ok and ttft_s is not None:
+            stats.ttft.record(ttft_s)
+        logger.debug(
+            f"llm call site={call_site} model={model} ok={ok} latency={latency_s:.3f}s "
+            f"in={usage.get('input_tokens', 0)} out={usage.get('output_tokens', 0)} cached={usage.get('cached_tokens', 0)}"
+        )
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            sites = dict(self._sites)
+        return {name: stats.snapshot() for name, stats in sorted(sites.items())}
+
+
+llm_metrics = LLMMetrics()
+register_metrics("llm", llm_metrics.snapshot)
+
+
+def anthropic_usage(response: Any) -> Dict[str, int]:
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return {}
+    return {
+        "input_tokens": getattr(usage, "input_tokens", 0) or 0,
+        "output_tokens": getattr(usage, "output_tokens", 0) or 0,
+        "cached_tokens": getattr(usage, "cache_read_input_tokens", 0) or 0,
+    }
+
+
+def openai_usage(response: Any) -> Dict[str, int]:
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return {}
+    details = getattr(usage, "prompt_tokens_details", None)
+    return {
+        "input_tokens": getattr(usage, "prompt_tokens", 0) or 0,
+        "output_tokens": getattr(usage, "completion_tokens", 0) or 0,
+        "cached_tokens": (getattr(details, "cached_tokens", 0) or 0) if details else 0,
+    }
+
+
+class MeteredAnthropic:
+    """Anthropic client wrapper that records usage/latency per call site."""
+
+    provider = "anthropic"
+
+    def __init__(self, client):
+        self.client = client
+
+    def create(self, call_site: str, **kwargs):
+        start = time.monotonic()
+        try:
+            response = self.client.messages.create(**kwargs)
+        except Exception:
+            llm_metrics.record(call_site, self.provider, kwargs.get("model"), time.monotonic() - start, ok=False)
+            raise
+        latency = time.monotonic() - start
+        # Non-streamed: the first token arrives with the whole body
+        llm_metrics.record(call_site, self.provider, kwargs.get("model"), latency, latency, anthropic_usage(response))
+        return response
+
+    def stream(self, call_site: str, **kwargs):
+        """
+        Yield text deltas from a streamed message; TTFT is the first non-empty delta.
+        Recorded even when the consumer stops early (e.g. a client disconnect), with the usage so far.
+        """
+        start = time.monotonic()
+        ttft = None
+        usage: Dict[str, int] = {}
+        failed = False
+        try:
+            with self.client.messages.stream(**kwargs) as stream:
+                try:
+                    for text in stream.text_stream:
+                        if text:
+                            if ttft is None:
+                                ttft = time.monotonic() - start
+                            yield text
+                    usage = anthropic_usage(stream.get_final_message())
+                finally:
+                    if not usage:
+                        usage = anthropic_usage(getattr(stream, "current_message_snapshot", None))
+        except Exception:
+            failed = True
+            raise
+        finally:
+            llm_metrics.record(call_site, self.provider, kwargs.get("model"), time.monotonic() - start, ttft, usage, ok=not failed)
+
+
+class MeteredOpenAI:
+    """OpenAI-compatible client wrapper (Cerebras) that records usage/latency per call site."""
+
+    def __init__(self, client, provider: str = "openai"):
+        self.client = client
+        self.provider = provider
+
+    def create(self, call_site: str, **kwargs):
+        start = time.monotonic()
+        try:
+            response = self.client.chat.completions.create(**kwargs)
+        except Exception:
+            llm_metrics.record(call_site, self.provider, kwargs.get("model"), time.monotonic() - start, ok=False)
+            raise
+        latency = time.monotonic() - start
+        llm_metrics.record(call_site, self.provider, kwargs.get("model"), latency, latency, openai_usage(response))
+        return response
+
+    def stream(self, call_site: str, **kwargs):
+        """
+        Yield content deltas from a streamed completion; TTFT is the first non-empty delta.
+        Usage arrives in the final chunk (`include_usage`), so a consumer that stops early
+        (e.g. a client disconnect) is recorded without token counts.
+        """
+        start = time.monotonic()
+        ttft = None
+        usage: Dict[str, int] = {}
+        failed = False
+        kwargs.setdefault("stream_options", {"include_usage": True})
+        try:
+            for chunk in self.client.chat.completions.create(stream=True, **kwargs):
+                if getattr(chunk, "usage", None) is not None:
+                    usage = openai_usage(chunk)
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content or ""
+                if delta:
+                    if ttft is None:
+                        ttft = time.monotonic() - start
+                    yield delta
+        except Exception:
+            failed = True
+            raise
+        finally:
+            llm_metrics.record(call_site, self.provider, kwargs.get("model"), time.monotonic() - start, ttft, usage, ok=not failed)
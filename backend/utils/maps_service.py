@@ -2,6 +2,10 @@ import os
 import requests
 from typing import List, Dict, Optional
 
+from config import Config
+from utils.geo_index import haversine_m
+from utils.places_cache import OK_STATUSES, places_cache, snap
+
 class GoogleMapsService:
     def __init__(self):
         self.api_key = os.getenv('GOOGLE_MAPS_API_KEY')
@@ -10,7 +14,7 @@ class GoogleMapsService:
     
     def geocode_address(self, address: str) -> List[Dict]:
         """Convert address to coordinates"""
-        url = "https://maps.googleapis.com/maps/api/geocode/json"
+        url = f"{Config.GOOGLE_MAPS_BASE_URL}/maps/api/geocode/json"
         params = {
             'address': address,
             'key': self.api_key
@@ -27,8 +31,21 @@ class GoogleMapsService:
     
     def search_nearby_places(self, latitude: float, longitude: float, 
                            place_type: str = 'hospital', radius: int = 5000) -> List[Dict]:
-        """Search for nearby places"""
-        url = "https://maps.googleapis.com/maps/api/place/nearbysearch/json"
+        """Search for nearby places (shared per geo-tile; see utils/places_cache.py)"""
+        # Ask from the tile centre with a band wide enough to cover the original circle, then trim to it
+        tile, center_lat, center_lng, band = snap(latitude, longitude, radius, cover=True)
+        results = places_cache.fetch(
+            "nearbysearch",
+            places_cache.key("nearbysearch", tile, band, place_type),
+            lambda: self._nearby_search_request(center_lat, center_lng, place_type, band),
+        )
+        if not results:
+            return []
+        return [r for r in results if self._within(r, latitude, longitude, radius)]
+
+    def _nearby_search_request(self, latitude: float, longitude: float,
+                               place_type: str, radius: int) -> Optional[List[Dict]]:
+        url = f"{Config.GOOGLE_MAPS_BASE_URL}/maps/api/place/nearbysearch/json"
         params = {
             'location': f"{latitude},{longitude}",
             'radius': radius,
@@ -40,14 +57,24 @@ class GoogleMapsService:
             response = requests.get(url, params=params)
             response.raise_for_status()
             data = response.json()
+            if data.get('status') not in OK_STATUSES:
+                print(f"Places search error: {data.get('status')} {data.get('error_message', '')}")
+                return None
             return data.get('results', [])
         except requests.RequestException as e:
             print(f"Places search error: {e}")
-            return []
+            return None
+
+    @staticmethod
+    def _within(place: Dict, latitude: float, longitude: float, radius: int) -> bool:
+        location = (place.get('geometry') or {}).get('location') or {}
+        if location.get('lat') is None or location.get('lng') is None:
+            return True
+        return haversine_m(location['lat'], location['lng'], latitude, longitude) <= radius
 
     def get_place_details(self, place_id: str) -> Dict:
         """Fetch details like website and phone for a given place_id"""
-        url = "https://maps.googleapis.com/maps/api/place/details/json"
+        url = f"{Config.GOOGLE_MAPS_BASE_URL}/maps/api/place/details/json"
         params = {
             'place_id': place_id,
             'fields': 'formatted_phone_number,website,formatted_address',
@@ -0,0 +1,75 @@
+"""
+Lightweight in-process latency and error tracking for upstream calls.
+"""
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+
+
+class LatencyWindow:
+    """Rolling window of (timestamp, latency, ok) samples bounded by count and age."""
+
+    def __init__(self, max_samples: int = 200, max_age_s: float = 300.0):
+        self.max_age_s = max_age_s
+        self._samples: Deque[Tuple[float, float, bool]] = deque(maxlen=max_samples)
+        self._lock = threading.Lock()
+
+    def record(self, latency_s: float, ok: bool = True) -> None:
+        with self._lock:
+            self._samples.append((time.monotonic(), float(latency_s), bool(ok)))
+
+    def _live(self):
+        cutoff = time.monotonic() - self.max_age_s
+        with self._lock:
+            while self._samples and self._samples[0][0] < cutoff:
+                self._samples.popleft()
+            return list(self._samples)
+
+    def count(self) -> int:
+        return len(self._live())
+
+    def percentile(self, pct: float) -> Optional[float]:
+        """Latency (seconds) at the given percentile, or None with no samples."""
+        latencies = sorted(s[1] for s in self._live())
+        if not latencies:
+            return None
+        idx = min(len(latencies) - 1, max(0, int(round(pct / 100.0 * len(latencies))) - 1))
+        return latencies[idx]
+
+    def error_rate(self) -> float:
+        samples = self._live()
+        if not samples:
+            return 0.0
+        return sum(1 for s in samples if not s[2]) / len(samples)
+
+    def snapshot(self) -> Dict[str, Any]:
+        p50, p95 = self.percentile(50), self.percentile(95)
+        return {
+            "samples": self.count(),
+            "p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+            "p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+            "error_rate": round(self.error_rate(), 3),
+        }
+
+
+_providers: Dict[str, Callable[[], Dict[str, Any]]] = {}
+_providers_lock = threading.Lock()
+
+
+def register_metrics(name: str, snapshot_fn: Callable[[], Dict[str, Any]]) -> None:
+    """Expose a component's snapshot under `name` on the metrics endpoint."""
+    with _providers_lock:
+        _providers[name] = snapshot_fn
+
+
+def collect_metrics() -> Dict[str, Any]:
+    with _providers_lock:
+        providers = dict(_providers)
+    out: Dict[str, Any] = {}
+    for name, fn in sorted(providers.items()):
+        try:
+            out[name] = fn()
+        except Exception as e:
+            out[name] = {"error": str(e)}
+    return out
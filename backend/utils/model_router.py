@@ -0,0 +1,185 @@
+"""
+Latency-aware model routing for Anthropic call sites.
+
+Each call site names a preferred model per quality tier and a fast fallback.
+The router tracks observed latency/errors per (call site, model) and switches
+to the fast model while the preferred one misses its p95 SLO, burns through
+its error budget, or has too many calls in flight.
+
+- Quality tier: env `LLM_QUALITY_TIER` = high | balanced | fast (default balanced)
+- `RECS_MODEL_ID` still pins the preferred model for the recommend call site
+"""
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+import logging
+import os
+import threading
+import time
+
+from utils.metrics import LatencyWindow, register_metrics
+
+logger = logging.getLogger(__name__)
+
+SONNET = "claude-sonnet-4-20250514"
+HAIKU = "claude-3-haiku-20240307"
+
+QUALITY_TIERS = ("high", "balanced", "fast")
+
+
+class Route:
+    """Routing policy for one call site."""
+
+    def __init__(
+        self,
+        high: str,
+        balanced: str,
+        fast: str,
+        slo_ms: float,
+        error_budget: float = 0.2,
+        max_inflight: Optional[int] = None,
+        min_samples: int = 5,
+    ):
+        self.models = {"high": high, "balanced": balanced, "fast": fast}
+        self.slo_ms = slo_ms
+        self.error_budget = error_budget
+        self.max_inflight = max_inflight
+        self.min_samples = min_samples
+
+
+DEFAULT_ROUTES: Dict[str, Route] = {
+    # utils.recommend schema generation (up to 3000 output tokens)
+    "recommend.schema": Route(
+        high=os.getenv("RECS_MODEL_ID", SONNET),
+        balanced=os.getenv("RECS_MODEL_ID", SONNET),
+        fast=HAIKU,
+        slo_ms=float(os.getenv("RECS_SLO_MS", "25000")),
+        max_inflight=int(os.getenv("RECS_MAX_INFLIGHT", "8")),
+    ),
+    # utils.recommend per-domain mode: four concurrent calls of ~1000 output tokens
+    "recommend.domain": Route(
+        high=os.getenv("RECS_MODEL_ID", SONNET),
+        balanced=os.getenv("RECS_MODEL_ID", SONNET),
+        fast=HAIKU,
+        slo_ms=float(os.getenv("RECS_DOMAIN_SLO_MS", "12000")),
+        max_inflight=4 * int(os.getenv("RECS_MAX_INFLIGHT", "8")),
+    ),
+    # AnthropicService
+    "research.profiles": Route(high=SONNET, balanced=HAIKU, fast=HAIKU, slo_ms=15000),
+    "research.deep": Route(high=SONNET, balanced=HAIKU, fast=HAIKU, slo_ms=30000),
+    "research.interpret": Route(high=HAIKU, balanced=HAIKU, fast=HAIKU, slo_ms=3000),
+    # recommendation_engine (catalog re-rank / AI-only tier)
+    "catalog.rerank": Route(high=SONNET, balanced=HAIKU, fast=HAIKU, slo_ms=8000),
+    "catalog.ai_only": Route(high=SONNET, balanced=HAIKU, fast=HAIKU, slo_ms=15000),
+}
+
+
+class RouteDecision:
+    """Model picked for one call; mark `fail()` when the call produced no usable output."""
+
+    def __init__(self, call_site: str, model: str, degraded: bool):
+        self.call_site = call_site
+        self.model = model
+        self.degraded = degraded
+        self.ok = True
+
+    def fail(self) -> None:
+        self.ok = False
+
+
+class ModelRouter:
+    def __init__(self, routes: Optional[Dict[str, Route]] = None, tier: Optional[str] = None, probe_every: int = 20):
+        self.routes = dict(routes or DEFAULT_ROUTES)
+        tier = (tier or os.getenv("LLM_QUALITY_TIER", "balanced")).lower()
+        if tier not in QUALITY_TIERS:
+            logger.warning(f"Unknown LLM_QUALITY_TIER '{tier}', using 'balanced'")
+            tier = "balanced"
+        self.tier = tier
+        self.probe_every = probe_every
+        self._windows: Dict[tuple, LatencyWindow] = {}
+        self._inflight: Dict[tuple, int] = {}
+        self._degraded_calls: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def _window(self, call_site: str, model: str) -> LatencyWindow:
+        key = (call_site, model)
+        with self._lock:
+            if key not in self._windows:
+                self._windows[key] = LatencyWindow()
+            return self._windows[key]
+
+    def _health_problem(self, call_site: str, route: Route, model: str) -> Optional[str]:
+        """Reason the model should not take this call right now, or None if healthy."""
+        if route.max_inflight is not None and self._inflight.get((call_site, model), 0) >= route.max_inflight:
+            return "inflight"
+        window = self._window(call_site, model)
+        if window.count() < route.min_samples:
+            return None
+        if window.error_rate() > route.error_budget:
+            return "errors"
+        p95 = window.percentile(95)
+        if p95 is not None and p95 * 1000 > route.slo_ms:
+            return "latency"
+        return None
+
+    def choose(self, call_site: str) -> RouteDecision:
+        route = self.routes.get(call_site)
+        if route is None:
+            raise KeyError(f"No route configured for call site '{call_site}'")
+        preferred = route.models[self.tier]
+        fast = route.models["fast"]
+        if preferred == fast:
+            return RouteDecision(call_site, preferred, degraded=False)
+
+        problem = self._health_problem(call_site, route, preferred)
+        if problem is None:
+            with self._lock:
+                self._degraded_calls[call_site] = 0
+            return RouteDecision(call_site, preferred, degraded=False)
+
+        # Let an occasional call through to the preferred model so recovery is noticed
+        # (in-flight saturation is never probed).
+        with self._lock:
+            n = self._degraded_calls.get(call_site, 0) + 1
+            self._degraded_calls[call_site] = n
+        if problem != "inflight" and n % self.probe_every == 0:
+            return RouteDecision(call_site, preferred, degraded=False)
+
+        logger.info(f"Routing {call_site} to {fast} ({preferred} unhealthy: {problem})")
+        return RouteDecision(call_site, fast, degraded=True)
+
+    def record(self, call_site: str, model: str, latency_s: float, ok: bool) -> None:
+        self._window(call_site, model).record(latency_s, ok)
+
+    @contextmanager
+    def route(self, call_site: str):
+        """Pick a model, track it as in flight, and record latency/outcome on exit."""
+        decision = self.choose(call_site)
+        key = (call_site, decision.model)
+        with self._lock:
+            self._inflight[key] = self._inflight.get(key, 0) + 1
+        start = time.monotonic()
+        try:
+            yield decision
+        except Exception:
+            decision.fail()
+            raise
+        finally:
+            with self._lock:
+                self._inflight[key] -= 1
+            self.record(call_site, decision.model, time.monotonic() - start, decision.ok)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            keys = list(self._windows.keys())
+            inflight = dict(self._inflight)
+        sites: Dict[str, Any] = {}
+        for call_site, model in sorted(keys):
+            stats = self._windows[(call_site, model)].snapshot()
+            stats["inflight"] = inflight.get((call_site, model), 0)
+            sites.setdefault(call_site, {})[model] = stats
+        return {"tier": self.tier, "call_sites": sites}
+
+
+# Global router shared by all services in the process
+model_router = ModelRouter()
+register_metrics("routing", model_router.snapshot)
@@ -0,0 +1,172 @@
+"""
+Geo-tiled response cache for Google Places calls, shared across users.
+
+Search requests are snapped before they go out: the location becomes the
+centre of its geohash cell (precision 6, roughly 1.2 x 0.6 km) and the radius
+is rounded up to a fixed band, so every family in the same tile asking the
+same query (or place type) makes the same request and shares one response.
+Place Details are keyed by place_id and requested fields.
+
+Responses live in a per-process LRU in front of Redis (shared by every worker
+when configured). Only successful responses are stored, and TTLs are capped
+at 30 days, the longest Google's terms allow Places content to be cached.
+Concurrent misses for the same key collapse into one upstream call; a caller
+waits on another's call no longer than its own deadline, nor than the search
+deadline (`PLACES_SEARCH_DEADLINE_S`) in any case. Hit rates
+per endpoint show up under `places_cache` in `/api/metrics`.
+
+- `PLACES_CACHE_TTL_S` = shared (Redis) TTL (default 86400, capped at 30 days; 0 disables the cache)
+- `PLACES_CACHE_LOCAL_TTL_S` = in-process TTL (default 600, never longer than the shared one)
+- `PLACES_CACHE_LOCAL_SIZE` = in-process entries (default 4096)
+"""
+from typing import Any, Callable, Dict, Optional, Tuple
+import copy
+import json
+import logging
+import math
+import os
+import threading
+
+from utils.geo_index import cell_center, cell_size, geohash
+from utils.metrics import register_metrics
+from utils.singleflight import request_key, singleflight
+from utils.ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+TILE_PRECISION = 6
+# Includes the per-transport search radii so those requests keep their radius
+RADIUS_BANDS_M = (1000, 2500, 5000, 7000, 8000, 10000, 20000, 50000)
+MAX_TTL_S = 30 * 24 * 3600
+# Longest a caller waits on another worker's call for the same key (the Places search deadline)
+FLIGHT_WAIT_S = float(os.getenv("PLACES_SEARCH_DEADLINE_S", "15"))
+# Google reports quota and request errors with HTTP 200; only these statuses are real answers
+OK_STATUSES = ("OK", "ZERO_RESULTS")
+
+
+def _redis():
+    from app import redis_client
+    return redis_client
+
+
+def _tile_half_diagonal_m(precision: int) -> float:
+    # Upper bound (at the equator) on how far snapping can move a point
+    cell_lat, cell_lng = cell_size(precision)
+    return math.hypot(cell_lat, cell_lng) / 2 * 111320.0
+
+
+def radius_band(radius_m: float) -> int:
+    """Smallest band covering `radius_m` (the largest band beyond that)."""
+    for band in RADIUS_BANDS_M:
+        if radius_m <= band:
+            return band
+    return RADIUS_BANDS_M[-1]
+
+
+def snap(lat: float, lng: float, radius_m: float, cover: bool = False) -> Tuple[str, float, float, int]:
+    """
+    (tile, tile-centre lat, tile-centre lng, radius band) for a search. With cover=True the
+    band also absorbs the snapping offset, so the circle it describes contains the original one.
+    """
+    tile = geohash(lat, lng, TILE_PRECISION)
+    center_lat, center_lng = cell_center(lat, lng, TILE_PRECISION)
+    if cover:
+        radius_m += _tile_half_diagonal_m(TILE_PRECISION)
+    return tile, center_lat, center_lng, radius_band(radius_m)
+
+
+class PlacesCache:
+    def __init__(self):
+        self.ttl_s = min(int(os.getenv("PLACES_CACHE_TTL_S", "86400")), MAX_TTL_S)
+        self.local_ttl_s = min(float(os.getenv("PLACES_CACHE_LOCAL_TTL_S", "600")), self.ttl_s)
+        self.local = TTLCache(maxsize=int(os.getenv("PLACES_CACHE_LOCAL_SIZE", "4096")), ttl=self.local_ttl_s)
+        self._flight = singleflight("places", lock_ttl_s=FLIGHT_WAIT_S, share_result=lambda r: r is not None)
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_s > 0
+
+    @staticmethod
+    def key(endpoint: str, *parts: Any) -> str:
+        return request_key(f"places:{endpoint}", *parts)
+
+    def _count(self, endpoint: str, stat: str) -> None:
+        with self._lock:
+            stats = self._stats.setdefault(
+                endpoint, {"local_hits": 0, "redis_hits": 0, "misses": 0, "stores": 0, "uncached": 0}
+            )
+            stats[stat] += 1
+
+    def fetch(self, endpoint: str, key: str, fn: Callable[[], Any], deadline: Optional[float] = None) -> Any:
+        """
+        Cached response for `key`, else fn()'s. fn() returns None for a failed call,
+        which is passed through but never stored. Past `deadline` (`time.monotonic()`)
+        the caller stops waiting on a concurrent call for the same key and runs fn() itself.
+        """
+        if not self.enabled:
+            return fn()
+
+        value = self.local.get(key)
+        if value is not None:
+            self._count(endpoint, "local_hits")
+            return copy.deepcopy(value)
+
+        redis = _redis()
+        if redis is not None:
+            try:
+                raw = redis.get(key)
+            except Exception as e:
+                logger.warning(f"Places cache read failed for {key}: {e}")
+                raw = None
+            if raw:
+                value = json.loads(raw)
+                self.local.set(key, value)
+                self._count(endpoint, "redis_hits")
+                return copy.deepcopy(value)
+
+        self._count(endpoint, "misses")
+        return self._flight.do(key, lambda: self._fill(endpoint, key, fn), deadline)
+
+    def _fill(self, endpoint: str, key: str, fn: Callable[[], Any]) -> Any:
+        # A concurrent leader may have stored it while this caller was missing
+        value = self.local.get(key)
+        if value is not None:
+            return value
+        value = fn()
+        if value is None:
+            self._count(endpoint, "uncached")
+            return None
+        self.local.set(key, value)
+        redis = _redis()
+        if redis is not None:
+            try:
+                redis.setex(key, self.ttl_s, json.dumps(value))
+            except Exception as e:
+                logger.warning(f"Places cache write failed for {key}: {e}")
+        self._count(endpoint, "stores")
+        return value
+
+    def bypass(self, endpoint: str) -> None:
+        """Count a request that must not be served from cache (e.g. open-now filters)."""
+        self._count(endpoint, "uncached")
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            endpoints = {name: dict(stats) for name, stats in sorted(self._stats.items())}
+        for stats in endpoints.values():
+            hits = stats["local_hits"] + stats["redis_hits"]
+            lookups = hits + stats["misses"]
+            stats["hit_rate"] = round(hits / lookups, 3) if lookups else None
+        return {
+            "enabled": self.enabled,
+            "ttl_s": self.ttl_s,
+            "local_size": len(self.local),
+            "endpoints": endpoints,
+        }
+
+
+places_cache = PlacesCache()
+
+register_metrics("places_cache", places_cache.snapshot)
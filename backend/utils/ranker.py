@@ -0,0 +1,255 @@
+"""
+Distilled local ranker for catalog recommendations.
+
+The LLM re-rank in `recommendation_engine` is effectively a scoring function
+of a handful of item/family features. Every LLM re-rank logs its
+(features, LLM score) pairs as one JSON line per call (`RerankLog`);
+`scripts/train_ranker.py` fits a linear model on them offline and writes a
+small JSON file that `LocalRanker` loads and evaluates in microseconds.
+`AgreementStats` measures how closely the local scores track the LLM when
+the LLM runs as a shadow.
+
+- `RERANK_MODE` = llm | local (default llm; local needs a trained model)
+- `RERANK_SHADOW_RATE` = fraction of local re-ranks also sent to the LLM for agreement (default 0.1)
+- `RERANK_LOG_PATH` = where pairs are appended (default logs/rerank_pairs.jsonl, empty disables)
+- `LOCAL_RANKER_PATH` = trained model file (default models/local_ranker.json)
+"""
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+import json
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+
+from utils.catalog import CatalogColumns
+from utils.geo_index import haversine_m
+
+logger = logging.getLogger(__name__)
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+DEFAULT_LOG_PATH = BACKEND_DIR / "logs" / "rerank_pairs.jsonl"
+DEFAULT_MODEL_PATH = BACKEND_DIR / "models" / "local_ranker.json"
+
+FEATURES = [
+    "age_fit",          # 1 if the child's age is inside the item's range
+    "age_gap",          # years outside the range (0 when it fits)
+    "price_ratio",      # monthly price / monthly budget, capped at 5
+    "priority_weight",  # 1 - 0.15 * rank of the item's category in the family's priorities
+    "trait_affinity",   # mean of the kid's traits that go with the category (0.5 if unknown)
+    "distance_km",      # from the family, capped at 50 (0 if either side has no location)
+    "has_distance",
+    "rating",           # 0-5 (0 if unknown)
+    "has_rating",
+]
+
+# Quiz traits (0-1) that make a category a good fit
+CATEGORY_TRAITS = {
+    "physical": ("energy", "kinesthetic", "outdoors"),
+    "cognitive": ("curiosity",),
+    "social": ("sociability",),
+    "emotional": ("creativity",),
+}
+
+
+def ranking_features(columns: CatalogColumns, family_profile: Dict[str, Any]) -> np.ndarray:
+    """(items x FEATURES) matrix for one family."""
+    child_age = family_profile["child_age"]
+    budget_month = max(float(family_profile["budget_per_week"]) * 4, 1.0)
+    priorities = family_profile.get("priorities_ranked") or []
+    traits = family_profile.get("kid_traits") or {}
+    pr_weights = {p: max(0.0, 1.0 - (i * 0.15)) for i, p in enumerate(priorities)}
+
+    def affinity(category: str) -> float:
+        values = [float(traits[t]) for t in CATEGORY_TRAITS.get(category.lower(), ()) if traits.get(t) is not None]
+        return sum(values) / len(values) if values else 0.5
+
+    age_gap = np.maximum(columns.age_min - child_age, 0) + np.maximum(child_age - columns.age_max, 0)
+    lat, lng = family_profile.get("lat"), family_profile.get("lng")
+    if lat is not None and lng is not None:
+        distance = haversine_m(columns.latitude, columns.longitude, float(lat), float(lng)) / 1000.0
+    else:
+        distance = np.full(len(columns), np.nan)
+    has_distance = ~np.isnan(distance)
+    has_rating = ~np.isnan(columns.rating)
+
+    return np.column_stack([
+        columns.age_fits(child_age).astype(np.float64),
+        np.minimum(age_gap, 10.0),
+        np.minimum(columns.price / budget_month, 5.0),
+        columns.category_values(lambda c: pr_weights.get(c.lower().capitalize(), 0.0)),
+        columns.category_values(affinity),
+        np.where(has_distance, np.minimum(np.nan_to_num(distance), 50.0), 0.0),
+        has_distance.astype(np.float64),
+        np.where(has_rating, np.nan_to_num(columns.rating), 0.0),
+        has_rating.astype(np.float64),
+    ]).reshape(len(columns), len(FEATURES))
+
+
+class LocalRanker:
+    """Standardized linear model over FEATURES, as written by scripts/train_ranker.py."""
+
+    def __init__(self, mean: Sequence[float], scale: Sequence[float], weights: Sequence[float], bias: float, meta: Optional[Dict[str, Any]] = None):
+        self.mean = np.asarray(mean, dtype=np.float64)
+        self.scale = np.asarray(scale, dtype=np.float64)
+        self.weights = np.asarray(weights, dtype=np.float64)
+        self.bias = float(bias)
+        self.meta = meta or {}
+
+    @classmethod
+    def load(cls, path: Optional[str] = None) -> Optional["LocalRanker"]:
+        """The trained model, or None if there is none yet (or it was trained on other features)."""
+        path = Path(path or os.getenv("LOCAL_RANKER_PATH") or DEFAULT_MODEL_PATH)
+        if not path.exists():
+            return None
+        try:
+            data = json.loads(path.read_text())
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not read local ranker {path}: {e}")
+            return None
+        if data.get("features") != FEATURES:
+            logger.warning(f"Local ranker {path} was trained on different features; ignoring it")
+            return None
+        meta = {k: v for k, v in data.items() if k not in ("features", "mean", "scale", "weights", "bias")}
+        return cls(data["mean"], data["scale"], data["weights"], data["bias"], meta)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "features": FEATURES,
+            "mean": self.mean.tolist(),
+            "scale": self.scale.tolist(),
+            "weights": self.weights.tolist(),
+            "bias": self.bias,
+            **self.meta,
+        }
+
+    def score(self, features: np.ndarray) -> np.ndarray:
+        return np.clip(self.bias + ((features - self.mean) / self.scale) @ self.weights, 0.0, 1.0)
+
+
+def explain(item: Dict[str, Any], row: np.ndarray, family_profile: Dict[str, Any]) -> str:
+    """Short template explanation from an item's feature row (local mode has no LLM text)."""
+    f = dict(zip(FEATURES, row))
+    reasons = []
+    if f["age_fit"]:
+        reasons.append(f"fits age {family_profile['child_age']}")
+    if f["price_ratio"] <= 1:
+        reasons.append("within your budget")
+    if f["priority_weight"] >= 0.85:
+        reasons.append(f"matches your top priority ({(item.get('category') or '').lower()})")
+    elif f["priority_weight"] > 0:
+        reasons.append(f"supports your {(item.get('category') or '').lower()} priority")
+    if f["trait_affinity"] > 0.7:
+        reasons.append("suits your child's personality")
+    if f["has_distance"] and f["distance_km"] <= 5:
+        reasons.append(f"{f['distance_km']:.1f} km away")
+    if f["has_rating"] and f["rating"] >= 4.5:
+        reasons.append(f"rated {f['rating']:.1f}")
+    if not reasons:
+        return "A local option worth a look."
+    text = ", ".join(reasons)
+    return text[0].upper() + text[1:] + "."
+
+
+class RerankLog:
+    """Appends one JSON line per LLM re-rank: family context plus (features, llm_score) per item."""
+
+    def __init__(self, path: Optional[str] = None):
+        raw = os.getenv("RERANK_LOG_PATH") if path is None else path
+        self.path = Path(raw) if raw else (DEFAULT_LOG_PATH if raw is None else None)
+        self._lock = threading.Lock()
+
+    def record(self, family_profile: Dict[str, Any], ids: List[Any], features: np.ndarray, llm_scores: Sequence[float], model: Optional[str] = None) -> None:
+        if self.path is None or not ids:
+            return
+        line = json.dumps({
+            "ts": time.time(),
+            "model": model,
+            "child_age": family_profile.get("child_age"),
+            "budget_per_week": family_profile.get("budget_per_week"),
+            "priorities_ranked": family_profile.get("priorities_ranked") or [],
+            "features": FEATURES,
+            "items": [
+                {"id": str(item_id), "x": [round(float(v), 4) for v in row], "llm_score": float(score)}
+                for item_id, row, score in zip(ids, features, llm_scores)
+            ],
+        })
+        try:
+            with self._lock:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                with self.path.open("a") as f:
+                    f.write(line + "\n")
+        except OSError as e:
+            logger.warning(f"Could not log re-rank pairs to {self.path}: {e}")
+
+
+def spearman(a: Sequence[float], b: Sequence[float]) -> Optional[float]:
+    """Rank correlation of two score lists (average ranks for ties); None if undefined."""
+    if len(a) < 2:
+        return None
+
+    def ranks(x: np.ndarray) -> np.ndarray:
+        order = np.argsort(x, kind="stable")
+        r = np.empty(len(x))
+        r[order] = np.arange(len(x), dtype=np.float64)
+        # Average the ranks of tied values
+        for value in np.unique(x):
+            tied = x == value
+            r[tied] = r[tied].mean()
+        return r
+
+    ra, rb = ranks(np.asarray(a, dtype=np.float64)), ranks(np.asarray(b, dtype=np.float64))
+    if ra.std() == 0 or rb.std() == 0:
+        return None
+    return float(np.corrcoef(ra, rb)[0, 1])
+
+
+class AgreementStats:
+    """Local-vs-LLM agreement on shadowed re-ranks."""
+
+    def __init__(self, top: int = 5):
+        self.top = top
+        self._lock = threading.Lock()
+        self.local_calls = 0
+        self.llm_calls = 0
+        self.shadowed = 0
+        self._abs_error = 0.0
+        self._items = 0
+        self._spearman: List[float] = []
+        self._overlap: List[float] = []
+
+    def count(self, mode: str) -> None:
+        with self._lock:
+            if mode == "local":
+                self.local_calls += 1
+            else:
+                self.llm_calls += 1
+
+    def record(self, local_scores: Sequence[float], llm_scores: Sequence[float]) -> None:
+        local_scores, llm_scores = np.asarray(local_scores, dtype=np.float64), np.asarray(llm_scores, dtype=np.float64)
+        if not len(local_scores):
+            return
+        rho = spearman(local_scores, llm_scores)
+        k = min(self.top, len(local_scores))
+        top_local = set(np.argsort(-local_scores, kind="stable")[:k])
+        top_llm = set(np.argsort(-llm_scores, kind="stable")[:k])
+        with self._lock:
+            self.shadowed += 1
+            self._abs_error += float(np.abs(local_scores - llm_scores).sum())
+            self._items += len(local_scores)
+            if rho is not None:
+                self._spearman.append(rho)
+            self._overlap.append(len(top_local & top_llm) / k)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "local_calls": self.local_calls,
+                "llm_calls": self.llm_calls,
+                "shadowed": self.shadowed,
+                "mean_abs_error": round(self._abs_error / self._items, 4) if self._items else None,
+                "spearman": round(sum(self._spearman) / len(self._spearman), 4) if self._spearman else None,
+                f"top{self.top}_overlap": round(sum(self._overlap) / len(self._overlap), 4) if self._overlap else None,
+            }
@@ -0,0 +1,225 @@
+"""
+Token-bucket rate limits per user and per upstream API.
+
+Each named limit is a bucket of `burst` tokens refilled at `per_minute`. Routes
+opt in with `@rate_limited(...)`: the caller's own bucket is charged first (so
+a runaway client is stopped before it touches shared quota), then one shared
+bucket per upstream the route calls. An empty bucket means a 429 with a
+Retry-After header. Buckets live in Redis when `app.redis_client` is connected
+(atomic Lua script, shared by every worker) and in process memory otherwise.
+
+- `RATE_LIMIT_ENABLED` = 1 | 0 (default 1)
+- `RATE_LIMIT_<NAME>` = "PER_MINUTE" or "PER_MINUTE:BURST" overrides a default below,
+  e.g. `RATE_LIMIT_CHAT=30:10`, `RATE_LIMIT_UPSTREAM_ANTHROPIC=100`
+"""
+from functools import wraps
+from typing import Any, Callable, Dict, Optional, Tuple, Union
+import logging
+import math
+import os
+import threading
+import time
+
+from flask import jsonify, request
+
+from utils.metrics import register_metrics
+from utils.ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+
+class Limit:
+    def __init__(self, per_minute: float, burst: Optional[float] = None):
+        self.rate = per_minute / 60.0
+        self.capacity = burst if burst is not None else per_minute
+
+
+DEFAULT_LIMITS: Dict[str, Limit] = {
+    # Per user / family (anonymous callers are keyed by IP)
+    "chat": Limit(20, 10),
+    "ai": Limit(60, 60),  # analyze-behavior / generate-activities, batch items count individually
+    "research": Limit(5, 5),
+    "recommend": Limit(10, 10),
+    "places": Limit(60, 30),
+    # Shared across all users
+    "upstream:anthropic": Limit(50, 50),
+    "upstream:cerebras": Limit(120, 60),
+    "upstream:google": Limit(600, 300),
+}
+
+_TOKEN_BUCKET_LUA = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local cost = tonumber(ARGV[4])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local retry = 0
+if tokens >= cost then
+  tokens = tokens - cost
+else
+  retry = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000) + 1000)
+return tostring(retry)
+"""
+
+
+_REFUND_LUA = """
+local capacity = tonumber(ARGV[1])
+local amount = tonumber(ARGV[2])
+local tokens = tonumber(redis.call('HGET', KEYS[1], 'tokens'))
+if tokens then
+  redis.call('HSET', KEYS[1], 'tokens', math.min(capacity, tokens + amount))
+end
+return 1
+"""
+
+
+def _redis():
+    from app import redis_client
+    return redis_client
+
+
+def _parse_override(name: str, default: Limit) -> Limit:
+    raw = os.getenv("RATE_LIMIT_" + name.upper().replace(":", "_"))
+    if not raw:
+        return default
+    try:
+        per_minute, _, burst = raw.partition(":")
+        return Limit(float(per_minute), float(burst) if burst else None)
+    except ValueError:
+        logger.warning(f"Ignoring malformed rate limit override for {name}: {raw!r}")
+        return default
+
+
+class RateLimiter:
+    def __init__(self, limits: Optional[Dict[str, Limit]] = None, enabled: Optional[bool] = None):
+        self.limits = {name: _parse_override(name, limit) for name, limit in (limits or DEFAULT_LIMITS).items()}
+        self.enabled = enabled if enabled is not None else os.getenv("RATE_LIMIT_ENABLED", "1") == "1"
+        self._local = TTLCache(maxsize=10000, ttl=3600)
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    def _count(self, name: str, outcome: str) -> None:
+        with self._lock:
+            stats = self._stats.setdefault(name, {"allowed": 0, "rejected": 0})
+            stats[outcome] += 1
+
+    def _take_local(self, key: str, limit: Limit, cost: float) -> float:
+        now = time.monotonic()
+        with self._lock:
+            tokens, ts = self._local.get(key) or (limit.capacity, now)
+            tokens = min(limit.capacity, tokens + (now - ts) * limit.rate)
+            retry = 0.0
+            if tokens >= cost:
+                tokens -= cost
+            else:
+                retry = (cost - tokens) / limit.rate
+            # A bucket untouched until it is full again is the same as no bucket
+            self._local.set(key, (tokens, now), ttl=limit.capacity / limit.rate + 1)
+        return retry
+
+    def acquire(self, name: str, subject: str, cost: float = 1) -> float:
+        """Take `cost` tokens from `name`'s bucket for `subject`; 0 if allowed, else seconds until it would be."""
+        limit = self.limits[name]
+        # A request larger than the whole burst needs (and drains) a full bucket
+        cost = min(cost, limit.capacity)
+        key = f"ratelimit:{name}:{subject}"
+        retry = None
+        redis = _redis()
+        if redis is not None:
+            try:
+                retry = float(redis.eval(_TOKEN_BUCKET_LUA, 1, key, limit.capacity, limit.rate, time.time(), cost))
+            except Exception as e:
+                logger.warning(f"Redis rate limit check failed for {key}, using local bucket: {e}")
+        if retry is None:
+            retry = self._take_local(key, limit, cost)
+        self._count(name, "rejected" if retry > 0 else "allowed")
+        return retry
+
+    def refund(self, name: str, subject: str, cost: float = 1) -> None:
+        """Give back tokens taken by `acquire` for a request that did not go ahead."""
+        limit = self.limits[name]
+        cost = min(cost, limit.capacity)
+        key = f"ratelimit:{name}:{subject}"
+        redis = _redis()
+        if redis is not None:
+            try:
+                redis.eval(_REFUND_LUA, 1, key, limit.capacity, cost)
+                return
+            except Exception as e:
+                logger.warning(f"Redis rate limit refund failed for {key}, using local bucket: {e}")
+        with self._lock:
+            state = self._local.get(key)
+            if state is not None:
+                tokens, ts = state
+                self._local.set(key, (min(limit.capacity, tokens + cost), ts), ttl=limit.capacity / limit.rate + 1)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = {name: dict(s) for name, s in self._stats.items()}
+        return {
+            "enabled": self.enabled,
+            "limits": {
+                name: {"per_minute": round(limit.rate * 60, 2), "burst": limit.capacity, **stats.get(name, {})}
+                for name, limit in sorted(self.limits.items())
+            },
+        }
+
+
+# Global limiter shared by all routes in the process
+rate_limiter = RateLimiter()
+register_metrics("rate_limits", rate_limiter.snapshot)
+
+
+def client_id() -> str:
+    """user_id / family_id from the path, JSON body or query string; client IP for anonymous callers."""
+    body = request.get_json(silent=True) if request.is_json else None
+    sources = [request.view_args or {}, body if isinstance(body, dict) else {}, request.args]
+    for source in sources:
+        for field in ("user_id", "family_id"):
+            value = source.get(field)
+            # 'default_user' is the app's placeholder before sign-in, shared by everyone
+            if value and value != "default_user":
+                return f"user:{value}"
+    return f"ip:{request.remote_addr or 'unknown'}"
+
+
+def rate_limited(
+    limit: str,
+    cost: Union[float, Callable[[], float]] = 1,
+    upstreams: Optional[Dict[str, Union[float, Callable[[], float]]]] = None,
+):
+    """Charge the caller's `limit` bucket, then each shared upstream bucket (per-unit cost x request cost).
+
+    `cost` and the per-unit upstream costs may be callables evaluated per request (e.g. the
+    number of batch items, or model calls per request). If any bucket rejects, the ones
+    already charged are refunded, so a rejected request costs nothing.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if not rate_limiter.enabled:
+                return view(*args, **kwargs)
+            units = cost() if callable(cost) else cost
+            checks: Tuple[Tuple[str, str, float], ...] = ((limit, client_id(), units),) + tuple(
+                (f"upstream:{name}", "all", (per_unit() if callable(per_unit) else per_unit) * units)
+                for name, per_unit in (upstreams or {}).items()
+            )
+            for i, (name, subject, amount) in enumerate(checks):
+                retry = rate_limiter.acquire(name, subject, amount)
+                if retry > 0:
+                    for charged in checks[:i]:
+                        rate_limiter.refund(*charged)
+                    retry_after = max(1, math.ceil(retry))
+                    response = jsonify({"error": "Rate limit exceeded", "limit": name, "retry_after": retry_after})
+                    response.status_code = 429
+                    response.headers["Retry-After"] = str(retry_after)
+                    return response
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -2,27 +2,191 @@
 AI-powered recommendation engine for parenting activities based on family profile and preferences
 Structured output ONLY via Anthropic tool-use with your JSON Schema.
 
-- Uses official `anthropic` SDK (`Anthropic` client)
-- Model: `claude-sonnet-4-20250514` (override with env `RECS_MODEL_ID`)
+- Uses official `anthropic` SDK via the shared client in `utils.llm_clients`
+- One long-lived engine per worker (`get_engine()`); tool definitions are built once
+- Model: routed by `utils.model_router` (call site `recommend.schema`): Sonnet by
+  default (override with env `RECS_MODEL_ID`), Haiku while Sonnet misses its SLO
+- Per-domain mode (opt-in, env `RECS_PARALLEL_DOMAINS=1`): four concurrent calls, one
+  per domain with a domain-scoped schema (call site `recommend.domain`), merged into
+  the same shape. A failed domain is retried once on the fast model and omitted if that
+  fails too. Latency tracks the slowest domain instead of the whole reply, but each
+  generation makes four Anthropic calls that each repeat the family context, and is
+  charged four tokens against the Anthropic rate-limit bucket.
+- Similar families share results: the profile is quantized (budget/hours bands, traits
+  to 0.1, zip to its 3-digit region) into a cache key; generations are cached under it
+  for `RECS_CACHE_TTL_S` and personalized locally (zip, transport notes) per request.
 - ALWAYS returns the schema-shaped object: { cognitive, physical, emotional, social }
 - On API failure or missing tool output, returns {}
 """
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Any, Optional
 import json
 import logging
 import os
-from anthropic import Anthropic
+import threading
+from urllib.parse import unquote
 from dotenv import load_dotenv
+from werkzeug.datastructures import MultiDict
+
+from app.services.cache_service import cache_service
+from utils.llm_clients import get_anthropic_client
+from utils.llm_metrics import MeteredAnthropic
+from utils.metrics import register_metrics
+from utils.model_router import model_router
+from utils.singleflight import request_key, singleflight
 
 load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+DOMAINS = ("cognitive", "physical", "emotional", "social")
+
+SYSTEM_PROMPT = (
+    "You are a concise child development advisor. "
+    "Be brief, practical, and avoid verbosity. "
+)
+
+
+# Upper bounds of the weekly budget bands (USD); above the last one is open-ended
+BUDGET_BANDS = (0, 10, 25, 50, 100, 200, 400)
+
+
+def _budget_band(budget: Any) -> Optional[str]:
+    try:
+        budget = float(budget)
+    except (TypeError, ValueError):
+        return None
+    lower = 0
+    for upper in BUDGET_BANDS:
+        if budget <= upper:
+            return f"${lower}-{upper}" if upper else "$0"
+        lower = upper
+    return f"${lower}+"
+
+
+def _hours_band(hours: Any) -> Optional[str]:
+    try:
+        low = int(float(hours) // 5 * 5)
+    except (TypeError, ValueError):
+        return None
+    return f"{low}-{low + 5}"
+
+
+def _zip_region(zip_code: Any) -> Optional[str]:
+    digits = "".join(ch for ch in str(zip_code or "") if ch.isdigit())
+    return f"{digits[:3]}xx" if len(digits) >= 3 else None
+
+
+def _label(value: Any) -> Optional[str]:
+    return " ".join(str(value).lower().split()) if value not in (None, "") else None
+
+
+def quantize_profile(family_profile: Dict[str, Any]) -> Dict[str, Any]:
+    """Canonical, bucketed profile: families that land on the same one share a generation."""
+    traits = family_profile.get("kid_traits") or {}
+    try:
+        age = int(float(family_profile.get("child_age")))
+    except (TypeError, ValueError):
+        age = None
+    return {
+        "budget_per_week": _budget_band(family_profile.get("budget_per_week")),
+        "support_available": sorted({_label(v) for v in family_profile.get("support_available") or [] if _label(v)}),
+        "transport": _label(family_profile.get("transport")),
+        "hours_per_week_with_kid": _hours_band(family_profile.get("hours_per_week_with_kid")),
+        "parenting_style": _label(family_profile.get("parenting_style")),
+        "child_age": age,
+        "area_type": _label(family_profile.get("area_type")),
+        "priorities_ranked": [_label(v) for v in family_profile.get("priorities_ranked") or [] if _label(v)],
+        "kid_traits": {
+            str(k): round(float(v), 1) for k, v in sorted(traits.items()) if isinstance(v, (int, float))
+        },
+        "zip": _zip_region(family_profile.get("zip")),
+    }
+
+
+def family_profile(user_data: Dict[str, Any], args: Optional[MultiDict] = None) -> Dict[str, Any]:
+    """
+    Profile fields for /api/recommend: query args first, then the stored user (top level,
+    then intake). scripts/warm_recommendations.py builds stored users' profiles through
+    this too (with no args), so warmed buckets get the keys live requests look up.
+    """
+    args = args if args is not None else MultiDict()
+    intake = user_data.get("intake") or {}
+
+    def stored(key: str, intake_key: Optional[str] = None) -> Any:
+        value = user_data.get(key)
+        return value if value not in (None, "", []) else intake.get(intake_key or key)
+
+    def arg(value: Any) -> Any:
+        # The intake screen encodeURIComponent()s values that URLSearchParams encodes again
+        return unquote(value) if isinstance(value, str) else value
+
+    def one(key: str, type=None, intake_key: Optional[str] = None) -> Any:
+        value = arg(args.get(key, type=type))
+        return value if value not in (None, "") else stored(key, intake_key)
+
+    def many(key: str) -> List[Any]:
+        return [arg(v) for v in args.getlist(key)] or stored(key) or []
+
+    return {
+        "budget_per_week": one("budget_per_week_usd", float),
+        "support_available": many("support_available"),
+        "transport": one("transport"),
+        "hours_per_week_with_kid": one("hours_per_week_with_kid", int),
+        "parenting_style": one("parenting_style"),
+        "child_age": one("child_age", int),
+        "area_type": one("area_type"),
+        "priorities_ranked": many("priorities_ranked"),
+        "kid_traits": user_data.get("kid_traits") or {},
+        "zip": one("zip", intake_key="zip_code"),
+    }
+
+
+def personalize(recommendations: Dict[str, Any], family_profile: Dict[str, Any], canonical: Dict[str, Any]) -> Dict[str, Any]:
+    """Cheap local pass over a shared generation: the family's own zip and transport."""
+    zip_code = family_profile.get("zip")
+    transport = family_profile.get("transport")
+
+    def fill(text: Any) -> Any:
+        if isinstance(text, str) and zip_code and canonical.get("zip"):
+            return text.replace(canonical["zip"], str(zip_code))
+        return text
+
+    for domain in recommendations.values():
+        if not isinstance(domain, dict):
+            continue
+        domain["parenting_advice"] = fill(domain.get("parenting_advice"))
+        for opp in domain.get("local_opportunities") or []:
+            if not isinstance(opp, dict):
+                continue
+            for field in ("description", "address", "match_reason"):
+                if field in opp:
+                    opp[field] = fill(opp[field])
+            if transport and not opp.get("transportation_notes"):
+                opp["transportation_notes"] = f"Accessible by {transport}"
+    return recommendations
+
+
 class AIRecommendationEngine:
-    def __init__(self):
-        self.client = Anthropic()  # reads ANTHROPIC_API_KEY
-        self.model_id = os.getenv("RECS_MODEL_ID", "claude-sonnet-4-20250514")
+    LOCAL_OPPS_PER_DOMAIN = 2
+
+    def __init__(self, client=None, parallel_domains: Optional[bool] = None):
+        self.client = client or get_anthropic_client()  # reads ANTHROPIC_API_KEY
+        self.llm = MeteredAnthropic(self.client)
+        # Schema/tool definitions never change; build them once, treat as read-only
+        self.tools = self._tools()
+        self.domain_tools = self._domain_tools()
+        self.parallel_domains = (
+            parallel_domains if parallel_domains is not None else os.getenv("RECS_PARALLEL_DOMAINS", "0") == "1"
+        )
+        self._executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv("RECS_DOMAIN_WORKERS", "16")), thread_name_prefix="recommend-domain"
+        )
+        self.cache_ttl = int(os.getenv("RECS_CACHE_TTL_S", str(6 * 3600)))
+        self._cache_stats = {"hits": 0, "misses": 0, "stores": 0}
+        self._cache_lock = threading.Lock()
+        register_metrics("recommend_cache", self.cache_snapshot)
 
     def _schema(self) -> Dict[str, Any]:
         return {
@@ -95,6 +259,17 @@ class AIRecommendationEngine:
             }
         ]
 
+    def _domain_tools(self):
+        # One domain's slice of the full schema, sharing its $defs
+        defs = self._schema()["$defs"]
+        return [
+            {
+                "name": "emit_domain_recommendations",
+                "description": "Return the recommendations for one development domain strictly matching the schema.",
+                "input_schema": {**defs["domain"], "$defs": {"opportunity": defs["opportunity"]}},
+            }
+        ]
+
     def _generate_schema_recommendations(
         self,
         family_profile: Dict[str, Any],
@@ -117,31 +292,107 @@ class AIRecommendationEngine:
         )
 
         try:
-            resp = self.client.messages.create(
-                model=self.model_id,
-                max_tokens=max_tokens,
-                temperature=0.2,
-                tools=self._tools(),
-                messages=[{"role": "user", "content": prompt}],
-                system=(
-                    "You are a concise child development advisor. "
-                    "Be brief, practical, and avoid verbosity. "
-                    "Return results ONLY via the 'emit_recommendations' tool."
-                ),
-            )
+            with model_router.route("recommend.schema") as route:
+                resp = self.llm.create(
+                    "recommend.schema",
+                    model=route.model,
+                    max_tokens=max_tokens,
+                    temperature=0.2,
+                    tools=self.tools,
+                    messages=[{"role": "user", "content": prompt}],
+                    system=SYSTEM_PROMPT + "Return results ONLY via the 'emit_recommendations' tool.",
+                )
 
-            for part in resp.content:
-                if getattr(part, "type", None) == "tool_use" and getattr(part, "name", "") == "emit_recommendations":
-                    # Return EXACT tool payload (already structured to schema)
-                    return part.input if isinstance(part.input, dict) else {}
+                for part in resp.content:
+                    if getattr(part, "type", None) == "tool_use" and getattr(part, "name", "") == "emit_recommendations":
+                        # Return EXACT tool payload (already structured to schema)
+                        return part.input if isinstance(part.input, dict) else {}
 
-            logger.warning("No 'emit_recommendations' tool_use found; returning {}.")
-            return {}
+                route.fail()
+                logger.warning("No 'emit_recommendations' tool_use found; returning {}.")
+                return {}
 
         except Exception as e:
             logger.exception("Schema-based generation failed: %s", e)
             return {}
 
+    def _emit_domain(self, model: str, prompt: str, max_tokens: int) -> Optional[Dict[str, Any]]:
+        resp = self.llm.create(
+            "recommend.domain",
+            model=model,
+            max_tokens=max_tokens,
+            temperature=0.2,
+            tools=self.domain_tools,
+            tool_choice={"type": "tool", "name": "emit_domain_recommendations"},
+            messages=[{"role": "user", "content": prompt}],
+            system=SYSTEM_PROMPT + "Return results ONLY via the 'emit_domain_recommendations' tool.",
+        )
+        for part in resp.content:
+            if getattr(part, "type", None) == "tool_use" and isinstance(getattr(part, "input", None), dict):
+                return part.input
+        return None
+
+    def _generate_domain(
+        self,
+        family_profile: Dict[str, Any],
+        domain: str,
+        local_opps_per_domain: int,
+        max_tokens: int,
+    ) -> Optional[Dict[str, Any]]:
+        """One domain's payload; retried once on the fast model, None if both attempts fail."""
+        prompt = (
+            f"Return ONLY via tool-use 'emit_domain_recommendations' (JSON Schema) for the {domain} "
+            "development domain. Base advice on this profile: "
+            + json.dumps(family_profile, ensure_ascii=False)
+            + (
+                f". Include {local_opps_per_domain} local_opportunities. "
+                "Keep parenting_advice ≤ 300 chars; activity_types concise (≤ 60 chars)."
+            )
+        )
+
+        model = None
+        try:
+            with model_router.route("recommend.domain") as route:
+                model = route.model
+                payload = self._emit_domain(model, prompt, max_tokens)
+                if payload is not None:
+                    return payload
+                route.fail()
+        except Exception as e:
+            logger.warning("Domain generation failed for %s: %s", domain, e)
+
+        fast = model_router.routes["recommend.domain"].models["fast"]
+        if model == fast:
+            return None
+        try:
+            return self._emit_domain(fast, prompt, max_tokens)
+        except Exception as e:
+            logger.warning("Fast-model retry failed for %s: %s", domain, e)
+            return None
+
+    def _generate_parallel_recommendations(
+        self,
+        family_profile: Dict[str, Any],
+        *,
+        local_opps_per_domain: int = 1,
+        max_tokens: int = 1000,
+    ) -> Dict[str, Any]:
+        """All domains concurrently, merged into the schema shape (failed domains omitted)."""
+        futures = {
+            domain: self._executor.submit(
+                self._generate_domain, family_profile, domain, local_opps_per_domain, max_tokens
+            )
+            for domain in DOMAINS
+        }
+        merged = {}
+        for domain, future in futures.items():
+            payload = future.result()
+            if payload:
+                merged[domain] = payload
+            else:
+                logger.warning("No recommendations for domain %s; omitting it.", domain)
+        return merged
+
     def get_recommendations(
         self,
         budget_per_week: float,
@@ -171,10 +422,75 @@ class AIRecommendationEngine:
             "kid_traits": kid_traits or {},
             "zip": zip_code,
         }
-        return self._generate_schema_recommendations(
-            family_profile,
-            local_opps_per_domain=2,
+        canonical = quantize_profile(family_profile)
+        key = self.profile_key(canonical)
+        # Similar profiles (and the shared default_user) share one cached / in-flight generation
+        recommendations = singleflight("recommend").do(key, lambda: self._cached_generation(key, canonical))
+        return personalize(recommendations, family_profile, canonical)
+
+    def profile_key(self, canonical: Dict[str, Any]) -> str:
+        """Cache / singleflight key for a quantized profile."""
+        return request_key("recommend", canonical, self.LOCAL_OPPS_PER_DOMAIN)
+
+    def warm_profile(self, canonical: Dict[str, Any], min_ttl_s: float = 0) -> str:
+        """
+        Pre-generate one quantized profile into the cache (scripts/warm_recommendations.py).
+        Returns 'fresh' if the cached entry has more than min_ttl_s left, else 'stored' or 'failed'.
+        """
+        key = self.profile_key(canonical)
+        remaining = cache_service.recommendations_ttl(key)
+        if remaining is not None and remaining > min_ttl_s:
+            return "fresh"
+        recommendations = singleflight("recommend").do(key, lambda: self._generate_and_store(key, canonical))
+        return "stored" if all(isinstance(recommendations.get(d), dict) for d in DOMAINS) else "failed"
+
+    def _cached_generation(self, key: str, canonical: Dict[str, Any]) -> Dict[str, Any]:
+        cached = cache_service.get_recommendations(key)
+        if cached:
+            self._count("hits")
+            return cached
+        self._count("misses")
+        return self._generate_and_store(key, canonical)
+
+    def _generate_and_store(self, key: str, canonical: Dict[str, Any]) -> Dict[str, Any]:
+        generate = (
+            self._generate_parallel_recommendations if self.parallel_domains else self._generate_schema_recommendations
         )
+        recommendations = generate(canonical, local_opps_per_domain=self.LOCAL_OPPS_PER_DOMAIN)
+        # Partial results would pin the static fallback for a domain to every family in the bucket
+        if all(isinstance(recommendations.get(d), dict) for d in DOMAINS):
+            cache_service.set_recommendations(key, recommendations, ttl=self.cache_ttl)
+            self._count("stores")
+        return recommendations
+
+    def _count(self, stat: str) -> None:
+        with self._cache_lock:
+            self._cache_stats[stat] += 1
+
+    def cache_snapshot(self) -> Dict[str, Any]:
+        with self._cache_lock:
+            stats = dict(self._cache_stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 3) if lookups else None
+        return stats
+
+
+_engine: Optional[AIRecommendationEngine] = None
+_engine_lock = threading.Lock()
+
+
+def get_engine() -> AIRecommendationEngine:
+    """Process-wide engine (thread-safe); server.py creates it at worker start."""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = AIRecommendationEngine()
+        return _engine
+
+
+def model_calls_per_generation() -> int:
+    """Anthropic calls one uncached generation makes (one per domain in per-domain mode); for rate limiting."""
+    return len(DOMAINS) if get_engine().parallel_domains else 1
 
 
 def get_recommendations(
@@ -194,8 +510,7 @@ def get_recommendations(
     """
     Module-level entry point. Returns EXACT tool JSON (dict) or {} on failure.
     """
-    engine = AIRecommendationEngine()
-    return engine.get_recommendations(
+    return get_engine().get_recommendations(
         budget_per_week=budget_per_week,
         support_available=support_available,
         transport=transport,
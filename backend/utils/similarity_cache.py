@@ -0,0 +1,172 @@
+"""
+Near-duplicate response cache for free-text LLM requests.
+
+Requests are partitioned by an exact `scope` (e.g. endpoint + age band); within
+a scope, the free text is normalized to a set of content words and indexed
+with MinHash + LSH banding. A lookup returns the stored answer of the most
+similar earlier request whose word-set Jaccard similarity is at least
+`threshold`, so "4-year-old tantrums at bedtime" and "tantrums at bedtime,
+age 4" share one completion. Entries live in an in-process LRU with a TTL;
+hit rates show up under `similarity_cache` in `/api/metrics`.
+"""
+from typing import Any, Dict, FrozenSet, Hashable, List, Optional, Set, Tuple
+import copy
+import hashlib
+import os
+import random
+import re
+import threading
+import uuid
+
+from utils.metrics import register_metrics
+from utils.ttl_cache import TTLCache
+
+_MERSENNE_PRIME = (1 << 61) - 1
+
+# Function words plus the generic "my N-year-old child" framing parents wrap
+# around the actual question; ages are matched through the scope instead.
+STOPWORDS = frozenset("""
+a about after again all also am an and any are around as at be been before being but by can could
+do does doing during for from get gets getting had has have having he her him his how i if in into
+is it its just me more most my of on or our really she so some still than that the their them then
+there they this to too up very was we what when where which while who why will with would you your
+age aged old year years yr yrs yo month months child children kid kids son daughter
+""".split())
+
+_WORD_RE = re.compile(r"[a-z]+")
+
+
+def age_band(age: Any) -> str:
+    """Coarse developmental band for an age in years (unparseable ages get their own band)."""
+    try:
+        years = float(age)
+    except (TypeError, ValueError):
+        return "unknown"
+    for upper, band in ((2, "infant"), (4, "toddler"), (6, "preschool"), (9, "early"), (13, "middle")):
+        if years < upper:
+            return band
+    return "teen"
+
+
+def content_words(text: str) -> FrozenSet[str]:
+    """Lowercased content words with stopwords, numbers and plural -s removed."""
+    words = set()
+    for word in _WORD_RE.findall((text or "").lower()):
+        if word in STOPWORDS or len(word) < 2:
+            continue
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        words.add(word)
+    return frozenset(words)
+
+
+def jaccard(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+class MinHasher:
+    def __init__(self, num_perm: int = 64, seed: int = 1):
+        rng = random.Random(seed)
+        self.num_perm = num_perm
+        self._perms = [(rng.randrange(1, _MERSENNE_PRIME), rng.randrange(0, _MERSENNE_PRIME)) for _ in range(num_perm)]
+
+    def signature(self, words: FrozenSet[str]) -> Tuple[int, ...]:
+        hashes = [int.from_bytes(hashlib.blake2b(w.encode("utf-8"), digest_size=8).digest(), "big") for w in words]
+        return tuple(min((a * h + b) % _MERSENNE_PRIME for h in hashes) for a, b in self._perms)
+
+
+class SimilarityCache:
+    def __init__(
+        self,
+        name: str,
+        threshold: Optional[float] = None,
+        maxsize: int = 1024,
+        ttl: float = 6 * 3600.0,
+        num_perm: int = 64,
+        bands: int = 16,
+    ):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.name = name
+        self.threshold = threshold if threshold is not None else float(os.getenv("SIMILARITY_CACHE_THRESHOLD", "0.8"))
+        self.bands = bands
+        self.rows = num_perm // bands
+        self._hasher = MinHasher(num_perm)
+        self._buckets: Dict[Tuple[Hashable, int, Tuple[int, ...]], Set[str]] = {}
+        # Reentrant: TTLCache calls _forget from inside get/set while we hold the lock
+        self._lock = threading.RLock()
+        self._entries = TTLCache(maxsize=maxsize, ttl=ttl, on_evict=self._forget)
+        self._stats = {"exact_hits": 0, "near_hits": 0, "misses": 0, "stores": 0}
+
+    def _band_keys(self, scope: Hashable, signature: Tuple[int, ...]) -> List[Tuple[Hashable, int, Tuple[int, ...]]]:
+        return [(scope, i, signature[i * self.rows:(i + 1) * self.rows]) for i in range(self.bands)]
+
+    def _forget(self, entry_id: str, entry: Dict[str, Any]) -> None:
+        for band_key in entry["band_keys"]:
+            bucket = self._buckets.get(band_key)
+            if bucket is not None:
+                bucket.discard(entry_id)
+                if not bucket:
+                    del self._buckets[band_key]
+
+    def get(self, scope: Hashable, text: str) -> Optional[Any]:
+        """Copy of the best stored answer within `scope` at or above the threshold, else None."""
+        words = content_words(text)
+        if not words:
+            return None
+        signature = self._hasher.signature(words)
+        with self._lock:
+            candidates = set()
+            for band_key in self._band_keys(scope, signature):
+                candidates |= self._buckets.get(band_key, set())
+            best, best_score = None, 0.0
+            for entry_id in candidates:
+                entry = self._entries.get(entry_id)
+                if entry is None:
+                    continue
+                score = jaccard(words, entry["words"])
+                if score > best_score:
+                    best, best_score = entry, score
+            if best is None or best_score < self.threshold:
+                self._stats["misses"] += 1
+                return None
+            self._stats["exact_hits" if best_score == 1.0 else "near_hits"] += 1
+            return copy.deepcopy(best["value"])
+
+    def set(self, scope: Hashable, text: str, value: Any) -> None:
+        words = content_words(text)
+        if not words:
+            return
+        band_keys = self._band_keys(scope, self._hasher.signature(words))
+        entry_id = uuid.uuid4().hex
+        with self._lock:
+            self._entries.set(entry_id, {"words": words, "value": copy.deepcopy(value), "band_keys": band_keys})
+            for band_key in band_keys:
+                self._buckets.setdefault(band_key, set()).add(entry_id)
+            self._stats["stores"] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = len(self._entries)
+        hits = stats["exact_hits"] + stats["near_hits"]
+        lookups = hits + stats["misses"]
+        stats["hit_rate"] = round(hits / lookups, 3) if lookups else None
+        return stats
+
+
+_caches: Dict[str, SimilarityCache] = {}
+_caches_lock = threading.Lock()
+
+
+def similarity_cache(name: str, **kwargs) -> SimilarityCache:
+    """Named process-wide SimilarityCache (created on first use)."""
+    with _caches_lock:
+        if name not in _caches:
+            _caches[name] = SimilarityCache(name, **kwargs)
+        return _caches[name]
+
+
+register_metrics("similarity_cache", lambda: {name: c.snapshot() for name, c in sorted(_caches.items())})
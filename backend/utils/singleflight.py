@@ -0,0 +1,192 @@
+"""
+Singleflight: coalesce identical in-flight requests into one upstream call.
+
+Within a process, concurrent callers with the same key wait for the first
+caller's result. Across worker processes, the leader holds a Redis lock
+(`SET NX PX`) and publishes its result under a short TTL; callers in other
+processes poll for it instead of starting their own call. If the leader dies
+or fails, waiters fall through and run the call themselves. A caller may pass
+a `deadline` (`time.monotonic()` value) to bound how long it waits on another
+caller; once it passes, it runs the call itself.
+"""
+from typing import Any, Callable, Dict, Optional
+import copy
+import hashlib
+import json
+import logging
+import threading
+import time
+import uuid
+
+from utils.metrics import register_metrics
+
+logger = logging.getLogger(__name__)
+
+
+def _normalize(value: Any) -> Any:
+    if isinstance(value, str):
+        return " ".join(value.lower().split())
+    if isinstance(value, dict):
+        return {str(k): _normalize(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    return value
+
+
+def request_key(namespace: str, *parts: Any) -> str:
+    """Stable hash of the normalized request (case/whitespace-insensitive strings, sorted keys)."""
+    blob = json.dumps(_normalize(list(parts)), sort_keys=True, default=str, ensure_ascii=False)
+    return f"{namespace}:{hashlib.sha256(blob.encode('utf-8')).hexdigest()[:32]}"
+
+
+def _redis():
+    from app import redis_client
+    return redis_client
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    def __init__(
+        self,
+        name: str,
+        lock_ttl_s: float = 120.0,
+        result_ttl_s: int = 30,
+        poll_interval_s: float = 0.25,
+        share_result: Callable[[Any], bool] = bool,
+    ):
+        self.name = name
+        self.lock_ttl_s = lock_ttl_s
+        self.result_ttl_s = result_ttl_s
+        self.poll_interval_s = poll_interval_s
+        # Empty/fallback results are not published to other processes
+        self.share_result = share_result
+        self._calls: Dict[str, _Call] = {}
+        self._lock = threading.Lock()
+        self._stats = {
+            "leaders": 0, "local_waiters": 0, "local_fallthrough": 0, "remote_waiters": 0, "remote_fallthrough": 0,
+        }
+
+    def _count(self, stat: str) -> None:
+        with self._lock:
+            self._stats[stat] += 1
+
+    def do(self, key: str, fn: Callable[[], Any], deadline: Optional[float] = None) -> Any:
+        """Run fn() once per key among concurrent callers; every caller gets its own copy of the result."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self._stats["leaders"] += 1
+            else:
+                self._stats["local_waiters"] += 1
+
+        if not leader:
+            if not call.done.wait(None if deadline is None else max(0.0, deadline - time.monotonic())):
+                self._count("local_fallthrough")
+                return fn()
+            if call.error is not None:
+                raise call.error
+            return copy.deepcopy(call.result)
+
+        try:
+            call.result = self._do_distributed(key, fn, deadline)
+            # Waiters copy call.result, so the leader must not hand out the shared object
+            return copy.deepcopy(call.result)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+    # ---------- CROSS-PROCESS ----------
+
+    def _do_distributed(self, key: str, fn: Callable[[], Any], deadline: Optional[float] = None) -> Any:
+        redis = _redis()
+        if redis is None:
+            return fn()
+
+        lock_key = f"singleflight:{self.name}:lock:{key}"
+        result_key = f"singleflight:{self.name}:result:{key}"
+        token = uuid.uuid4().hex
+        try:
+            cached = redis.get(result_key)
+            if cached:
+                self._count("remote_waiters")
+                return json.loads(cached)
+            acquired = redis.set(lock_key, token, nx=True, px=int(self.lock_ttl_s * 1000))
+        except Exception as e:
+            logger.warning(f"Singleflight Redis unavailable for {key}: {e}")
+            return fn()
+
+        if not acquired:
+            waited = self._wait_for_remote(redis, lock_key, result_key, deadline)
+            if waited is not None:
+                self._count("remote_waiters")
+                return waited
+            self._count("remote_fallthrough")
+            return fn()
+
+        try:
+            result = fn()
+            if self.share_result(result):
+                try:
+                    redis.setex(result_key, self.result_ttl_s, json.dumps(result, default=str))
+                except Exception as e:
+                    logger.warning(f"Singleflight result publish failed for {key}: {e}")
+            return result
+        finally:
+            try:
+                holder = redis.get(lock_key)
+                if holder is not None and (holder.decode() if isinstance(holder, bytes) else holder) == token:
+                    redis.delete(lock_key)
+            except Exception:
+                pass
+
+    def _wait_for_remote(self, redis, lock_key: str, result_key: str, deadline: Optional[float] = None) -> Any:
+        """Poll for another process's result; None once its lock is gone without a result or the wait runs out."""
+        until = time.monotonic() + self.lock_ttl_s
+        if deadline is not None:
+            until = min(until, deadline)
+        while time.monotonic() < until:
+            time.sleep(max(0.0, min(self.poll_interval_s, until - time.monotonic())))
+            try:
+                raw = redis.get(result_key)
+                if raw:
+                    return json.loads(raw)
+                if not redis.exists(lock_key):
+                    raw = redis.get(result_key)
+                    return json.loads(raw) if raw else None
+            except Exception as e:
+                logger.warning(f"Singleflight wait failed: {e}")
+                return None
+        return None
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["in_flight"] = len(self._calls)
+        return stats
+
+
+_flights: Dict[str, SingleFlight] = {}
+_flights_lock = threading.Lock()
+
+
+def singleflight(name: str, **kwargs) -> SingleFlight:
+    """Named process-wide SingleFlight group (created on first use)."""
+    with _flights_lock:
+        if name not in _flights:
+            _flights[name] = SingleFlight(name, **kwargs)
+        return _flights[name]
+
+
+register_metrics("singleflight", lambda: {name: f.snapshot() for name, f in sorted(_flights.items())})
@@ -0,0 +1,76 @@
+"""
+Thread-safe in-process LRU cache with per-entry TTL and hit/miss counters.
+"""
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+import threading
+import time
+
+
+class TTLCache:
+    def __init__(
+        self,
+        maxsize: int = 1024,
+        ttl: float = 3600.0,
+        on_evict: Optional[Callable[[Hashable, Any], None]] = None,
+    ):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        # Called (under the cache lock) for entries dropped by expiry or LRU eviction
+        self.on_evict = on_evict
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._data[key]
+                    self._evicted(key, entry[1])
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        expires = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                evicted_key, (_, evicted_value) = self._data.popitem(last=False)
+                self._evicted(evicted_key, evicted_value)
+
+    def delete(self, key: Hashable) -> bool:
+        with self._lock:
+            return self._data.pop(key, None) is not None
+
+    def ttl_remaining(self, key: Hashable) -> Optional[float]:
+        """Seconds until the entry expires, or None if absent/expired (does not count as a hit)."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            remaining = entry[0] - time.monotonic()
+            return remaining if remaining > 0 else None
+
+    def _evicted(self, key: Hashable, value: Any) -> None:
+        if self.on_evict is not None:
+            self.on_evict(key, value)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+            }
@@ -1,17 +1,34 @@
 import os
 import time
 import logging
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout
 from typing import List, Dict, Any, Optional
 import requests
 
+from config import Config
+from utils.places_cache import OK_STATUSES, places_cache, snap
+
 logger = logging.getLogger(__name__)
 
 GOOGLE_KEY = os.getenv("GOOGLE_MAPS_API_KEY", "")
 YELP_KEY = os.getenv("YELP_API_KEY", "")
 
+# Text searches run concurrently; each HTTP attempt and the whole search are time-boxed
+SEARCH_WORKERS = int(os.getenv("PLACES_SEARCH_WORKERS", "8"))
+CALL_TIMEOUT_S = float(os.getenv("PLACES_CALL_TIMEOUT_S", "8"))
+SEARCH_DEADLINE_S = float(os.getenv("PLACES_SEARCH_DEADLINE_S", "15"))
+
+_search_pool = ThreadPoolExecutor(max_workers=SEARCH_WORKERS, thread_name_prefix="places-search")
+
 
-def _retry_request(method, url, headers=None, params=None, timeout=12, retries=3, backoff=0.6):
+def _retry_request(method, url, headers=None, params=None, timeout=12, retries=3, backoff=0.6, deadline=None):
     for i in range(retries):
+        if deadline is not None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                logger.warning(f"Deadline passed before attempt {i+1}/{retries} for {url}")
+                break
+            timeout = min(timeout, remaining)
         try:
             resp = requests.request(method, url, headers=headers, params=params, timeout=timeout)
             if resp.status_code == 200:
@@ -19,7 +36,10 @@ def _retry_request(method, url, headers=None, params=None, timeout=12, retries=3
             logger.warning(f"HTTP {resp.status_code} for {url}: {resp.text[:200]}")
         except Exception as e:
             logger.warning(f"Request error (attempt {i+1}/{retries}): {e}")
-        time.sleep(backoff * (2 ** i))
+        delay = backoff * (2 ** i)
+        if deadline is not None and time.monotonic() + delay >= deadline:
+            break
+        time.sleep(delay)
     return None
 
 
@@ -79,41 +99,121 @@ class WebPlacesService:
         open_now: bool = False,
         min_rating: float = 4.0,
         per_category_limit: int = 6,
+        details: bool = True,
     ) -> List[Dict[str, Any]]:
+        """
+        Scored, deduplicated places from Text Search alone. Phone/website/address come
+        from Place Details, fetched for the returned items only; pass details=False to
+        defer that to `attach_details` on whatever subset the caller ends up returning.
+        """
         radius = _distance_radius_by_transport(transport)
-        results: List[Dict[str, Any]] = []
+        deadline = time.monotonic() + SEARCH_DEADLINE_S
 
-        for category, queries in CATEGORY_KEYWORDS.items():
-            for q in queries[:4]:
-                g = self._google_text_search(q, lat, lng, radius, open_now=open_now)
-                if g:
-                    normalized = [
-                        self._normalize_google_place(
-                            p,
-                            query=q,
-                            category_hint=category,
-                            child_age=child_age,
-                            max_monthly_budget=max_monthly_budget,
-                        )
-                        for p in g
-                    ]
-                    normalized = [n for n in normalized if n and n.get("match_score", 0) >= 0]
-                    normalized.sort(key=lambda x: x.get("match_score", 0), reverse=True)
-                    results.extend(normalized[:per_category_limit])
+        # One task per (category, query); merged below in this same order so output is deterministic
+        searches = [(category, q) for category, queries in CATEGORY_KEYWORDS.items() for q in queries[:4]]
+        futures = [
+            _search_pool.submit(
+                self._search_query, q, category, lat, lng, radius, open_now, child_age, max_monthly_budget,
+                per_category_limit, deadline,
+            )
+            for category, q in searches
+        ]
+        results: List[Dict[str, Any]] = []
+        for (category, q), future in zip(searches, futures):
+            try:
+                results.extend(future.result(timeout=max(0.0, deadline - time.monotonic())))
+            except FuturesTimeout:
+                future.cancel()
+                logger.warning(f"Text search '{q}' missed the {SEARCH_DEADLINE_S:.0f}s search deadline")
+            except Exception as e:
+                logger.warning(f"Text search '{q}' failed: {e}")
 
         dedup: Dict[str, Dict[str, Any]] = {}
         for r in results:
             key = r.get("id") or f"{r.get('title','')}|{r.get('address','')}"
             if key not in dedup:
                 dedup[key] = r
-        return list(dedup.values())
+        items = list(dedup.values())
+        return self.attach_details(items, deadline) if details else items
+
+    def attach_details(self, items: List[Dict[str, Any]], deadline: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Copies of `items` with Place Details (address, phone, website), fetched concurrently."""
+        deadline = deadline if deadline is not None else time.monotonic() + SEARCH_DEADLINE_S
+        futures = [
+            _search_pool.submit(self._google_place_details, it.get("place_id"), deadline) if it.get("place_id") else None
+            for it in items
+        ]
+        out = []
+        for it, future in zip(items, futures):
+            details = None
+            if future is not None:
+                try:
+                    details = future.result(timeout=max(0.0, deadline - time.monotonic()))
+                except FuturesTimeout:
+                    future.cancel()
+                    logger.warning(f"Place details for {it.get('place_id')} missed the deadline")
+                except Exception as e:
+                    logger.warning(f"Place details for {it.get('place_id')} failed: {e}")
+            it = dict(it)
+            if details:
+                it["address"] = details.get("formatted_address") or it.get("address") or "See website"
+                it["phone"] = details.get("formatted_phone_number") or it.get("phone") or "See website"
+                it["website"] = details.get("website") or it.get("website") or ""
+            out.append(it)
+        return out
+
+    def _search_query(
+        self,
+        q: str,
+        category: str,
+        lat: float,
+        lng: float,
+        radius: int,
+        open_now: bool,
+        child_age: int,
+        max_monthly_budget: int,
+        per_category_limit: int,
+        deadline: float,
+    ) -> List[Dict[str, Any]]:
+        g = self._google_text_search(q, lat, lng, radius, open_now=open_now, deadline=deadline)
+        if not g:
+            return []
+        normalized = [
+            self._normalize_google_place(
+                p,
+                query=q,
+                category_hint=category,
+                child_age=child_age,
+                max_monthly_budget=max_monthly_budget,
+            )
+            for p in g
+        ]
+        normalized = [n for n in normalized if n and n.get("match_score", 0) >= 0]
+        normalized.sort(key=lambda x: x.get("match_score", 0), reverse=True)
+        return normalized[:per_category_limit]
 
     def _google_text_search(
-        self, query: str, lat: float, lng: float, radius_m: int, open_now: bool = False
+        self, query: str, lat: float, lng: float, radius_m: int, open_now: bool = False, deadline: Optional[float] = None
     ) -> Optional[List[Dict[str, Any]]]:
         if not GOOGLE_KEY:
             return None
-        base = "https://maps.googleapis.com/maps/api/place/textsearch/json"
+        if open_now:
+            # Open-now results go stale within the hour; always ask Google
+            places_cache.bypass("textsearch")
+            return self._google_text_search_request(query, lat, lng, radius_m, open_now, deadline)
+        # Families in the same tile asking the same query share one (snapped) request
+        tile, lat, lng, radius_m = snap(lat, lng, radius_m)
+        return places_cache.fetch(
+            "textsearch",
+            places_cache.key("textsearch", tile, radius_m, query),
+            lambda: self._google_text_search_request(query, lat, lng, radius_m, False, deadline),
+            deadline,
+        )
+
+    def _google_text_search_request(
+        self, query: str, lat: float, lng: float, radius_m: int, open_now: bool, deadline: Optional[float]
+    ) -> Optional[List[Dict[str, Any]]]:
+        base = f"{Config.GOOGLE_MAPS_BASE_URL}/maps/api/place/textsearch/json"
         params = {
             "query": query,
             "location": f"{lat},{lng}",
@@ -122,25 +222,32 @@ class WebPlacesService:
         }
         if open_now:
             params["opennow"] = "true"
-        resp = _retry_request("GET", base, params=params)
+        resp = _retry_request("GET", base, params=params, timeout=CALL_TIMEOUT_S, deadline=deadline)
         if not resp:
             return None
         data = resp.json()
+        if data.get("status") not in OK_STATUSES:
+            logger.warning(f"Text search '{query}' returned {data.get('status')}: {data.get('error_message', '')}")
+            return None
         return data.get("results", [])
 
-    def _google_place_details(self, place_id: str) -> Optional[Dict[str, Any]]:
+    def _google_place_details(self, place_id: str, deadline: Optional[float] = None) -> Optional[Dict[str, Any]]:
         if not GOOGLE_KEY or not place_id:
             return None
-        base = "https://maps.googleapis.com/maps/api/place/details/json"
-        params = {
-            "place_id": place_id,
-            "key": GOOGLE_KEY,
-            "fields": "formatted_address,formatted_phone_number,website,opening_hours",
-        }
-        resp = _retry_request("GET", base, params=params)
-        if not resp:
-            return None
-        return resp.json().get("result")
+        fields = "formatted_address,formatted_phone_number,website,opening_hours"
+
+        def request() -> Optional[Dict[str, Any]]:
+            base = f"{Config.GOOGLE_MAPS_BASE_URL}/maps/api/place/details/json"
+            params = {"place_id": place_id, "key": GOOGLE_KEY, "fields": fields}
+            resp = _retry_request("GET", base, params=params, timeout=CALL_TIMEOUT_S, deadline=deadline)
+            if not resp:
+                return None
+            data = resp.json()
+            if data.get("status") != "OK":
+                return None
+            return data.get("result")
+
+        return places_cache.fetch("details", places_cache.key("details", place_id, fields), request, deadline)
 
     def _normalize_google_place(
         self,
@@ -160,10 +267,10 @@ class WebPlacesService:
             lng = geo.get("lng", -71.0589)
             price_level = p.get("price_level", None)
 
-            details = self._google_place_details(place_id) if place_id else None
-            address = (details or {}).get("formatted_address") or p.get("formatted_address") or p.get("vicinity") or "See website"
-            phone = (details or {}).get("formatted_phone_number") or "See website"
-            website = (details or {}).get("website") or ""
+            # Scoring uses Text Search fields only; details come later (attach_details)
+            address = p.get("formatted_address") or p.get("vicinity") or "See website"
+            phone = "See website"
+            website = ""
 
             price_monthly = _price_level_to_monthly(price_level)
             category = category_hint
@@ -197,6 +304,7 @@ class WebPlacesService:
             return {
                 "activity_id": place_id or f"g_{name}",
                 "id": place_id or f"g_{name}",
+                "place_id": place_id,
                 "title": name,
                 "description": p.get("business_status", "Local program"),
                 "category": category,
@@ -215,6 +323,8 @@ class WebPlacesService:
                 "website": website,
                 "latitude": lat,
                 "longitude": lng,
+                "rating": p.get("rating"),
+                "user_ratings_total": user_ratings_total,
             }
         except Exception as e:
             logger.warning(f"Normalize Google place failed: {e}")
@@ -16,9 +16,31 @@ export const generateExtraordinaryPeople = async (query: string) => {
   }
 };
 
-export const generateDeepResearch = async (query: string) => {
+const DEEP_RESEARCH_POLL_MS = 1500;
+const DEEP_RESEARCH_TIMEOUT_MS = 3 * 60 * 1000;
+
+const sleep = (ms: number) => new Promise(resolve => setTimeout(resolve, ms));
+
+// Deep research runs as a background job: POST returns a job id, then we poll for the result
+const waitForDeepResearch = async (jobId: string, onProgress?: (progress: number, stage: string) => void) => {
+  const deadline = Date.now() + DEEP_RESEARCH_TIMEOUT_MS;
+  while (Date.now() < deadline) {
+    const job = await apiClient.get(`/api/deep-research/${jobId}`);
+    onProgress?.(job.progress ?? 0, job.stage ?? job.status);
+    if (job.status === 'done') return job;
+    if (job.status === 'failed') throw new Error(job.error || 'Deep research failed');
+    await sleep(DEEP_RESEARCH_POLL_MS);
+  }
+  throw new Error('Deep research timed out');
+};
+
+export const generateDeepResearch = async (
+  query: string,
+  onProgress?: (progress: number, stage: string) => void
+) => {
   try {
-    const data = await apiClient.post('/api/deep-research', { query });
+    const queued = await apiClient.post('/api/deep-research', { query });
+    const data = queued.job_id ? await waitForDeepResearch(queued.job_id, onProgress) : queued;
     return {
       profiles: data.profiles || [],
       interpretation: data.interpretation || ''
@@ -51,6 +51,53 @@ class ApiClient {
       body: JSON.stringify(data),
     });
   }
+
+  // POST and consume a server-sent event stream. React Native's fetch can't read
+  // a body incrementally, so this uses XMLHttpRequest progress events instead.
+  streamPost(endpoint: string, data: any, onEvent: (event: string, payload: any) => void): Promise<void> {
+    const url = `${this.baseUrl}${endpoint}`;
+
+    return new Promise((resolve, reject) => {
+      const xhr = new XMLHttpRequest();
+      let seen = 0;
+      let buffer = '';
+
+      const drain = () => {
+        buffer += xhr.responseText.slice(seen);
+        seen = xhr.responseText.length;
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+          const block = buffer.slice(0, boundary);
+          buffer = buffer.slice(boundary + 2);
+          let event = 'message';
+          let payload = '';
+          block.split('\n').forEach(line => {
+            if (line.startsWith('event:')) event = line.slice(6).trim();
+            else if (line.startsWith('data:')) payload += line.slice(5).trim();
+          });
+          if (payload) onEvent(event, JSON.parse(payload));
+        }
+      };
+
+      xhr.open('POST', url);
+      xhr.setRequestHeader('Content-Type', 'application/json');
+      xhr.setRequestHeader('Accept', 'text/event-stream');
+      xhr.onprogress = drain;
+      xhr.onload = () => {
+        if (xhr.status < 200 || xhr.status >= 300) {
+          reject(new Error(`HTTP ${xhr.status}: ${xhr.statusText}`));
+          return;
+        }
+        drain();
+        resolve();
+      };
+      xhr.onerror = () => {
+        console.error(`API stream failed: ${url}`);
+        reject(new Error('Network error'));
+      };
+      xhr.send(JSON.stringify(data));
+    });
+  }
 }
 
 // Export singleton instance
@@ -18,6 +18,7 @@ interface ChatResponse {
   age_appropriate_tips?: string[];
   warning_signs?: string[];
   resources?: string[];
+  conversation_id?: string;
 }
 
 const QUICK_ACTIONS = [
@@ -37,6 +38,8 @@ export default function AIChatScreen() {
   const [childAge, setChildAge] = useState('');
   const [showSetup, setShowSetup] = useState(true);
   const scrollViewRef = useRef<ScrollView>(null);
+  // History lives on the server; each turn sends only the new message
+  const conversationId = useRef<string | undefined>(undefined);
 
   const sendMessage = async (messageText?: string) => {
     const text = messageText || inputText.trim();
@@ -53,23 +56,31 @@ export default function AIChatScreen() {
     setIsLoading(true);
 
     try {
-      const chatMessages = [...messages, userMessage].map(msg => ({
-        role: msg.role,
-        content: msg.content
-      }));
+      // Stream tokens into a placeholder reply; the final event adds the action steps
+      let streamed = '';
+      let started = false;
+      const showReply = (content: string) => {
+        const assistantMessage: Message = { role: 'assistant', content, timestamp: new Date() };
+        setMessages(prev => started ? [...prev.slice(0, -1), assistantMessage] : [...prev, assistantMessage]);
+        started = true;
+      };
 
-      const response = await apiClient.post('/api/chat', {
-        messages: chatMessages,
+      await apiClient.streamPost('/api/chat/stream', {
+        message: text,
+        conversation_id: conversationId.current,
         child_age: childAge || undefined
+      }, (event, payload) => {
+        if (event === 'token') {
+          streamed += payload.text;
+          showReply(streamed);
+        } else if (event === 'done') {
+          conversationId.current = payload.conversation_id;
+          showReply(formatResponse(payload));
+        } else if (event === 'error') {
+          // Reply cut off mid-stream: the server kept none of it, so drop the partial text
+          showReply(formatResponse(payload));
+        }
       });
-
-      const assistantMessage: Message = {
-        role: 'assistant',
-        content: formatResponse(response),
-        timestamp: new Date()
-      };
-
-      setMessages(prev => [...prev, assistantMessage]);
     } catch (error) {
       console.error('Chat error:', error);
       const errorMessage: Message = {
@@ -138,6 +149,7 @@ export default function AIChatScreen() {
       timestamp: new Date()
     };
     setMessages([welcomeMessage]);
+    conversationId.current = undefined;
   };
 
   useEffect(() => {
@@ -224,7 +236,7 @@ export default function AIChatScreen() {
           </View>
         ))}
         
-        {isLoading && (
+        {isLoading && messages[messages.length - 1]?.role === 'user' && (
           <View style={[styles.messageContainer, styles.assistantMessage]}>
             <Text style={styles.loadingText}>AI is thinking...</Text>
           </View>
@@ -17,6 +17,7 @@ interface ChatResponse {
   age_appropriate_tips?: string[];
   warning_signs?: string[];
   resources?: string[];
+  conversation_id?: string;
 }
 
 const QUICK_ACTIONS = [
@@ -35,6 +36,8 @@ export default function ChatbotTab({ initialAge }: { initialAge?: number }) {
   const [childAge, setChildAge] = useState<number | null>(null);
   const [showSetup, setShowSetup] = useState(true);
   const scrollViewRef = useRef<ScrollView>(null);
+  // History lives on the server; each turn sends only the new message
+  const conversationId = useRef<string | undefined>(undefined);
 
   // Function to fetch child age from database
   const fetchChildAge = async () => {
@@ -87,17 +90,14 @@ export default function ChatbotTab({ initialAge }: { initialAge?: number }) {
         await fetchChildAge();
       }
       
-      const chatMessages = [...messages, userMessage].map(msg => ({
-        role: msg.role,
-        content: msg.content
-      }));
-
       const familyId = (await AsyncStorage.getItem('current_family_id')) || 'default_user';
       const response = await apiClient.post('/api/chat', {
-        messages: chatMessages,
+        message: text,
+        conversation_id: conversationId.current,
         user_id: 'default_user',
         child_age: childAge
       });
+      conversationId.current = response.conversation_id;
 
       console.log('🤖 Chat response:', response);
 